@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'exams.middleware.MetricsMiddleware',  # Per-view timing and SQL counts, first so it sees everything
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -118,4 +119,92 @@ STATICFILES_DIRS = [
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField' 
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField' 
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Holds campus catalogs and transcripts. Local memory is per process; with
+# several server processes use FileBasedCache (or a cache server) so they
+# share entries and see each other's catalog version bumps.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'exams',
+    },
+}
+
+# Logging
+# https://docs.djangoproject.com/en/4.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'exams': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+
+# Reports
+
+# Worker processes used to render class-wide progress reports (None = one per CPU)
+REPORT_RENDER_WORKERS = None
+
+# Seconds a student's cumulative transcript stays in the cache. Entries
+# are checked against the student's records before use, so this only
+# bounds memory; point CACHES at a shared backend to share them between
+# server processes.
+TRANSCRIPT_CACHE_TIMEOUT = 3600
+
+
+# Catalogs
+
+# Seconds a campus's dropdown catalog stays cached. Changes replace it at
+# once in every process sharing the cache; this bounds how long a process
+# with its own local-memory cache can miss another process's change.
+CATALOG_CACHE_TIMEOUT = 300
+
+# Seconds a course's roster for the marks-entry grid stays cached, on the
+# same terms as catalogs
+ROSTER_CACHE_TIMEOUT = 300
+
+
+# Metrics
+
+# Requests slower than this are logged with their slowest SQL queries
+SLOW_REQUEST_THRESHOLD_MS = 1000
+
+
+# Background jobs
+
+# Worker processes started by `manage.py run_workers`
+JOB_WORKERS = 2
+
+# Run jobs inside the request that submits them instead of queueing them
+# for `manage.py run_workers`. For tests and local development only
+# (RUN_JOBS_INLINE=1 in the environment): inline, the web worker builds
+# the documents itself
+RUN_JOBS_INLINE = os.environ.get('RUN_JOBS_INLINE') == '1'
+
+# Seconds between a running job's heartbeats
+JOB_HEARTBEAT_INTERVAL = 30
+
+# Seconds without a heartbeat before a running job's worker is assumed
+# dead and the job requeued
+JOB_TIMEOUT = 600
+
+# Directory finished job files are written to; it must be shared by the
+# web servers and the workers
+JOB_RESULTS_ROOT = BASE_DIR / 'job_results'
+
+# Seconds finished jobs and their files are kept
+JOB_RESULT_TTL = 86400
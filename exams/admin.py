@@ -3,13 +3,29 @@ from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.decorators import user_passes_test
 from django.utils.decorators import method_decorator
-from .models import Course, Unit, Student, ExamRecord, Campus, CampusPassword, School
+from .models import Course, Unit, Student, ExamRecord, Campus, CampusPassword, School, GradingScheme, Job
+from .search import search_terms_q
 
 
 def is_superuser(user):
     return user.is_superuser
 
 
+class IndexedSearchMixin:
+    """
+    Run the admin search box through the search indexes.
+
+    `search_indexes` lists (kind, path) pairs for exams.search.search_q;
+    `search_fields` is still set so the admin shows the search box.
+    """
+    search_indexes = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not self.search_indexes or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(search_terms_q(self.search_indexes, search_term)), False
+
+
 @admin.register(Campus)
 class CampusAdmin(admin.ModelAdmin):
     list_display = ['name']
@@ -89,10 +105,11 @@ class CourseAdmin(admin.ModelAdmin):
 
 
 @admin.register(Unit)
-class UnitAdmin(admin.ModelAdmin):
+class UnitAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'course', 'created_at', 'updated_at']
     list_filter = ['course']
     search_fields = ['name', 'course__name']
+    search_indexes = [('unit', ''), ('course', 'course')]
     ordering = ['course', 'name']
     
     def get_queryset(self, request):
@@ -107,10 +124,11 @@ class UnitAdmin(admin.ModelAdmin):
 
 
 @admin.register(Student)
-class StudentAdmin(admin.ModelAdmin):
+class StudentAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'registration_number', 'course', 'created_at', 'updated_at']
     list_filter = ['course']
     search_fields = ['name', 'registration_number', 'course__name']
+    search_indexes = [('student', ''), ('course', 'course')]
     ordering = ['name']
     
     def get_queryset(self, request):
@@ -120,16 +138,17 @@ class StudentAdmin(admin.ModelAdmin):
             return qs
         campus_id = request.session.get('campus_id')
         if campus_id:
-            return qs.filter(course__school__campus_id=campus_id)
+            return qs.filter(campus_id=campus_id)
         return qs.none()
 
 
 @admin.register(ExamRecord)
-class ExamRecordAdmin(admin.ModelAdmin):
+class ExamRecordAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['student', 'unit', 'cat1_score', 'cat2_score', 'cat_average', 'end_term_score', 'total_average']
     list_filter = ['unit__course', 'unit']
     search_fields = ['student__name', 'student__registration_number', 'unit__name']
-    readonly_fields = ['cat_average', 'total_average']
+    search_indexes = [('student', 'student'), ('unit', 'unit')]
+    readonly_fields = ['cat_average', 'total_average', 'grade', 'passed']
     ordering = ['student__name', 'unit__name']
     
     fieldsets = (
@@ -140,7 +159,7 @@ class ExamRecordAdmin(admin.ModelAdmin):
             'fields': ('cat1_score', 'cat2_score', 'end_term_score')
         }),
         ('Calculated Averages', {
-            'fields': ('cat_average', 'total_average'),
+            'fields': ('cat_average', 'total_average', 'grade', 'passed'),
             'classes': ('collapse',)
         }),
     )
@@ -152,10 +171,32 @@ class ExamRecordAdmin(admin.ModelAdmin):
             return qs
         campus_id = request.session.get('campus_id')
         if campus_id:
-            return qs.filter(student__course__school__campus_id=campus_id)
+            return qs.filter(campus_id=campus_id)
         return qs.none()
 
 
+@admin.register(GradingScheme)
+class GradingSchemeAdmin(admin.ModelAdmin):
+    list_display = ['name', 'campus', 'course', 'pass_mark', 'updated_at']
+    list_filter = ['campus']
+    search_fields = ['name', 'course__name']
+    ordering = ['name']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'campus', 'created_by', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = [
+        'kind', 'params', 'status', 'campus', 'created_by', 'worker', 'attempts', 'error',
+        'result_name', 'content_type', 'created_at', 'started_at', 'heartbeat_at', 'finished_at',
+    ]
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
 # Custom User Admin for superadmin functionality
 class CustomUserAdmin(UserAdmin):
     list_display = ['username', 'email', 'first_name', 'last_name', 'is_staff', 'is_superuser', 'date_joined']
@@ -0,0 +1,152 @@
+"""
+Course analytics, and class rankings and statistics for one course,
+term and year.
+
+Course analytics count units, students and exam records per course (and
+records per unit of one course) with correlated COUNT subqueries, so a
+page of them is a single query however many courses there are.
+
+
+The class's marks are read with one query into a students x units table
+of totals (CAT average + end term), kept as whole hundredths so sums and
+ties are exact. Positions, unit means, spreads and
+per-unit ranks are then worked out in memory: a class of a few thousand
+students with a dozen units is some tens of thousands of numbers, which
+a couple of sorts handle in milliseconds.
+"""
+from math import sqrt
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce, Round
+
+from .models import Course, ExamRecord, Student, Unit
+
+
+def count_per(queryset, field):
+    """
+    A COUNT of `queryset`'s rows whose `field` is the outer row's pk, as
+    a correlated subquery (0 when there are none).
+    """
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*'))
+    return Coalesce(Subquery(counts.values('count')), 0)
+
+
+def course_analytics(campus_id=None):
+    """
+    Courses of a campus (None: every campus), newest first, with their
+    school and `unit_count`, `student_count` and `record_count`.
+    """
+    courses = Course.objects.select_related('school')
+    if campus_id is not None:
+        courses = courses.filter(school__campus_id=campus_id)
+    return courses.annotate(
+        unit_count=count_per(Unit.objects.all(), 'course'),
+        student_count=count_per(Student.objects.all(), 'course'),
+        record_count=count_per(ExamRecord.objects.all(), 'unit__course'),
+    ).order_by('-created_at', '-id')
+
+
+def unit_analytics(course):
+    """The units of `course` by name, with their `record_count`."""
+    return Unit.objects.filter(course=course).annotate(
+        record_count=count_per(ExamRecord.objects.all(), 'unit'),
+    ).order_by('name', 'id')
+
+
+def competition_ranks(scores):
+    """
+    Rank a {key: score} mapping, highest score first. Equal scores share
+    a rank and the next rank skips past them (1, 2, 2, 4).
+    """
+    ranks = {}
+    previous = rank = None
+    for position, (key, score) in enumerate(sorted(scores.items(), key=lambda item: item[1], reverse=True), 1):
+        if score != previous:
+            rank, previous = position, score
+        ranks[key] = rank
+    return ranks
+
+
+def describe(values):
+    """Count, mean, population standard deviation, lowest and highest of some scores."""
+    values = list(values)
+    if not values:
+        return {'count': 0, 'mean': None, 'std_dev': None, 'lowest': None, 'highest': None}
+    mean = sum(values) / len(values)
+    return {
+        'count': len(values),
+        'mean': round(mean, 2),
+        'std_dev': round(sqrt(sum((value - mean) ** 2 for value in values) / len(values)), 2),
+        'lowest': min(values),
+        'highest': max(values),
+    }
+
+
+def class_rankings(course, term, year):
+    """
+    Positions and statistics for `course` in `term` and `year`, as plain
+    data ready for a template or JSON.
+
+    A student's average is over every unit the class sat that term, with
+    a unit the student has no mark for counting as 0, so missing a paper
+    cannot raise a position. Positions and unit ranks use competition
+    ranking, so tied students share a place.
+    """
+    # Totals as whole hundredths: exact to sum and compare, and no Decimal conversions
+    rows = ExamRecord.objects.filter(student__course=course, term=term, year=year).order_by().values_list(
+        'student_id', 'student__name', 'student__registration_number', 'unit_id', 'unit__name',
+        Cast(Round(F('total_average') * 100), IntegerField()), 'passed',
+    )
+
+    students = {}  # student id -> [name, registration number, {unit id: total}]
+    units = {}  # unit id -> name
+    by_unit = {}  # unit id -> {student id: total}
+    passes = {}  # unit id -> students who passed it
+    for student_id, name, registration_number, unit_id, unit_name, total, passed in rows:
+        if student_id not in students:
+            students[student_id] = [name, registration_number, {}]
+        students[student_id][2][unit_id] = total
+        if unit_id not in units:
+            units[unit_id] = unit_name
+            by_unit[unit_id] = {}
+            passes[unit_id] = 0
+        by_unit[unit_id][student_id] = total
+        passes[unit_id] += passed
+
+    unit_ids = sorted(units, key=lambda unit_id: units[unit_id].casefold())
+    sums = {student_id: sum(student[2].values()) for student_id, student in students.items()}
+    positions = competition_ranks(sums)
+    unit_ranks = [competition_ranks(by_unit[unit_id]) for unit_id in unit_ids]
+
+    ranked = []
+    for student_id in sorted(students, key=lambda student_id: (positions[student_id], students[student_id][0])):
+        name, registration_number, scores = students[student_id]
+        ranked.append({
+            'id': student_id,
+            'name': name,
+            'registration_number': registration_number,
+            'position': positions[student_id],
+            'total': sums[student_id] / 100,
+            'average': round(sums[student_id] / 100 / len(unit_ids), 2),
+            'units_sat': len(scores),
+            # In the order of 'units'; None where the student has no mark
+            'scores': [scores[unit_id] / 100 if unit_id in scores else None for unit_id in unit_ids],
+            'unit_ranks': [ranks.get(student_id) for ranks in unit_ranks],
+        })
+
+    return {
+        'course': {'id': course.id, 'name': course.name},
+        'term': term,
+        'year': year,
+        'units': [
+            {
+                'id': unit_id,
+                'name': units[unit_id],
+                'passed': passes[unit_id],
+                **describe(total / 100 for total in by_unit[unit_id].values()),
+            }
+            for unit_id in unit_ids
+        ],
+        'students': ranked,
+        'summary': describe(student['average'] for student in ranked),
+    }
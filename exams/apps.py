@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def install_search_indexes(sender, using, **kwargs):
+    from .search import install_search_indexes
+    install_search_indexes(using)
 
 
 class ExamsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'exams' 
\ No newline at end of file
+    name = 'exams'
+
+    def ready(self):
+        from . import campus, catalog, dashboard, grading, rosters, stamps  # Connect the cache, catalog, counter, grading, roster and data stamp signals
+
+        # Table rebuilds in later migrations can drop the SQLite search
+        # triggers, so check the search indexes after every migrate
+        post_migrate.connect(install_search_indexes, sender=self)
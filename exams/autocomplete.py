@@ -0,0 +1,98 @@
+"""
+Paged prefix lookups behind the student, unit and course pickers.
+
+The pickers used to render every row of the campus into a <select>, so
+page weight grew with the roster. They now hold only the current choice
+and ask these functions for a page of matches as the user types.
+
+A match is a case-insensitive prefix of the name (or, for students, of
+the registration number). It is written as a range on UPPER(column),
+which the expression indexes from migration 0020 answer with a seek on
+any backend; the LIKE alongside it only trims the range's edge cases.
+The typed prefix is upper-cased by the database too, so both sides go
+through the same UPPER(): SQLite's only folds ASCII letters, so there
+"mü" finds "Müller" but "MÜ" does not, where Python's str.upper() on
+the prefix alone would have found neither.
+"""
+import re
+
+from django.db.models import Q, Value
+from django.db.models.functions import Upper
+
+from .models import Course, Student, Unit
+
+
+AUTOCOMPLETE_PAGE_SIZE = 20
+
+
+def prefix_q(field, prefix):
+    """Rows whose `field` (an UPPER alias) starts with `prefix`, as an index range."""
+    q = Q(**{f'{field}__startswith': Upper(Value(prefix))})
+    # Only the leading ASCII run upper-cases the same in Python and in every database
+    key = re.match(r'[\x00-\x7f]*', prefix).group().upper()
+    if key:
+        # Every string starting with `key` sorts below `key` with its last character bumped
+        upper_bound = key[:-1] + chr(ord(key[-1]) + 1)
+        q &= Q(**{f'{field}__gte': key, f'{field}__lt': upper_bound})
+    return q
+
+
+def paginate(queryset, page, label, page_size=AUTOCOMPLETE_PAGE_SIZE):
+    """One page of `queryset` as {'results': [{'id', 'text'}], 'more': bool}."""
+    start = (page - 1) * page_size
+    rows = list(queryset[start:start + page_size + 1])
+    return {
+        'results': [{'id': row[0], 'text': label(*row[1:])} for row in rows[:page_size]],
+        'more': len(rows) > page_size,
+    }
+
+
+def search_students(campus_id, query='', page=1, course_id=None):
+    """Students of a campus (None: every campus) by name or registration number prefix."""
+    students = Student.objects.annotate(name_key=Upper('name')).alias(reg_key=Upper('registration_number'))
+    if campus_id is not None:
+        students = students.filter(campus_id=campus_id)
+    if course_id:
+        students = students.filter(course_id=course_id)
+    columns = ['id', 'name', 'registration_number', 'name_key']
+    query = query.strip()
+    if query:
+        # A UNION rather than an OR, so each half is a seek on its own index
+        students = students.order_by()
+        students = students.filter(prefix_q('name_key', query)).values_list(*columns).union(
+            students.filter(prefix_q('reg_key', query)).values_list(*columns)
+        )
+    else:
+        students = students.values_list(*columns)
+    return paginate(
+        students.order_by('name_key', 'id'), page,
+        lambda name, registration_number, name_key: f'{name} ({registration_number})',
+    )
+
+
+def search_units(campus_id, query='', page=1, course_id=None, student_id=None):
+    """Units of a campus (None: every campus) by name prefix, optionally of one course or student's course."""
+    units = Unit.objects.alias(name_key=Upper('name'))
+    if campus_id is not None:
+        units = units.filter(course__school__campus_id=campus_id)
+    if course_id:
+        units = units.filter(course_id=course_id)
+    if student_id:
+        units = units.filter(course__students__id=student_id)
+    query = query.strip()
+    if query:
+        units = units.filter(prefix_q('name_key', query))
+    units = units.order_by('name_key', 'id').values_list('id', 'name')
+    return paginate(units, page, str)
+
+
+def search_courses(campus_id, query='', page=1):
+    """Courses of a campus (None: every campus) by name prefix."""
+    courses = Course.objects.alias(name_key=Upper('name'))
+    if campus_id is not None:
+        courses = courses.filter(school__campus_id=campus_id)
+    query = query.strip()
+    if query:
+        courses = courses.filter(prefix_q('name_key', query))
+    courses = courses.order_by('name_key', 'id').values_list('id', 'name')
+    return paginate(courses, page, str)
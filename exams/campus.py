@@ -0,0 +1,35 @@
+"""
+Process-level cache of Campus rows, used to resolve `request.campus`.
+
+There are only a handful of campuses, so they are all loaded at once and
+dropped again whenever one is saved or deleted.
+"""
+import time
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Campus
+
+
+# Signals only reach this process; other workers reload after this long
+CAMPUS_CACHE_TIMEOUT = 300
+
+_cache = {'campuses': None, 'loaded_at': 0.0}
+
+
+def get_campus(campus_id):
+    """The Campus with this id from the cache, or None."""
+    campuses = _cache['campuses']
+    if campuses is None or time.monotonic() - _cache['loaded_at'] > CAMPUS_CACHE_TIMEOUT:
+        campuses = {campus.id: campus for campus in Campus.objects.all()}
+        _cache['campuses'], _cache['loaded_at'] = campuses, time.monotonic()
+    try:
+        return campuses.get(int(campus_id))
+    except (TypeError, ValueError):
+        return None
+
+
+@receiver([post_save, post_delete], sender=Campus, dispatch_uid='exams_clear_campus_cache')
+def clear_campus_cache(**kwargs):
+    _cache['campuses'] = None
@@ -0,0 +1,145 @@
+"""
+Per-campus catalogs: the schools, courses, units, years and terms that
+fill a campus's dropdowns and filters. Students are too many to list;
+their pickers use exams.autocomplete.
+
+A catalog is built with one query per list and cached in Django's cache
+under the campus's data version (see exams.versions).
+Saving or deleting a school, course or unit, or an exam record that
+adds or drops a year or term, bumps the version of its campus (and of
+its old campus when it moved) once the transaction commits, so the
+next page builds a fresh catalog and the stale one simply expires. Bulk
+writes, which send no signals, call touch_catalog() themselves.
+
+The catalog for "every campus", used by superusers with no campus
+selected, has its own version, bumped by every change.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from .metrics import CATALOG_LOOKUPS
+from .models import Course, ExamRecord, School, Student, Unit
+from .versions import bump_on_commit, campus_ids_of, get_version
+
+
+CatalogSchool = namedtuple('CatalogSchool', ['id', 'name'])
+CatalogCourse = namedtuple('CatalogCourse', ['id', 'name', 'school_id'])
+CatalogUnit = namedtuple('CatalogUnit', ['id', 'name', 'course_id'])
+
+
+class Catalog:
+    """One campus's dropdown data as plain tuples, cheap to pickle into the cache."""
+
+    def __init__(self, version, schools, courses, units, years, terms):
+        self.version = version
+        self.schools = schools
+        self.courses = courses
+        self.units = units
+        self.years = years
+        self.terms = terms
+
+    def course_choices(self, empty_label='---------'):
+        """(id, name) choices for a ModelChoiceField over the catalog's courses."""
+        return [('', empty_label)] + [(course.id, course.name) for course in self.courses]
+
+
+def _version_key(campus_id):
+    return f"exams:catalog:version:{campus_id or 'all'}"
+
+
+def _catalog_key(campus_id, version):
+    return f"exams:catalog:{campus_id or 'all'}:{version}"
+
+
+def campus_version(campus_id):
+    """The data version of a campus (None: every campus)."""
+    return get_version(_version_key(campus_id))
+
+
+def touch_catalog(*campus_ids):
+    """Invalidate the catalogs of `campus_ids`, and the every-campus one, once the transaction commits."""
+    bump_on_commit(_version_key(campus_id) for campus_id in {*campus_ids, None})
+
+
+def build_catalog(campus_id, version=None):
+    """Load a campus's catalog (None: every campus) from the database."""
+    schools, courses, units = School.objects.all(), Course.objects.all(), Unit.objects.all()
+    records = ExamRecord.objects.all()
+    if campus_id is not None:
+        schools = schools.filter(campus_id=campus_id)
+        courses = courses.filter(school__campus_id=campus_id)
+        units = units.filter(course__school__campus_id=campus_id)
+        records = records.filter(campus_id=campus_id)
+    return Catalog(
+        version,
+        schools=[CatalogSchool(*row) for row in schools.order_by('name').values_list('id', 'name')],
+        courses=[CatalogCourse(*row) for row in courses.order_by('name').values_list('id', 'name', 'school_id')],
+        units=[CatalogUnit(*row) for row in units.order_by('course__name', 'name').values_list('id', 'name', 'course_id')],
+        years=list(records.values_list('year', flat=True).distinct().order_by('year')),
+        terms=list(records.values_list('term', flat=True).distinct().order_by('term')),
+    )
+
+
+def campus_catalog(campus):
+    """The catalog of `campus` (a Campus, an id or None for every campus), from the cache when current."""
+    campus_id = getattr(campus, 'id', campus)
+    version = campus_version(campus_id)
+    key = _catalog_key(campus_id, version)
+    catalog = cache.get(key)
+    if catalog is not None:
+        CATALOG_LOOKUPS.inc('hit')
+        return catalog
+    CATALOG_LOOKUPS.inc('miss')
+    catalog = build_catalog(campus_id, version)
+    cache.set(key, catalog, settings.CATALOG_CACHE_TIMEOUT)
+    return catalog
+
+
+def catalog_stats():
+    """Hits, misses and hit rate of this process's catalog lookups."""
+    hits, misses = CATALOG_LOOKUPS.value('hit'), CATALOG_LOOKUPS.value('miss')
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / lookups if lookups else None}
+
+
+def _same_catalog_entry(record):
+    """Whether a saved record kept the campus, year and term it was loaded with."""
+    if not hasattr(record, '_loaded_year'):
+        return False
+    return (record._loaded_campus_id, record._loaded_year, record._loaded_term) == (record.campus_id, record.year, record.term)
+
+
+def catalog_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Changing marks leaves the years and terms alone
+    if sender is ExamRecord and not created and _same_catalog_entry(instance):
+        return
+    touch_catalog(*campus_ids_of(instance))
+
+
+def student_saved(sender, instance, raw=False, **kwargs):
+    # A student's records, and so possibly years and terms, follow them to a new campus
+    moved_from = getattr(instance, '_loaded_campus_id', instance.campus_id)
+    if not raw and moved_from != instance.campus_id:
+        touch_catalog(moved_from, instance.campus_id)
+
+
+def find_catalog_campuses(sender, instance, **kwargs):
+    # A cascade may delete the course or school before post_delete runs
+    instance._catalog_campus_ids = campus_ids_of(instance)
+
+
+def catalog_deleted(sender, instance, **kwargs):
+    touch_catalog(*getattr(instance, '_catalog_campus_ids', ()))
+
+
+# Connected per model, like the dashboard counters, so unrelated rows can still be fast-deleted
+for model in (School, Course, Unit, ExamRecord):
+    post_save.connect(catalog_saved, sender=model, dispatch_uid=f'exams_catalog_saved_{model.__name__}')
+    pre_delete.connect(find_catalog_campuses, sender=model, dispatch_uid=f'exams_catalog_deleting_{model.__name__}')
+    post_delete.connect(catalog_deleted, sender=model, dispatch_uid=f'exams_catalog_deleted_{model.__name__}')
+post_save.connect(student_saved, sender=Student, dispatch_uid='exams_catalog_saved_Student')
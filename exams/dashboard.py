@@ -0,0 +1,129 @@
+"""
+Per-campus dashboard counters, stored in CampusSummary.
+
+Creating or deleting a student, unit, course or exam record adjusts its
+campus's counters through signals. Bulk writes, which send no signals,
+call adjust_counters() themselves. Moving rows between campuses rebuilds
+the counters of both campuses. A campus without a summary row gets one
+built the first time it is read.
+"""
+from django.db.models import Count, F, Max, Sum
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.utils import timezone
+
+from .models import Campus, CampusSummary, Course, ExamRecord, School, Student, Unit
+
+
+COUNTER_FIELDS = ['students', 'units', 'courses', 'records']
+
+# Counted model -> (CampusSummary field, lookup from the model to its campus id)
+COUNTED_MODELS = {
+    Student: ('students', 'campus_id'),
+    Unit: ('units', 'course__school__campus_id'),
+    Course: ('courses', 'school__campus_id'),
+    ExamRecord: ('records', 'campus_id'),
+}
+
+
+def campus_of(instance):
+    """Campus id of a counted row."""
+    if isinstance(instance, (Student, ExamRecord)):
+        return instance.campus_id
+    if isinstance(instance, Course):
+        return School.objects.filter(id=instance.school_id).values_list('campus_id', flat=True).first()
+    return Course.objects.filter(id=instance.course_id).values_list('school__campus_id', flat=True).first()
+
+
+def adjust_counters(campus_id, touch=True, **deltas):
+    """
+    Add `deltas` (e.g. records=3) to a campus's counters in one UPDATE,
+    and set its last activity to now if `touch`.
+
+    A campus with no summary row yet is left alone: its row is counted
+    from scratch when first read, which includes this change.
+    """
+    if campus_id is None:
+        return
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if touch:
+        changes['last_activity'] = timezone.now()
+    if changes:
+        CampusSummary.objects.filter(campus_id=campus_id).update(**changes)
+
+
+def rebuild_counters(campus_ids=None):
+    """
+    Recount the summaries of `campus_ids` (default: every campus) from the
+    tables and return them, keyed by campus id.
+    """
+    campuses = Campus.objects.all()
+    if campus_ids is not None:
+        campuses = campuses.filter(id__in=[campus_id for campus_id in campus_ids if campus_id is not None])
+    summaries = {campus_id: CampusSummary(campus_id=campus_id) for campus_id in campuses.values_list('id', flat=True)}
+    if not summaries:
+        return {}
+
+    for model, (field, campus_lookup) in COUNTED_MODELS.items():
+        rows = model.objects.filter(**{f'{campus_lookup}__in': list(summaries)}).values(campus_lookup).annotate(
+            count=Count('id'), last=Max('updated_at'),
+        ).order_by()
+        for row in rows:
+            summary = summaries[row[campus_lookup]]
+            setattr(summary, field, row['count'])
+            if summary.last_activity is None or (row['last'] and row['last'] > summary.last_activity):
+                summary.last_activity = row['last']
+
+    CampusSummary.objects.bulk_create(
+        summaries.values(),
+        update_conflicts=True,
+        unique_fields=['campus'],
+        update_fields=COUNTER_FIELDS + ['last_activity'],
+    )
+    return summaries
+
+
+def campus_summary(campus_id):
+    """The CampusSummary of one campus, built on first use."""
+    summary = CampusSummary.objects.filter(campus_id=campus_id).first()
+    if summary is None:
+        summary = rebuild_counters([campus_id]).get(campus_id)
+    return summary
+
+
+def total_summary():
+    """An unsaved CampusSummary adding up every campus."""
+    missing = Campus.objects.filter(summary__isnull=True).values_list('id', flat=True)
+    if missing:
+        rebuild_counters(missing)
+    totals = CampusSummary.objects.aggregate(
+        **{field: Sum(field) for field in COUNTER_FIELDS}, last_activity=Max('last_activity'),
+    )
+    return CampusSummary(
+        last_activity=totals.pop('last_activity'),
+        **{field: count or 0 for field, count in totals.items()},
+    )
+
+
+def count_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    field, campus_lookup = COUNTED_MODELS[sender]
+    adjust_counters(campus_of(instance), **{field: 1 if created else 0})
+
+
+def find_deleted_campus(sender, instance, **kwargs):
+    # A cascade may delete the course or school before post_delete runs
+    instance._dashboard_campus_id = campus_of(instance)
+
+
+def count_deleted(sender, instance, **kwargs):
+    field, campus_lookup = COUNTED_MODELS[sender]
+    adjust_counters(getattr(instance, '_dashboard_campus_id', None), **{field: -1})
+
+
+# Connected per model: a receiver for every sender would stop Django
+# fast-deleting unrelated rows such as expired sessions
+for model in COUNTED_MODELS:
+    post_save.connect(count_saved, sender=model, dispatch_uid=f'exams_dashboard_saved_{model.__name__}')
+    pre_delete.connect(find_deleted_campus, sender=model, dispatch_uid=f'exams_dashboard_deleting_{model.__name__}')
+    post_delete.connect(count_deleted, sender=model, dispatch_uid=f'exams_dashboard_deleted_{model.__name__}')
@@ -0,0 +1,63 @@
+"""
+Streaming CSV exports.
+
+Rows are read with QuerySet.iterator() and written one line at a time,
+so an export holds one database chunk in memory however many rows it
+has.
+"""
+import csv
+
+from django.http import StreamingHttpResponse
+
+
+# Rows fetched from the database per round trip while exporting
+EXPORT_CHUNK_SIZE = 2000
+
+# (CSV header, ExamRecord lookup) for the exam records export
+RECORD_EXPORT_COLUMNS = [
+    ('Student Name', 'student__name'),
+    ('Registration Number', 'student__registration_number'),
+    ('Course', 'unit__course__name'),
+    ('Unit', 'unit__name'),
+    ('Year', 'year'),
+    ('Term', 'term'),
+    ('CAT 1', 'cat1_score'),
+    ('CAT 2', 'cat2_score'),
+    ('End Term', 'end_term_score'),
+    ('CAT Average', 'cat_average'),
+    ('Total', 'total_average'),
+]
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    """Yield `header` and then each of `rows` as CSV-encoded lines."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_records_rows(records):
+    """Export rows for an ExamRecord queryset, with averages to two decimals."""
+    rows = records.values_list(*[lookup for header, lookup in RECORD_EXPORT_COLUMNS]).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE,
+    )
+    for row in rows:
+        *details, cat_average, total = row
+        yield (*details, f'{cat_average:.2f}', f'{total:.2f}')
+
+
+def stream_records_csv(records, filename):
+    response = StreamingHttpResponse(
+        csv_lines([header for header, lookup in RECORD_EXPORT_COLUMNS], export_records_rows(records)),
+        content_type='text/csv',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
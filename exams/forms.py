@@ -1,8 +1,33 @@
 from django import forms
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.urls import reverse_lazy
 from .models import Course, Unit, Student, ExamRecord
 
 
+class AutocompleteSelect(forms.Select):
+    """
+    A <select> for a ModelChoiceField that renders only its current choice.
+    exams/autocomplete.js loads matching options from `url` as the user
+    types. `forward` maps lookup parameters to the ids of other fields
+    whose values are sent along, e.g. {'student': 'id_student'}.
+    """
+
+    def __init__(self, url, forward=None, attrs=None):
+        attrs = {'class': 'form-control', **(attrs or {})}
+        attrs['data-autocomplete-url'] = url
+        if forward:
+            attrs['data-autocomplete-forward'] = ','.join(f'{param}={field_id}' for param, field_id in forward.items())
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        field = self.choices.field
+        selected = [v for v in value if str(v).isdigit()]
+        options = [self.create_option(name, '', field.empty_label or '', not selected, 0)]
+        for index, obj in enumerate(field.queryset.filter(pk__in=selected), 1):
+            options.append(self.create_option(name, obj.pk, field.label_from_instance(obj), True, index))
+        return [(None, options, 0)]
+
+
 class CourseForm(forms.ModelForm):
     """Form for creating and editing courses."""
     class Meta:
@@ -43,8 +68,8 @@ class ExamRecordForm(forms.ModelForm):
         model = ExamRecord
         fields = ['student', 'unit', 'cat1_score', 'cat2_score', 'end_term_score']
         widgets = {
-            'student': forms.Select(attrs={'class': 'form-control'}),
-            'unit': forms.Select(attrs={'class': 'form-control'}),
+            'student': AutocompleteSelect(reverse_lazy('exams:autocomplete_students')),
+            'unit': AutocompleteSelect(reverse_lazy('exams:autocomplete_units'), forward={'student': 'id_student'}),
             'cat1_score': forms.NumberInput(attrs={
                 'class': 'form-control cat-score',
                 'placeholder': '0-30',
@@ -98,11 +123,11 @@ class StudentUnitForm(forms.Form):
     """Form for selecting student and unit for exam entry."""
     student = forms.ModelChoiceField(
         queryset=Student.objects.all(),
-        widget=forms.Select(attrs={'class': 'form-control'}),
+        widget=AutocompleteSelect(reverse_lazy('exams:autocomplete_students')),
         empty_label="Select a student"
     )
     unit = forms.ModelChoiceField(
         queryset=Unit.objects.all(),
-        widget=forms.Select(attrs={'class': 'form-control'}),
+        widget=AutocompleteSelect(reverse_lazy('exams:autocomplete_units'), forward={'student': 'id_student'}),
         empty_label="Select a unit"
     ) 
\ No newline at end of file
@@ -0,0 +1,276 @@
+"""
+Grading schemes: which grade and remark a total earns, and whether it passes.
+
+A GradingScheme can cover one course, one campus or (with neither set)
+every campus, and the most specific one applies; DEFAULT_GRADE_BANDS
+apply where there is none. Schemes are compiled into a sorted list of
+thresholds that scores are looked up in with bisect. Each process
+keeps the compiled schemes until the schemes version (a VersionStamp
+counter, bumped when a scheme is saved or deleted) moves. The version
+is read once per request or job, not per lookup, so a scheme saved in
+another process is picked up by the next request.
+
+Exam records store their grade and pass flag. Saving or deleting a
+scheme regrades the records it covers, and those it covered before it
+moved, with one UPDATE per scheme.
+
+Models are imported where they are used: report worker processes
+unpickle compiled schemes before Django is set up.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.signals import request_started
+from django.db.models import BooleanField, Case, CharField, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+# Grade bands used where no GradingScheme applies
+DEFAULT_GRADE_BANDS = [
+    {'min_score': 75, 'grade': 'A', 'remark': 'Distinction'},
+    {'min_score': 60, 'grade': 'B', 'remark': 'Credit'},
+    {'min_score': 40, 'grade': 'C', 'remark': 'Pass'},
+    {'min_score': 0, 'grade': 'D', 'remark': 'Fail'},
+]
+DEFAULT_PASS_MARK = 40
+
+Band = namedtuple('Band', ['min_score', 'grade', 'remark', 'passed'])
+
+
+class CompiledScheme:
+    """A grading scheme's bands sorted by threshold, for bisect lookups."""
+
+    def __init__(self, bands, pass_mark, name='Default', scheme_id=None, updated_at=None):
+        self.name = name
+        self.scheme_id = scheme_id
+        self.updated_at = updated_at
+        self.pass_mark = float(pass_mark)
+        self.bands = [
+            Band(float(band['min_score']), band['grade'], band['remark'], float(band['min_score']) >= self.pass_mark)
+            for band in sorted(bands, key=lambda band: float(band['min_score']))
+        ]
+        self.thresholds = [band.min_score for band in self.bands]
+
+    def band(self, score):
+        """The band `score` falls in; scores under the lowest threshold get the lowest band."""
+        return self.bands[max(bisect_right(self.thresholds, score) - 1, 0)]
+
+    def grade_scores(self, scores):
+        """The band of each score in `scores`, in order."""
+        bands, thresholds = self.bands, self.thresholds
+        return [bands[max(index - 1, 0)] for index in map(bisect_right, [thresholds] * len(scores), scores)]
+
+    def legend(self):
+        """(score range, grade, remark) per band, highest first, for printed reports."""
+        legend = []
+        upper = 100
+        for band in reversed(self.bands):
+            low = _number(band.min_score)
+            legend.append((f'{low} – {_number(upper)}', band.grade, band.remark))
+            upper = band.min_score - 1 if band.min_score == int(band.min_score) else band.min_score
+        return legend
+
+    def client_bands(self):
+        """The bands highest first as plain dicts, for grading in the browser via json_script."""
+        return [{'min_score': band.min_score, 'grade': band.grade} for band in reversed(self.bands)]
+
+    def grade_expression(self):
+        """The grade of ExamRecord.total_average as an SQL CASE."""
+        return Case(
+            *[When(total_average__gte=band.min_score, then=Value(band.grade)) for band in reversed(self.bands[1:])],
+            default=Value(self.bands[0].grade),
+            output_field=CharField(),
+        )
+
+    def passed_expression(self):
+        """Whether ExamRecord.total_average passes, as an SQL CASE."""
+        passing = [band.min_score for band in self.bands if band.passed]
+        if not passing:
+            return Value(False)
+        if passing[0] <= self.bands[0].min_score:
+            return Value(True)
+        return Case(
+            When(total_average__gte=passing[0], then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        )
+
+
+DEFAULT_SCHEME = CompiledScheme(DEFAULT_GRADE_BANDS, DEFAULT_PASS_MARK)
+
+SCHEMES_VERSION_KEY = 'exams:schemes:version'
+
+_cache = {'schemes': None, 'version': None, 'checked': False}
+
+
+def default_grade_bands():
+    return [dict(band) for band in DEFAULT_GRADE_BANDS]
+
+
+def _number(value):
+    return int(value) if value == int(value) else value
+
+
+def validate_bands(bands):
+    """Raise ValidationError unless `bands` is a usable list of grade bands."""
+    if not isinstance(bands, list) or not bands:
+        raise ValidationError('Give at least one grade band.')
+    thresholds = set()
+    for band in bands:
+        if not isinstance(band, dict) or not {'min_score', 'grade', 'remark'} <= set(band):
+            raise ValidationError('Each band needs a min_score, a grade and a remark.')
+        try:
+            min_score = Decimal(str(band['min_score']))
+        except InvalidOperation:
+            raise ValidationError(f"min_score {band['min_score']!r} is not a number.")
+        if not 0 <= min_score <= 100:
+            raise ValidationError(f'min_score {min_score} is not between 0 and 100.')
+        if min_score in thresholds:
+            raise ValidationError(f'Two bands start at {min_score}.')
+        thresholds.add(min_score)
+        if not str(band['grade']).strip() or len(str(band['grade'])) > 10:
+            raise ValidationError('Grades must be 1 to 10 characters long.')
+
+
+def schemes_version():
+    """The schemes version: moves whenever a scheme is saved or deleted."""
+    from .versions import get_version
+
+    return get_version(SCHEMES_VERSION_KEY)
+
+
+def compiled_schemes():
+    """
+    Every scheme compiled, keyed ('course', id), ('campus', id) or
+    'default'. The first call in a request or job reads schemes_version();
+    the schemes themselves are only reloaded when it moved.
+    """
+    from .models import GradingScheme
+
+    schemes = _cache['schemes']
+    if schemes is not None and _cache['checked']:
+        return schemes
+    version = schemes_version()
+    if schemes is None or version != _cache['version']:
+        schemes = {}
+        for scheme in GradingScheme.objects.all():
+            if scheme.course_id:
+                key = ('course', scheme.course_id)
+            elif scheme.campus_id:
+                key = ('campus', scheme.campus_id)
+            else:
+                key = 'default'
+            schemes[key] = CompiledScheme(scheme.bands, scheme.pass_mark, scheme.name, scheme.id, scheme.updated_at)
+        _cache['schemes'], _cache['version'] = schemes, version
+    _cache['checked'] = True
+    return schemes
+
+
+def scheme_for(campus_id=None, course_id=None, schemes=None):
+    """The compiled scheme that applies to a course at a campus (looked up in `schemes` if given)."""
+    schemes = compiled_schemes() if schemes is None else schemes
+    return (
+        schemes.get(('course', course_id))
+        or schemes.get(('campus', campus_id))
+        or schemes.get('default')
+        or DEFAULT_SCHEME
+    )
+
+
+def grade_scores(scores, campus_id=None, course_id=None):
+    """Grade a whole list of totals for one course and campus; returns their Bands in order."""
+    return scheme_for(campus_id, course_id).grade_scores(scores)
+
+
+def assign_grades(records):
+    """
+    Set `grade` and `passed` on unsaved ExamRecords whose averages are
+    calculated, as bulk_create/bulk_update need (they bypass save()).
+    """
+    from .models import Unit
+
+    unloaded = {record.unit_id for record in records if 'unit' not in record._state.fields_cache}
+    course_of_unit = dict(Unit.objects.filter(id__in=unloaded).values_list('id', 'course_id')) if unloaded else {}
+    schemes = compiled_schemes()
+    groups = {}
+    for record in records:
+        course_id = record.unit.course_id if record.unit_id not in unloaded else course_of_unit.get(record.unit_id)
+        groups.setdefault(scheme_for(record.campus_id, course_id, schemes), []).append(record)
+    for scheme, group in groups.items():
+        for record, band in zip(group, scheme.grade_scores([record.total_average for record in group])):
+            record.grade, record.passed = band.grade, band.passed
+
+
+def scheme_scopes():
+    """(compiled scheme, Q) pairs that between them cover every ExamRecord once."""
+    schemes = compiled_schemes()
+    course_ids = [key[1] for key in schemes if key[0] == 'course']
+    campus_ids = [key[1] for key in schemes if key[0] == 'campus']
+    other_courses = ~Q(unit__course_id__in=course_ids)
+    scopes = [(schemes[('course', course_id)], Q(unit__course_id=course_id)) for course_id in course_ids]
+    scopes += [(schemes[('campus', campus_id)], Q(campus_id=campus_id) & other_courses) for campus_id in campus_ids]
+    scopes.append((schemes.get('default', DEFAULT_SCHEME), ~Q(campus_id__in=campus_ids) & other_courses))
+    return scopes
+
+
+def regrade(records=None):
+    """
+    Recompute grade and passed for `records` (an ExamRecord queryset,
+    default all) in SQL, one UPDATE per scheme. Returns the rows updated.
+    """
+    from .models import ExamRecord
+    from .stamps import touch_campus_data
+
+    records = ExamRecord.objects.all() if records is None else records
+    updated = 0
+    for scheme, scope in scheme_scopes():
+        updated += records.filter(scope).update(grade=scheme.grade_expression(), passed=scheme.passed_expression())
+    if updated:
+        # update() sends no signals; pass lists read the stored `passed`
+        touch_campus_data(*records.order_by().values_list('campus_id', flat=True).distinct())
+    return updated
+
+
+def clear_scheme_cache():
+    _cache['schemes'] = None
+
+
+@receiver(request_started, dispatch_uid='exams_recheck_schemes')
+def recheck_schemes(**kwargs):
+    """Read the schemes version again on the next lookup: called as each request and job starts."""
+    _cache['checked'] = False
+
+
+def _scheme_records(campus_id, course_id):
+    """The records a scheme for `course_id`, `campus_id` or (neither) every campus covers."""
+    from .models import ExamRecord
+
+    if course_id:
+        return ExamRecord.objects.filter(unit__course_id=course_id)
+    if campus_id:
+        return ExamRecord.objects.filter(campus_id=campus_id)
+    return ExamRecord.objects.all()
+
+
+@receiver([post_save, post_delete], sender='exams.GradingScheme', dispatch_uid='exams_regrade_on_scheme_change')
+def scheme_changed(instance, **kwargs):
+    """
+    Drop the cached schemes, bump the schemes version for other processes
+    and regrade the records the changed scheme covers now and covered before.
+    """
+    from .versions import bump_on_commit
+
+    clear_scheme_cache()
+    bump_on_commit([SCHEMES_VERSION_KEY])
+    scopes = {
+        (instance.campus_id, instance.course_id),
+        (getattr(instance, '_loaded_campus_id', instance.campus_id), getattr(instance, '_loaded_course_id', instance.course_id)),
+    }
+    if (None, None) in scopes:
+        regrade()
+        return
+    for campus_id, course_id in scopes:
+        regrade(_scheme_records(campus_id, course_id))
@@ -0,0 +1,380 @@
+"""
+Bulk CSV imports.
+
+Files are read as a stream and handled in batches: each batch resolves
+the students, units or registration numbers it refers to with a set
+lookup or two, validates every row in one pass and is written with a
+single bulk query in its own transaction.
+Row problems are collected into a report instead of stopping the import.
+"""
+import csv
+import io
+import re
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Upper
+
+from .catalog import touch_catalog
+from .rosters import touch_rosters
+from .stamps import touch_campus_data
+from .dashboard import adjust_counters
+from .models import Course, ExamRecord, Student, Unit
+from .services import MAX_CAT_SCORE, MAX_END_TERM_SCORE, parse_score, save_records
+
+
+# Rows validated and written together
+IMPORT_BATCH_SIZE = 2000
+
+# Row errors kept in an import report; later ones are only counted
+MAX_REPORTED_ERRORS = 500
+
+# Score values accepted in files: plain non-negative decimals
+NUMBER = re.compile(r'\d+(\.\d*)?|\.\d+')
+
+# Accepted header spellings (after lower-casing and turning spaces and
+# dashes into underscores) for each marks import column
+MARKS_COLUMNS = {
+    'registration_number': ['registration_number', 'reg_no', 'regno', 'adm_no', 'admission_number'],
+    'unit': ['unit', 'unit_name', 'subject'],
+    'cat1': ['cat1', 'cat_1'],
+    'cat2': ['cat2', 'cat_2'],
+    'endterm': ['endterm', 'end_term', 'end_term_score'],
+    'term': ['term', 'semester'],
+    'year': ['year'],
+}
+
+# Accepted header spellings for each student roster column
+STUDENT_COLUMNS = {
+    'name': ['name', 'student_name', 'full_name'],
+    'registration_number': MARKS_COLUMNS['registration_number'],
+    'course': ['course', 'course_name', 'programme', 'program'],
+}
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be imported (e.g. missing columns)."""
+
+
+def new_report(dry_run, *counters):
+    report = {'rows': 0, 'error_count': 0, 'errors': [], 'dry_run': dry_run}
+    report.update(dict.fromkeys(counters, 0))
+    return report
+
+
+def report_error(report, line, message, kind=None):
+    """Record a skipped row; `kind` names an extra counter to bump, e.g. 'conflicts'."""
+    report['error_count'] += 1
+    if kind:
+        report[kind] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append((line, message))
+
+
+def text_stream(file):
+    """Text view of a binary file or upload; BOMs from Excel are dropped."""
+    if isinstance(file, io.TextIOBase):
+        return file
+    # Uploads wrap the real file object in .file
+    return io.TextIOWrapper(getattr(file, 'file', file), encoding='utf-8-sig', newline='')
+
+
+def read_csv(file, columns, required):
+    """
+    Yield (line number, row) for each data row of a CSV file, with the
+    row's keys mapped to the names in `columns` and values stripped.
+
+    Raises ImportFileError if any `required` column is missing.
+    """
+    reader = csv.reader(text_stream(file))
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise ImportFileError('The file is empty.')
+    aliases = {alias: name for name, spellings in columns.items() for alias in spellings}
+    names = [aliases.get(title.strip().lower().replace(' ', '_').replace('-', '_')) for title in header]
+    missing = [name for name in required if name not in names]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}.")
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        row = {name: value.strip() for name, value in zip(names, values) if name}
+        yield reader.line_num, row
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_marks(file, campus=None, term=None, year=None, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import exam marks from a CSV file.
+
+    Columns: registration number, unit, cat1, cat2, endterm, and term and
+    year unless given as arguments. Students are matched by registration
+    number (within `campus` when given) and units by name, ignoring case,
+    within the student's course. Scores must be within 0-30 (CATs) and
+    0-70 (end term); blank scores count as 0, as on the marks forms.
+    Terms are matched ignoring case, and an existing record keeps its
+    spelling of the term. A later row for the same student, unit, term
+    and year replaces an earlier one.
+
+    With dry_run nothing is written, but the report still counts the
+    records that would be created, updated or left unchanged.
+    """
+    required = ['registration_number', 'unit', 'cat1', 'cat2', 'endterm']
+    required += [name for name, default in (('term', term), ('year', year)) if not default]
+    rows = read_csv(file, MARKS_COLUMNS, required)
+
+    report = new_report(dry_run, 'created', 'updated', 'unchanged')
+    students = {}  # registration number -> (id, course id, campus id), or None if unknown
+    units = {}  # course id -> {unit name casefolded: unit id}
+    written = {}  # dry run: record key -> (term, scores) of the records earlier batches would have written
+    for batch in batches(rows, batch_size):
+        report['rows'] += len(batch)
+        _resolve_students(batch, students, campus)
+        _resolve_units(batch, students, units)
+
+        pending = {}
+        for line, row in batch:
+            record = _marks_record(line, row, students, units, term, year, report)
+            if record is not None:
+                pending[(record.student_id, record.unit_id, record.term.upper(), record.year)] = record
+        if pending:
+            _write_marks(pending, dry_run, report, written)
+    return report
+
+
+def _resolve_students(batch, students, campus):
+    wanted = {row.get('registration_number') for line, row in batch} - set(students) - {None, ''}
+    if not wanted:
+        return
+    found = Student.objects.filter(registration_number__in=wanted)
+    if campus:
+        found = found.filter(campus=campus)
+    for registration_number, student_id, course_id, campus_id in found.values_list(
+        'registration_number', 'id', 'course_id', 'campus_id',
+    ):
+        students[registration_number] = (student_id, course_id, campus_id)
+    for registration_number in wanted - set(students):
+        students[registration_number] = None
+
+
+def _resolve_units(batch, students, units):
+    course_ids = {
+        students[row['registration_number']][1]
+        for line, row in batch if students.get(row.get('registration_number'))
+    } - set(units)
+    if not course_ids:
+        return
+    for course_id in course_ids:
+        units[course_id] = {}
+    for unit_id, course_id, name in Unit.objects.filter(course_id__in=course_ids).values_list('id', 'course_id', 'name'):
+        units[course_id][name.casefold()] = unit_id
+
+
+def _marks_record(line, row, students, units, term, year, report):
+    """Validate one row, returning an unsaved ExamRecord or None after reporting the problems."""
+    problems = []
+    student = students.get(row.get('registration_number'))
+    unit_id = None
+    if not row.get('registration_number'):
+        problems.append('missing registration number')
+    elif student is None:
+        problems.append(f"unknown registration number {row['registration_number']}")
+    else:
+        unit_id = units[student[1]].get(row.get('unit', '').casefold())
+        if unit_id is None:
+            problems.append(f"unit '{row.get('unit', '')}' is not part of the student's course")
+
+    scores = []
+    for column, label, maximum in (('cat1', 'CAT 1', MAX_CAT_SCORE), ('cat2', 'CAT 2', MAX_CAT_SCORE), ('endterm', 'end term', MAX_END_TERM_SCORE)):
+        value = row.get(column)
+        # parse_score reads junk as 0 for the forms; in a file it is a mistake
+        score = parse_score(value, maximum) if not value or NUMBER.fullmatch(value) else None
+        if score is None:
+            problems.append(f'{label} must be a number between 0 and {maximum}')
+        scores.append(score)
+    cat1, cat2, end_term = scores
+
+    record_term = term or row.get('term')
+    record_year = year or row.get('year')
+    if not record_term:
+        problems.append('missing term')
+    try:
+        record_year = int(record_year)
+    except (TypeError, ValueError):
+        problems.append('year must be a number')
+
+    if problems:
+        report_error(report, line, '; '.join(problems))
+        return None
+    record = ExamRecord(
+        student_id=student[0],
+        campus_id=student[2],
+        unit_id=unit_id,
+        term=record_term,
+        year=record_year,
+        cat1_score=cat1,
+        cat2_score=cat2,
+        end_term_score=end_term,
+    )
+    record.calculate_averages()
+    return record
+
+
+def _write_marks(pending, dry_run, report, written):
+    """
+    Count and (unless dry_run) upsert one batch of validated records,
+    keyed (student id, unit id, upper-cased term, year).
+    """
+    student_ids = {key[0] for key in pending}
+    with transaction.atomic():
+        existing = {
+            values[:4]: (values[4], values[5:])
+            for values in ExamRecord.objects.annotate(term_key=Upper('term')).filter(
+                student_id__in=student_ids,
+                unit_id__in={key[1] for key in pending},
+                term_key__in={key[2] for key in pending},
+                year__in={key[3] for key in pending},
+            ).values_list('student_id', 'unit_id', 'term_key', 'year', 'term', *ExamRecord.SCORE_FIELDS)
+        }
+        # A dry run wrote nothing, so what earlier batches would have written is only known here
+        existing.update((key, written[key]) for key in pending.keys() & written.keys())
+        to_write = []
+        created = {}  # campus id -> records created
+        for key, record in pending.items():
+            scores = (record.cat1_score, record.cat2_score, record.end_term_score)
+            if key not in existing:
+                report['created'] += 1
+                created[record.campus_id] = created.get(record.campus_id, 0) + 1
+            else:
+                # Upsert onto the stored spelling, not a second record in another case
+                record.term, stored_scores = existing[key]
+                if stored_scores == scores:
+                    report['unchanged'] += 1
+                    continue
+                report['updated'] += 1
+            to_write.append(record)
+            if dry_run:
+                written[key] = (record.term, scores)
+        if to_write and not dry_run:
+            save_records(to_write)
+            for campus_id in {record.campus_id for record in to_write}:
+                adjust_counters(campus_id, records=created.get(campus_id, 0))
+            touch_catalog(*created)
+
+
+def import_students(file, campus, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import a student roster from a CSV file into `campus`.
+
+    Columns: name, registration number and course, matched by name,
+    ignoring case, among the campus's courses. A registration number that
+    is already registered to the same name and course is counted as
+    existing, so a roster can be imported again safely. Otherwise rows are
+    skipped and reported: as duplicates when the number appeared earlier
+    in the file, as conflicts when it belongs to a different student, and
+    as errors when a field is missing or the course is unknown.
+    """
+    rows = read_csv(file, STUDENT_COLUMNS, ['name', 'registration_number', 'course'])
+    courses = _campus_courses(campus)
+
+    report = new_report(dry_run, 'created', 'existing', 'duplicates', 'conflicts')
+    seen = {}  # registration number -> line it was first read from
+    for batch in batches(rows, batch_size):
+        report['rows'] += len(batch)
+        pending = {}
+        for line, row in batch:
+            student = _roster_student(line, row, courses, campus, seen, report)
+            if student is not None:
+                seen[student.registration_number] = line
+                pending[student.registration_number] = (line, student)
+        if pending:
+            _write_students(pending, dry_run, report)
+    # Conflicts are found after the rest of their batch
+    report['errors'].sort()
+    return report
+
+
+def _campus_courses(campus):
+    """Course ids by casefolded name; None for names shared by several courses."""
+    courses = {}
+    for course_id, name in Course.objects.filter(school__campus=campus).values_list('id', 'name'):
+        key = name.casefold()
+        courses[key] = None if key in courses else course_id
+    return courses
+
+
+def _roster_student(line, row, courses, campus, seen, report):
+    """Validate one roster row, returning an unsaved Student or None after reporting the problems."""
+    name = row.get('name', '')
+    registration_number = row.get('registration_number', '')
+    course = row.get('course', '')
+    if registration_number in seen:
+        report_error(report, line, f'{registration_number} is repeated from line {seen[registration_number]}', 'duplicates')
+        return None
+
+    problems = []
+    for field, value in (('name', name), ('registration_number', registration_number)):
+        max_length = Student._meta.get_field(field).max_length
+        label = field.replace('_', ' ')
+        if not value:
+            problems.append(f'missing {label}')
+        elif len(value) > max_length:
+            problems.append(f'{label} is longer than {max_length} characters')
+    course_id = courses.get(course.casefold())
+    if not course:
+        problems.append('missing course')
+    elif course.casefold() not in courses:
+        problems.append(f"course '{course}' does not exist at {campus.name}")
+    elif course_id is None:
+        problems.append(f"more than one course at {campus.name} is called '{course}'")
+
+    if problems:
+        report_error(report, line, '; '.join(problems))
+        return None
+    return Student(name=name, registration_number=registration_number, course_id=course_id, campus_id=campus.id)
+
+
+def _registered(registration_numbers):
+    return {
+        values[0]: values[1:]
+        for values in Student.objects.filter(registration_number__in=registration_numbers).values_list(
+            'registration_number', 'name', 'course_id', 'course__name', 'campus__name',
+        )
+    }
+
+
+def _write_students(pending, dry_run, report):
+    """Check one batch against registered students and (unless dry_run) insert the new ones."""
+    with transaction.atomic():
+        registered = _registered(pending)
+        new = [student for number, (line, student) in pending.items() if number not in registered]
+        if new and not dry_run:
+            try:
+                with transaction.atomic():
+                    Student.objects.bulk_create(new)
+            except IntegrityError:
+                # Registered by someone else since the lookup: look again
+                registered = _registered(pending)
+                new = [student for number, (line, student) in pending.items() if number not in registered]
+                Student.objects.bulk_create(new)
+            if new:
+                # bulk_create sends no signals, so count the new students here
+                adjust_counters(new[0].campus_id, students=len(new))
+                touch_rosters(*{student.course_id for student in new})
+                touch_campus_data(new[0].campus_id)
+
+    report['created'] += len(new)
+    for number, (line, student) in pending.items():
+        if number not in registered:
+            continue
+        name, course_id, course, campus = registered[number]
+        if course_id == student.course_id and name.casefold() == student.name.casefold():
+            report['existing'] += 1
+        else:
+            report_error(report, line, f'{number} is already registered to {name} ({course}, {campus})', 'conflicts')
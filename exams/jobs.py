@@ -0,0 +1,347 @@
+"""
+Background jobs kept in the database.
+
+Heavy exports are submitted as Job rows and built by `manage.py
+run_workers` instead of inside the request (or inside it, with
+settings.RUN_JOBS_INLINE); pages poll the job's status and download the
+finished file. There is no broker: a worker claims the oldest queued job
+with a conditional UPDATE, so any number of workers on any number of
+hosts can share the table.
+
+A claim is identified by the job's (worker, attempts). While the job
+runs, a heartbeat thread touches it every JOB_HEARTBEAT_INTERVAL
+seconds; only jobs whose heartbeat has stopped are requeued, and a
+worker writes its outcome only while its claim still holds, so a job
+taken over by another worker is never finished twice.
+"""
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from .grading import recheck_schemes, scheme_for
+from .metrics import docx_render
+from .models import Campus, Course, ExamRecord, Job, Student
+from .reports import (
+    DOCX_CONTENT_TYPE, render_marks_entry_sheet, render_pass_list, render_progress_report, report_filename, report_rows,
+    stream_reports_zip,
+)
+from .search import search_q
+from .services import RECORD_SORT_ORDERINGS, filter_records, get_pass_list
+
+
+logger = logging.getLogger(__name__)
+
+# A job whose worker vanished is retried until it has been started this often
+JOB_MAX_ATTEMPTS = 3
+
+# kind -> (label, handler); handlers take the job's params and return
+# (filename, content type, content), the content as bytes or as an
+# iterable of byte chunks
+JOB_HANDLERS = {}
+
+
+def job_handler(kind, label):
+    """Register the decorated function as the handler for `kind` jobs."""
+    def register(function):
+        JOB_HANDLERS[kind] = (label, function)
+        return function
+    return register
+
+
+def job_label(kind):
+    return JOB_HANDLERS[kind][0] if kind in JOB_HANDLERS else kind
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def submit_job(kind, params, campus=None, user=None):
+    """
+    Queue a `kind` job with JSON-serialisable `params` and return it.
+
+    With settings.RUN_JOBS_INLINE the job runs straight away instead,
+    for development setups without a worker.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind {kind!r}')
+    job = Job.objects.create(
+        kind=kind,
+        params=params,
+        campus=campus,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    if settings.RUN_JOBS_INLINE:
+        now = timezone.now()
+        job.status, job.worker, job.attempts, job.started_at, job.heartbeat_at = Job.RUNNING, worker_name(), 1, now, now
+        Job.objects.filter(id=job.id).update(
+            status=job.status, worker=job.worker, attempts=job.attempts, started_at=now, heartbeat_at=now,
+        )
+        run_job(job)
+        job.refresh_from_db()
+    return job
+
+
+def claim_job(worker):
+    """Mark the oldest queued job as running for `worker` and return it, or None if the queue is empty."""
+    queued = Job.objects.filter(status=Job.QUEUED).order_by('created_at', 'id')
+    while True:
+        job_id = queued.values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        now = timezone.now()
+        claimed = Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+        # Another worker took it first; try the next one
+
+
+def owned(job):
+    """The job's row, as long as it is still running under the claim `job` was loaded with."""
+    return Job.objects.filter(id=job.id, status=Job.RUNNING, worker=job.worker, attempts=job.attempts)
+
+
+class Heartbeat(threading.Thread):
+    """Touches a running job's heartbeat_at every `interval` seconds until stopped."""
+
+    def __init__(self, job, interval):
+        super().__init__(name=f'job-{job.id}-heartbeat', daemon=True)
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                owned(self.job).update(heartbeat_at=timezone.now())
+        finally:
+            connection.close()  # This thread's own connection
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def write_result(job, filename, content):
+    """Save `content` (bytes or byte chunks) to the job result storage and return the stored name and size."""
+    chunks = [content] if isinstance(content, (bytes, bytearray)) else content
+    size = 0
+    with tempfile.TemporaryFile() as spool:
+        for chunk in chunks:
+            spool.write(chunk)
+            size += len(chunk)
+        spool.seek(0)
+        field = Job._meta.get_field('result')
+        name = field.storage.save(field.generate_filename(job, f'{job.id}-{filename}'), File(spool))
+    return name, size
+
+
+def run_job(job):
+    """Run a claimed job and store its file or its error, unless another worker has taken it over."""
+    started = time.perf_counter()
+    recheck_schemes()
+    heartbeat = Heartbeat(job, settings.JOB_HEARTBEAT_INTERVAL)
+    heartbeat.start()
+    try:
+        if job.kind not in JOB_HANDLERS:
+            raise ValueError(f'Unknown job kind {job.kind!r}')
+        filename, content_type, content = JOB_HANDLERS[job.kind][1](job.params)
+        name, size = write_result(job, filename, content)
+    except Exception as e:
+        heartbeat.stop()
+        logger.exception('Job %s (%s) failed', job.id, job.kind)
+        owned(job).update(status=Job.FAILED, error=str(e) or e.__class__.__name__, finished_at=timezone.now())
+        return
+    heartbeat.stop()
+    finished = owned(job).update(
+        status=Job.DONE,
+        result=name,
+        result_name=filename,
+        content_type=content_type,
+        error='',
+        finished_at=timezone.now(),
+    )
+    if not finished:
+        Job._meta.get_field('result').storage.delete(name)
+        logger.warning('Job %s (%s) was taken over by another worker; discarded its result', job.id, job.kind)
+        return
+    logger.info('Job %s (%s) finished in %.3fs, %d bytes', job.id, job.kind, time.perf_counter() - started, size)
+
+
+def requeue_stale_jobs(timeout):
+    """
+    Requeue running jobs whose heartbeat stopped over `timeout` seconds
+    ago, as their worker most likely died, or fail them once they have
+    been started JOB_MAX_ATTEMPTS times. Returns (requeued, failed).
+    """
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=timezone.now() - timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, error='The worker running this job stopped responding.', finished_at=timezone.now(),
+    )
+    requeued = stale.update(status=Job.QUEUED, worker='')
+    return requeued, failed
+
+
+def purge_finished_jobs(ttl):
+    """Delete jobs, and their files, that finished over `ttl` seconds ago."""
+    expired = Job.objects.filter(
+        status__in=[Job.DONE, Job.FAILED], finished_at__lt=timezone.now() - timedelta(seconds=ttl),
+    )
+    storage = Job._meta.get_field('result').storage
+    for name in expired.exclude(result='').values_list('result', flat=True):
+        storage.delete(name)
+    deleted, per_model = expired.delete()
+    return deleted
+
+
+def work(worker=None, once=False, poll_interval=2.0):
+    """
+    Worker loop: claim and run jobs one at a time, sleeping for
+    `poll_interval` seconds while the queue is empty. With `once`,
+    return as soon as the queue is empty.
+    """
+    worker = worker or worker_name()
+    while True:
+        job = claim_job(worker)
+        if job is not None:
+            run_job(job)
+        elif once:
+            return
+        else:
+            time.sleep(poll_interval)
+
+
+@job_handler('progress_report', 'Progress report')
+def build_progress_report(params):
+    """
+    params: student_id, year and term for one student's report, or else
+    campus_id (None for every campus) and the legacy `filters` (student,
+    course, unit, term and year), reported under the first record found.
+    """
+    if params.get('student_id'):
+        student = Student.objects.select_related('course').get(id=params['student_id'])
+        year, term = params['year'], params['term']
+        records = ExamRecord.objects.filter(student=student, year=year, term=term)
+        if not records.exists():
+            raise ValueError('No records found for this student, year, and term.')
+        student_name, admission_number, course_name = student.name, student.registration_number, student.course.name
+        scheme = scheme_for(student.campus_id, student.course_id)
+    else:
+        campus_id = params.get('campus_id')
+        records = ExamRecord.objects.filter(campus_id=campus_id) if campus_id else ExamRecord.objects.all()
+        filters = params.get('filters', {})
+        if filters.get('student'):
+            records = records.filter(search_q('student', filters['student'], 'student', campus_id))
+        if filters.get('course'):
+            records = records.filter(search_q('course', filters['course'], 'unit__course', campus_id))
+        if filters.get('unit'):
+            records = records.filter(search_q('unit', filters['unit'], 'unit', campus_id))
+        if filters.get('term'):
+            records = records.filter(term=filters['term'])
+        if filters.get('year'):
+            records = records.filter(year=filters['year'])
+
+        # Details from the filters, or else from the first record
+        student_name, admission_number = filters.get('student') or '', ''
+        course_name = filters.get('course') or ''
+        year, term = filters.get('year') or '', filters.get('term') or ''
+        scheme = scheme_for()
+        first_record = records.select_related('student', 'unit__course').first()
+        if first_record is not None:
+            scheme = scheme_for(first_record.campus_id, first_record.unit.course_id)
+            student_name = student_name or first_record.student.name
+            admission_number = first_record.student.registration_number
+            course_name = course_name or first_record.unit.course.name
+            year = year or str(first_record.year)
+            term = term or first_record.term
+
+    rows = report_rows(records.select_related('unit'))
+    with docx_render('progress_report'):
+        content = render_progress_report(student_name, admission_number, course_name, year, term, rows, scheme)
+    return report_filename(student_name, year, term), DOCX_CONTENT_TYPE, content
+
+
+@job_handler('pass_list', 'Pass list')
+def build_pass_list(params):
+    """params: campus_id (None for every campus), course_id and term, both optional."""
+    campus = Campus.objects.get(id=params['campus_id']) if params.get('campus_id') else None
+    course = Course.objects.get(id=params['course_id']) if params.get('course_id') else None
+    term = params.get('term')
+    students = list(get_pass_list(campus=campus, course=course, term=term))
+
+    heading_lines = [f'Campus: {campus.name}' if campus else 'All Campuses']
+    if course:
+        heading_lines.append(f'Course: {course.name}')
+    if term:
+        heading_lines.append(f'Term: {term}')
+    heading_lines.append(f'Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
+    heading_lines.append(f'Total Students Passed: {len(students)}')
+
+    rows = [(student.name, student.registration_number, student.course.name, student.average) for student in students]
+    with docx_render('pass_list'):
+        content = render_pass_list(heading_lines, rows)
+    return 'pass_list.docx', DOCX_CONTENT_TYPE, content
+
+
+@job_handler('marks_entry_sheet', 'Marks entry sheet')
+def build_marks_entry_sheet(params):
+    """params: campus_id (None for every campus) and the view_records filters."""
+    records = ExamRecord.objects.select_related('student')
+    if params.get('campus_id'):
+        records = records.filter(campus_id=params['campus_id'])
+    filters = params.get('filters', {})
+    records, used = filter_records(records, filters, params.get('campus_id'))
+    rows = records.order_by(*RECORD_SORT_ORDERINGS[used['sort']]).values_list(
+        'student__name', 'student__registration_number', 'cat1_score', 'cat2_score', 'end_term_score', 'total_average',
+    )
+    with docx_render('marks_entry_sheet'):
+        content = render_marks_entry_sheet(
+            filters.get('course'), filters.get('term'), filters.get('year'), filters.get('unit'), list(rows),
+        )
+    return 'Marks_Entry_Sheet.docx', DOCX_CONTENT_TYPE, content
+
+
+@job_handler('course_reports', 'Class progress reports')
+def build_course_reports(params):
+    """params: course_id, year and term; one progress report per student, zipped."""
+    course = Course.objects.get(id=params['course_id'])
+    year, term = params['year'], params['term']
+    scheme = scheme_for(course.school.campus_id if course.school_id else None, course.id)
+
+    # Every record of the class in one query, grouped per student in order
+    records = ExamRecord.objects.filter(
+        student__course=course, year=year, term=term
+    ).select_related('student', 'unit').order_by('student__name', 'student_id', 'unit__name')
+    tasks = []
+    for record in records:
+        if not tasks or tasks[-1]['student_id'] != record.student_id:
+            tasks.append({
+                'student_id': record.student_id,
+                'student_name': record.student.name,
+                'admission_number': record.student.registration_number,
+                'course_name': course.name,
+                'year': year,
+                'term': term,
+                'rows': [],
+                'scheme': scheme,
+            })
+        tasks[-1]['rows'].append(report_rows([record])[0])
+    if not tasks:
+        raise ValueError('No records found for this course, year, and term.')
+
+    # Streamed into the result file chunk by chunk, never whole in memory
+    content = stream_reports_zip(tasks, settings.REPORT_RENDER_WORKERS, label=f'{course.name} reports')
+    filename = f"Progress_Reports_{course.name.replace(' ', '_')}_{year}_T{term}.zip"
+    return filename, 'application/zip', content
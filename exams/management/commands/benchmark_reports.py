@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exams.reports import render_progress_report, report_skeleton
+
+
+class Command(BaseCommand):
+    help = 'Time progress report rendering from scratch against cloning the cached report skeleton'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Number of reports to render for each method',
+        )
+        parser.add_argument(
+            '--units',
+            type=int,
+            default=10,
+            help='Number of unit rows in each report',
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        rows = [(f'Unit {i + 1}', 20.0, 25.0, 55.0) for i in range(options['units'])]
+
+        # Build the skeleton up front so its one-off cost is not counted
+        report_skeleton()
+
+        timings = {}
+        for label, use_skeleton in (('scratch', False), ('skeleton', True)):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                render_progress_report('Jane Doe', 'MIN/01/102/23', 'Diploma', '2025', 'Term 1', rows, use_skeleton=use_skeleton)
+            timings[label] = (time.perf_counter() - started) / iterations
+            self.stdout.write(f'{label:>9}: {timings[label] * 1000:.1f} ms per report')
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Skeleton rendering is {timings['scratch'] / timings['skeleton']:.1f}x faster")
+        )
@@ -0,0 +1,213 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from exams import urls
+from exams.campus import clear_campus_cache
+from exams.jobs import submit_job, work
+from exams.models import ExamRecord
+from exams.seeding import SCALE_SIZES, seed_scale_data
+
+
+def route_requests(record, job):
+    """
+    URL kwargs and GET parameters for the routes that need them, built
+    around one seeded exam record and one finished job. Other routes get
+    a plain GET.
+    """
+    student, unit, course = record.student, record.unit, record.unit.course
+    sitting = {'term': record.term, 'year': record.year}
+    return {
+        'update_record': ({'record_id': record.id}, {}),
+        'delete_record': ({'record_id': record.id}, {}),
+        'update_student': ({'student_id': student.id}, {}),
+        'get_existing_marks': ({}, {'course_id': course.id, 'unit_id': unit.id, **sitting}),
+        'roster_data': ({}, {'course_id': course.id, 'unit_id': unit.id, **sitting}),
+        'autocomplete_units': ({}, {'student': student.id}),
+        'download_report': ({}, {'student': student.registration_number, **sitting}),
+        'download_course_reports': ({}, {'course_id': course.id, **sitting}),
+        'download_records_word': ({}, {'course': course.name, **sitting}),
+        'transcript': ({}, {'student': student.id}),
+        'download_transcript': ({}, {'student': student.id}),
+        'job_detail': ({'job_id': job.id}, {}),
+        'job_status': ({'job_id': job.id}, {}),
+        'job_download': ({'job_id': job.id}, {}),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Time every exams route through the test client against generated data of several sizes, '
+        'write the results as JSON and compare them with a saved baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            choices=sorted(SCALE_SIZES),
+            default=['small', 'medium'],
+            help='Data sizes to benchmark (see exams.seeding.SCALE_SIZES)',
+        )
+        parser.add_argument(
+            '--routes',
+            nargs='+',
+            help='Only these URL names (default: every route in exams/urls.py)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Timed requests per route after one warm-up; the median is reported',
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark_views.json',
+            help='File the JSON results are written to',
+        )
+        parser.add_argument('--baseline', help='Earlier results file to compare against')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Allowed slowdown against the baseline as a fraction (0.25 = 25%%)',
+        )
+        parser.add_argument(
+            '--min-delta-ms',
+            type=float,
+            default=5,
+            help='Slowdowns smaller than this many milliseconds are never regressions',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {e}")
+
+        routes = [pattern.name for pattern in urls.urlpatterns]
+        if options['routes']:
+            unknown = set(options['routes']) - set(routes)
+            if unknown:
+                raise CommandError(f"Unknown route(s): {', '.join(sorted(unknown))}")
+            routes = [name for name in routes if name in options['routes']]
+
+        results = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'sizes': {},
+        }
+        # Everything runs in a throwaway test database
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for size in options['sizes']:
+                results['sizes'][size] = self.benchmark_size(size, routes, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'], options['min_delta_ms'] / 1000)
+            for message in regressions:
+                self.stdout.write(self.style.ERROR(message))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def benchmark_size(self, size, routes, repeat):
+        call_command('flush', interactive=False, verbosity=0)
+        clear_campus_cache()
+        started = time.perf_counter()
+        data = seed_scale_data(**SCALE_SIZES[size])
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{size}: {', '.join(f'{count} {name}' for name, count in data.items())} "
+            f"(seeded in {time.perf_counter() - started:.1f}s)"
+        ))
+
+        record = ExamRecord.objects.select_related('student', 'unit__course').order_by('id').first()
+        client = Client()
+        client.force_login(User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark'))
+        session = client.session
+        session['campus_id'] = record.campus_id
+        session.save()
+
+        # A finished export for the job routes to show
+        job = submit_job('pass_list', {'campus_id': record.campus_id}, campus=record.campus)
+        work(once=True)
+        requests = route_requests(record, job)
+        timings = {}
+        for name in routes:
+            kwargs, params = requests.get(name, ({}, {}))
+            url = reverse(f'exams:{name}', kwargs=kwargs)
+            timings[f'exams:{name}'] = timing = measure(client, url, params, repeat)
+            self.stdout.write(
+                f"  {name:<28} {timing['status']:>4} {timing['seconds'] * 1000:>9.1f} ms "
+                f"{timing['queries']:>5} queries {timing['bytes']:>10} bytes"
+            )
+        return {'data': data, 'routes': timings}
+
+
+def measure(client, url, params, repeat):
+    """Median wall time of `repeat` GETs after a warm-up, with the last one's query count and size."""
+    seconds = []
+    for attempt in range(repeat + 1):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url, params)
+            # Streamed bodies are produced while they are read
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - started
+        if attempt:
+            seconds.append(elapsed)
+    return {
+        'url': url,
+        'params': {key: str(value) for key, value in params.items()},
+        'status': response.status_code,
+        'seconds': statistics.median(seconds) if seconds else elapsed,
+        'queries': len(queries),
+        'bytes': len(body),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """Messages for every route that got slower, ran more queries or changed status since `baseline`."""
+    regressions = []
+    for size, current in results['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size)
+        if previous is None:
+            continue
+        for route, now in current['routes'].items():
+            before = previous['routes'].get(route)
+            if before is None:
+                continue
+            label = f'{size} {route}'
+            if now['status'] != before['status']:
+                regressions.append(f"{label}: status {before['status']} -> {now['status']}")
+            if now['queries'] > before['queries']:
+                regressions.append(f"{label}: {before['queries']} -> {now['queries']} queries")
+            slowdown = now['seconds'] - before['seconds']
+            if slowdown >= min_delta and now['seconds'] > before['seconds'] * (1 + tolerance):
+                regressions.append(
+                    f"{label}: {before['seconds'] * 1000:.1f} -> {now['seconds'] * 1000:.1f} ms "
+                    f"(+{slowdown / before['seconds']:.0%})"
+                )
+    return regressions
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, OuterRef, Q, Subquery
+
+from exams.catalog import touch_catalog
+from exams.dashboard import rebuild_counters
+from exams.models import Campus, Course, ExamRecord, Student
+from exams.stamps import touch_campus_data
+
+
+class Command(BaseCommand):
+    help = 'Check that the campus stored on students and exam records matches their course\'s school'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Rewrite mismatched campus keys from the course/school chain',
+        )
+
+    def handle(self, *args, **options):
+        student_campus = Course.objects.filter(id=OuterRef('course_id')).values('school__campus_id')[:1]
+        students = Student.objects.annotate(expected=Subquery(student_campus)).filter(
+            ~Q(campus_id=F('expected')) | Q(campus__isnull=True, expected__isnull=False) | Q(campus__isnull=False, expected__isnull=True)
+        )
+        record_campus = Student.objects.filter(id=OuterRef('student_id')).values('campus_id')[:1]
+        records = ExamRecord.objects.annotate(expected=Subquery(record_campus)).filter(
+            ~Q(campus_id=F('expected')) | Q(campus__isnull=True, expected__isnull=False) | Q(campus__isnull=False, expected__isnull=True)
+        )
+
+        bad_students = students.count()
+        if bad_students:
+            self.stdout.write(self.style.WARNING(f'{bad_students} student(s) have a stale campus key'))
+            if options['fix']:
+                # Students first: exam records copy their campus from the student
+                Student.objects.filter(id__in=students.values('id')).update(campus_id=Subquery(student_campus))
+        bad_records = records.count()
+        if bad_records:
+            self.stdout.write(self.style.WARNING(f'{bad_records} exam record(s) have a stale campus key'))
+            if options['fix']:
+                ExamRecord.objects.filter(id__in=records.values('id')).update(campus_id=Subquery(record_campus))
+
+        if not bad_students and not bad_records:
+            self.stdout.write(self.style.SUCCESS('All campus keys are consistent.'))
+        elif options['fix']:
+            # The repairs moved rows between campuses behind the counters' back
+            rebuild_counters()
+            campus_ids = Campus.objects.values_list('id', flat=True)
+            touch_catalog(*campus_ids)
+            touch_campus_data(*campus_ids)
+            self.stdout.write(self.style.SUCCESS('Campus keys repaired.'))
+        else:
+            self.stdout.write('Run again with --fix to repair them.')
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.imports import IMPORT_BATCH_SIZE, ImportFileError, import_marks
+from exams.models import Campus
+
+
+class Command(BaseCommand):
+    help = 'Import exam marks from a CSV file (registration number, unit, cat1, cat2, endterm, term, year)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import')
+        parser.add_argument('--campus', type=int, help='Only match students of this campus id')
+        parser.add_argument('--term', help='Term for every row (otherwise read from a term column)')
+        parser.add_argument('--year', type=int, help='Year for every row (otherwise read from a year column)')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate and count changes without writing anything',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Rows validated and committed together',
+        )
+
+    def handle(self, *args, **options):
+        campus = None
+        if options['campus']:
+            try:
+                campus = Campus.objects.get(id=options['campus'])
+            except Campus.DoesNotExist:
+                raise CommandError(f"Campus {options['campus']} does not exist.")
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_marks(
+                    file, campus=campus, term=options['term'], year=options['year'],
+                    dry_run=options['dry_run'], batch_size=options['batch_size'],
+                )
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for line, message in report['errors']:
+            self.stdout.write(self.style.WARNING(f'Line {line}: {message}'))
+        if report['error_count'] > len(report['errors']):
+            self.stdout.write(self.style.WARNING(f"... and {report['error_count'] - len(report['errors'])} more"))
+        verb = 'Would import' if report['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['rows']} rows in {time.perf_counter() - started:.1f}s: {report['created']} created, "
+            f"{report['updated']} updated, {report['unchanged']} unchanged, {report['error_count']} with errors."
+        ))
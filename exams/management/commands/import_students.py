@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.imports import IMPORT_BATCH_SIZE, ImportFileError, import_students
+from exams.models import Campus
+
+
+class Command(BaseCommand):
+    help = 'Import a student roster from a CSV file (name, registration number, course)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import')
+        parser.add_argument('--campus', type=int, required=True, help='Campus id the students join')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate and count new students without writing anything',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Rows checked and inserted together',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            campus = Campus.objects.get(id=options['campus'])
+        except Campus.DoesNotExist:
+            raise CommandError(f"Campus {options['campus']} does not exist.")
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_students(
+                    file, campus, dry_run=options['dry_run'], batch_size=options['batch_size'],
+                )
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for line, message in report['errors']:
+            self.stdout.write(self.style.WARNING(f'Line {line}: {message}'))
+        if report['error_count'] > len(report['errors']):
+            self.stdout.write(self.style.WARNING(f"... and {report['error_count'] - len(report['errors'])} more"))
+        verb = 'Would import' if report['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['rows']} rows into {campus.name} in {time.perf_counter() - started:.1f}s: "
+            f"{report['created']} created, {report['existing']} already registered, {report['duplicates']} duplicates, "
+            f"{report['conflicts']} conflicts, "
+            f"{report['error_count'] - report['duplicates'] - report['conflicts']} other errors."
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from exams.grading import clear_scheme_cache, regrade
+from exams.models import ExamRecord
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored grades and pass flags from the grading schemes, one UPDATE per scheme'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', help='Only records of this term')
+        parser.add_argument('--year', type=int, help='Only records of this year')
+        parser.add_argument('--campus', type=int, help='Only records of this campus id')
+
+    def handle(self, *args, **options):
+        records = ExamRecord.objects.all()
+        if options['term']:
+            records = records.filter(term=options['term'])
+        if options['year']:
+            records = records.filter(year=options['year'])
+        if options['campus']:
+            records = records.filter(campus_id=options['campus'])
+        clear_scheme_cache()
+        self.stdout.write(self.style.SUCCESS(f'Regraded {regrade(records)} record(s).'))
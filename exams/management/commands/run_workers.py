@@ -0,0 +1,112 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+
+# Seconds between the supervisor's checks for lost and expired jobs
+MAINTENANCE_INTERVAL = 60
+
+
+def worker_process(poll_interval):
+    """
+    Entry point of a spawned worker process. The child imports this module
+    before Django is set up, so nothing here may import models at the top.
+    """
+    import django
+    django.setup()
+    from exams.jobs import work
+    work(poll_interval=poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers for exports queued by the web app'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.JOB_WORKERS,
+            help='Worker processes to run (default: settings.JOB_WORKERS)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the queued jobs in this process and exit when the queue is empty',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds an idle worker waits before checking the queue again',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        from exams.jobs import work
+        self.maintain()
+
+        if options['once']:
+            work(once=True)
+            self.stdout.write(self.style.SUCCESS('Queue is empty.'))
+            return
+
+        if options['concurrency'] == 1:
+            self.stdout.write('Running 1 worker (Ctrl+C to stop)')
+            self.supervise([], options['poll_interval'], inline=True)
+            return
+
+        # Spawned rather than forked so no worker inherits this process's database connection
+        context = multiprocessing.get_context('spawn')
+        processes = []
+        for n in range(options['concurrency']):
+            process = context.Process(target=worker_process, args=(options['poll_interval'],), name=f'job-worker-{n + 1}')
+            process.start()
+            processes.append(process)
+        self.stdout.write(f"Running {len(processes)} workers (Ctrl+C to stop)")
+        try:
+            self.supervise(processes, options['poll_interval'])
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+
+    def supervise(self, processes, poll_interval, inline=False):
+        """Keep the workers alive and the queue tidy until interrupted."""
+        from exams.jobs import work
+        last_maintenance = time.monotonic()
+        try:
+            while True:
+                if inline:
+                    work(once=True)
+                    time.sleep(poll_interval)
+                else:
+                    for index, process in enumerate(processes):
+                        if not process.is_alive():
+                            self.stdout.write(self.style.WARNING(
+                                f'{process.name} exited with code {process.exitcode}, restarting it'
+                            ))
+                            replacement = multiprocessing.get_context('spawn').Process(
+                                target=worker_process, args=(poll_interval,), name=process.name,
+                            )
+                            replacement.start()
+                            processes[index] = replacement
+                    time.sleep(1)
+                if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                    self.maintain()
+                    last_maintenance = time.monotonic()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping workers.')
+
+    def maintain(self):
+        """Requeue jobs whose worker died and delete expired results."""
+        from exams.jobs import purge_finished_jobs, requeue_stale_jobs
+        close_old_connections()
+        requeued, failed = requeue_stale_jobs(settings.JOB_TIMEOUT)
+        purged = purge_finished_jobs(settings.JOB_RESULT_TTL)
+        if requeued or failed or purged:
+            self.stdout.write(f'Requeued {requeued} stalled job(s), failed {failed}, deleted {purged} expired.')
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.models import Campus
+from exams.seeding import SCALE_SIZES, clear_scale_data, seed_scale_data
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic campuses, schools, courses, units, students and exam records at scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            choices=sorted(SCALE_SIZES),
+            default='small',
+            help='Preset counts; the options below override single values',
+        )
+        for name, help_text in (
+            ('campuses', 'Number of campuses'),
+            ('schools', 'Schools per campus'),
+            ('courses', 'Courses per school'),
+            ('units', 'Units per course'),
+            ('students', 'Students per course'),
+            ('terms', 'Terms of exam records per student (one record per unit each term)'),
+        ):
+            parser.add_argument(f'--{name}', type=int, help=help_text)
+        parser.add_argument('--prefix', default='Scale', help="Campus names start with '<prefix> Campus'")
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for names and scores')
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete data from an earlier run with the same prefix first',
+        )
+
+    def handle(self, *args, **options):
+        counts = dict(SCALE_SIZES[options['size']])
+        for name in counts:
+            if options[name] is not None:
+                counts[name] = options[name]
+        if any(count < 0 for count in counts.values()):
+            raise CommandError('Counts cannot be negative.')
+
+        prefix = options['prefix']
+        if options['clear']:
+            started = time.perf_counter()
+            deleted = clear_scale_data(prefix)
+            self.stdout.write(f"Deleted {sum(deleted.values())} rows in {time.perf_counter() - started:.1f}s")
+        elif Campus.objects.filter(name__startswith=f'{prefix} Campus ').exists():
+            raise CommandError(f"Campuses named '{prefix} Campus ...' already exist; use --clear or another --prefix.")
+
+        started = time.perf_counter()
+        created = seed_scale_data(prefix=prefix, seed=options['seed'], **counts)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {', '.join(f'{count} {name}' for name, count in created.items())} "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
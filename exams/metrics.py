@@ -0,0 +1,155 @@
+"""
+In-process request metrics, exposed in the Prometheus text format.
+
+MetricsMiddleware fills these for every request; Word documents are timed
+with `docx_render()` and exams.catalog counts its cache hits and misses.
+Each process keeps its own metrics, so with several workers every
+process has to be scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """A Prometheus histogram with one label, safe to observe from any thread."""
+
+    def __init__(self, name, help_text, label, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label value -> [per-bucket counts (last is +Inf), sum, count]
+        self._series = {}
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.setdefault(label_value, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_value, (counts, total, count) in sorted(series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """A Prometheus counter with one label, safe to increment from any thread."""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value):
+        with self._lock:
+            return self._values.get(label_value, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for label_value, value in sorted(values.items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+REQUEST_SECONDS = Histogram('exams_request_duration_seconds', 'Wall time per request.', 'view')
+SQL_QUERIES = Histogram('exams_request_sql_queries', 'SQL queries per request.', 'view', QUERY_COUNT_BUCKETS)
+SQL_SECONDS = Histogram('exams_request_sql_duration_seconds', 'Time spent in SQL per request.', 'view')
+REQUEST_RENDER_SECONDS = Histogram(
+    'exams_request_docx_render_seconds', 'Time spent rendering Word documents per request.', 'view',
+)
+RENDER_SECONDS = Histogram('exams_docx_render_seconds', 'Time to render one Word document.', 'document')
+CATALOG_LOOKUPS = Counter('exams_catalog_cache_lookups_total', 'Campus catalog lookups by cache result.', 'result')
+
+REGISTRY = [REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, REQUEST_RENDER_SECONDS, RENDER_SECONDS, CATALOG_LOOKUPS]
+
+
+class RequestStats:
+    """SQL and rendering time collected while one request is handled."""
+
+    def __init__(self):
+        self.queries = []  # (seconds, sql)
+        self.render_seconds = 0.0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook timing each statement."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - started, sql))
+
+    @property
+    def sql_seconds(self):
+        return sum(seconds for seconds, sql in self.queries)
+
+
+current_stats = ContextVar('exams_request_stats', default=None)
+
+
+def observe_request(view, seconds, stats):
+    REQUEST_SECONDS.observe(view, seconds)
+    SQL_QUERIES.observe(view, len(stats.queries))
+    SQL_SECONDS.observe(view, stats.sql_seconds)
+    if stats.render_seconds:
+        REQUEST_RENDER_SECONDS.observe(view, stats.render_seconds)
+
+
+def observe_render(document, seconds):
+    """Record one rendered document, charging it to the current request if any."""
+    RENDER_SECONDS.observe(document, seconds)
+    stats = current_stats.get()
+    if stats is not None:
+        stats.render_seconds += seconds
+
+
+@contextmanager
+def docx_render(document):
+    """Time the python-docx work inside the block as one `document`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_render(document, time.perf_counter() - started)
+
+
+def render_metrics():
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
@@ -1,28 +1,108 @@
+import heapq
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import FileResponse
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib import messages
 
+from .campus import get_campus
+from .metrics import RequestStats, current_stats, observe_request
+
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    """
+    Record wall time, SQL query count and SQL time for every request.
+
+    Histograms are labelled with the resolved view name and served by the
+    metrics view. Requests slower than settings.SLOW_REQUEST_THRESHOLD_MS
+    are logged with their slowest queries. A streamed response is
+    measured until its stream closes, SQL run while streaming included.
+    A FileResponse keeps its file as the body, so the server can still
+    send it with wsgi.file_wrapper; it is recorded when it is closed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 1000) / 1000
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats.sql_wrapper):
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        if isinstance(response, FileResponse):
+            # Reading a file runs no SQL; closers run when the server closes the response
+            response._resource_closers.append(lambda: self.record(request, stats, time.perf_counter() - started))
+        elif response.streaming:
+            # The body is built as it is sent: record the request once the stream closes
+            response.streaming_content = self.stream(request, response.streaming_content, stats, started)
+        else:
+            self.record(request, stats, time.perf_counter() - started)
+        return response
+
+    def stream(self, request, content, stats, started):
+        """Yield `content`, charging its SQL to `stats`, and record the request when it closes."""
+        try:
+            while True:
+                token = current_stats.set(stats)
+                try:
+                    with connection.execute_wrapper(stats.sql_wrapper):
+                        chunk = next(content, None)
+                finally:
+                    current_stats.reset(token)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.record(request, stats, time.perf_counter() - started)
+
+    def record(self, request, stats, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        observe_request(view, elapsed, stats)
+        if elapsed >= self.slow_threshold:
+            logger.warning(
+                'Slow request %s %s (%s): %.3fs, %d queries in %.3fs, %.3fs rendering. Slowest queries:\n%s',
+                request.method, request.path, view, elapsed, len(stats.queries), stats.sql_seconds,
+                stats.render_seconds,
+                '\n'.join(f'  {seconds * 1000:.1f} ms: {sql[:500]}' for seconds, sql in heapq.nlargest(5, stats.queries)),
+            )
+
+
+# Paths usable without a selected campus: the campus selection page
+# itself (exactly '/'), the admin and campus password management
+EXEMPT_PATHS = re.compile(r'/$|/admin/|/manage-campus-passwords/')
+
 
 class CampusAccessMiddleware:
     """
     Middleware to ensure proper campus access control
+
+    Resolves the session's campus once, from the process-level cache, and
+    attaches it as `request.campus` (None when no campus is selected).
     """
     
     def __init__(self, get_response):
         self.get_response = get_response
     
     def __call__(self, request):
-        # List of URLs that don't require campus selection
-        exempt_urls = [
-            '/',  # Campus selection page
-            '/admin/',
-            '/admin/login/',
-            '/manage-campus-passwords/',
-        ]
+        request.campus = get_campus(request.session.get('campus_id'))
         
         # Check if the current URL is exempt
         current_path = request.path
-        is_exempt = any(current_path.startswith(url) for url in exempt_urls)
+        is_exempt = EXEMPT_PATHS.match(current_path) is not None
         
         # If user is not a superuser and trying to access campus password management
         if current_path == '/manage-campus-passwords/' and not request.user.is_superuser:
@@ -30,11 +110,9 @@ class CampusAccessMiddleware:
             return redirect('exams:home')
         
         # For non-exempt URLs, check if user has selected a campus
-        if not is_exempt and not request.user.is_superuser:
-            campus_id = request.session.get('campus_id')
-            if not campus_id:
-                messages.warning(request, 'Please select a campus first.')
-                return redirect('exams:campus_select')
+        if not is_exempt and not request.user.is_superuser and request.campus is None:
+            messages.warning(request, 'Please select a campus first.')
+            return redirect('exams:campus_select')
         
         response = self.get_response(request)
-        return response 
\ No newline at end of file
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:57
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F
+
+
+def backfill_averages(apps, schema_editor):
+    ExamRecord = apps.get_model('exams', 'ExamRecord')
+    
+    # One UPDATE for the whole table instead of saving each record.
+    # Divide by 2.0 so SQLite does not truncate whole-number scores.
+    ExamRecord.objects.update(
+        cat_average=ExpressionWrapper((F('cat1_score') + F('cat2_score')) / 2.0, output_field=DecimalField()),
+    )
+    ExamRecord.objects.update(
+        total_average=F('cat_average') + F('end_term_score'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0012_alter_school_name_alter_school_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examrecord',
+            name='cat_average',
+            field=models.DecimalField(decimal_places=3, default=0, editable=False, help_text='(CAT 1 + CAT 2) / 2', max_digits=6),
+        ),
+        migrations.AddField(
+            model_name='examrecord',
+            name='total_average',
+            field=models.DecimalField(decimal_places=3, default=0, editable=False, help_text='CAT average + End Term', max_digits=6),
+        ),
+        migrations.RunPython(backfill_averages, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='examrecord',
+            index=models.Index(fields=['year', 'term', 'total_average'], name='exams_record_term_total_idx'),
+        ),
+    ]
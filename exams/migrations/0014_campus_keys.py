@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_campus_keys(apps, schema_editor):
+    Course = apps.get_model('exams', 'Course')
+    Student = apps.get_model('exams', 'Student')
+    ExamRecord = apps.get_model('exams', 'ExamRecord')
+    
+    Student.objects.update(campus_id=Subquery(
+        Course.objects.filter(id=OuterRef('course_id')).values('school__campus_id')[:1]
+    ))
+    ExamRecord.objects.update(campus_id=Subquery(
+        Student.objects.filter(id=OuterRef('student_id')).values('campus_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0013_examrecord_stored_averages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examrecord',
+            name='campus',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='exam_records', to='exams.campus'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='campus',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='students', to='exams.campus'),
+        ),
+        migrations.RunPython(backfill_campus_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='examrecord',
+            index=models.Index(fields=['campus', 'year', 'term'], name='exams_record_campus_term_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examrecord',
+            index=models.Index(fields=['campus', 'unit', 'year', 'term'], name='exams_record_campus_unit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['campus', 'name'], name='exams_student_campus_idx'),
+        ),
+    ]
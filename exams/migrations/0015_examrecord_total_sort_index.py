@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0014_campus_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examrecord',
+            index=models.Index(fields=['campus', '-total_average'], name='exams_record_campus_total_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+from django.db import migrations
+
+
+# Table -> indexed columns, as they stood when this migration was written
+SEARCH_TABLES = {
+    'exams_student': ['name', 'registration_number'],
+    'exams_course': ['name'],
+    'exams_unit': ['name'],
+}
+
+
+def sqlite_statements(table, fields):
+    index = f'{table}_search'
+    columns = ', '.join(fields)
+    new_values = ', '.join(f'new.{field}' for field in fields)
+    old_values = ', '.join(f'old.{field}' for field in fields)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+        f"{columns}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f'DROP TRIGGER IF EXISTS {index}_ai',
+        f'DROP TRIGGER IF EXISTS {index}_ad',
+        f'DROP TRIGGER IF EXISTS {index}_au',
+        f'CREATE TRIGGER {index}_ai AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new_values}); END',
+        f'CREATE TRIGGER {index}_ad AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {index}({index}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f'CREATE TRIGGER {index}_au AFTER UPDATE OF {columns} ON {table} BEGIN '
+        f"INSERT INTO {index}({index}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new_values}); END',
+        f"INSERT INTO {index}({index}) VALUES ('rebuild')",
+    ]
+
+
+def install(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = [sql for table, fields in SEARCH_TABLES.items() for sql in sqlite_statements(table, fields)]
+    elif vendor == 'postgresql':
+        statements = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+            f'CREATE INDEX IF NOT EXISTS {table}_{field}_trgm ON {table} USING gin ({field} gin_trgm_ops)'
+            for table, fields in SEARCH_TABLES.items() for field in fields
+        ]
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def uninstall(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = [
+            sql for table in SEARCH_TABLES for sql in (
+                f'DROP TRIGGER IF EXISTS {table}_search_ai',
+                f'DROP TRIGGER IF EXISTS {table}_search_ad',
+                f'DROP TRIGGER IF EXISTS {table}_search_au',
+                f'DROP TABLE IF EXISTS {table}_search',
+            )
+        ]
+    elif vendor == 'postgresql':
+        statements = [
+            f'DROP INDEX IF EXISTS {table}_{field}_trgm'
+            for table, fields in SEARCH_TABLES.items() for field in fields
+        ]
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0015_examrecord_total_sort_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0016_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampusSummary',
+            fields=[
+                ('campus', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='exams.campus')),
+                ('students', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('courses', models.IntegerField(default=0)),
+                ('records', models.IntegerField(default=0)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'campus summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import exams.grading
+
+
+def backfill_grades(apps, schema_editor):
+    ExamRecord = apps.get_model('exams', 'ExamRecord')
+
+    # No schemes exist yet, so every record is graded on the default bands
+    scheme = exams.grading.DEFAULT_SCHEME
+    ExamRecord.objects.update(grade=scheme.grade_expression(), passed=scheme.passed_expression())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0018_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examrecord',
+            name='grade',
+            field=models.CharField(blank=True, editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='examrecord',
+            name='passed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_grades, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='GradingScheme',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('bands', models.JSONField(default=exams.grading.default_grade_bands, help_text='List of {"min_score", "grade", "remark"} objects')),
+                ('pass_mark', models.DecimalField(decimal_places=2, default=40, max_digits=5)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('campus', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='grading_schemes', to='exams.campus')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='grading_schemes', to='exams.course')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='gradingscheme',
+            constraint=models.UniqueConstraint(fields=('course',), name='exams_gradingscheme_one_per_course'),
+        ),
+        migrations.AddConstraint(
+            model_name='gradingscheme',
+            constraint=models.UniqueConstraint(fields=('campus',), name='exams_gradingscheme_one_per_campus'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:00
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0019_grading_scheme'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='exams_course_uname_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(models.F('campus'), django.db.models.functions.text.Upper('name'), name='exams_student_campus_uname_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(models.F('campus'), django.db.models.functions.text.Upper('registration_number'), name='exams_student_campus_ureg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='exams_unit_uname_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+from django.db.models import F
+import exams.models
+
+
+def move_results_to_files(apps, schema_editor):
+    Job = apps.get_model('exams', 'Job')
+    storage = Job._meta.get_field('result_file').storage
+    Job.objects.filter(status='running').update(heartbeat_at=F('started_at'))
+    for job in Job.objects.filter(result__isnull=False).only('id', 'result', 'result_name', 'created_at'):
+        name = f"jobs/{job.created_at:%Y/%m/%d}/{job.id}-{job.result_name or 'result'}"
+        job.result_file = storage.save(name, ContentFile(bytes(job.result)))
+        job.save(update_fields=['result_file'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0020_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='result_file',
+            field=models.FileField(blank=True, editable=False, max_length=500, storage=exams.models.job_result_storage, upload_to='jobs/%Y/%m/%d/'),
+        ),
+        migrations.RunPython(move_results_to_files, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='job',
+            name='result',
+        ),
+        migrations.RenameField(
+            model_name='job',
+            old_name='result_file',
+            new_name='result',
+        ),
+    ]
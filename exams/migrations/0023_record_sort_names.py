@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:51
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_sort_names(apps, schema_editor):
+    Student = apps.get_model('exams', 'Student')
+    Unit = apps.get_model('exams', 'Unit')
+    ExamRecord = apps.get_model('exams', 'ExamRecord')
+
+    units = Unit.objects.filter(id=OuterRef('unit_id'))
+    ExamRecord.objects.update(
+        student_name=Subquery(Student.objects.filter(id=OuterRef('student_id')).values('name')[:1]),
+        unit_name=Subquery(units.values('name')[:1]),
+        course_name=Subquery(units.values('course__name')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0022_version_stamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examrecord',
+            name='course_name',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='examrecord',
+            name='student_name',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='examrecord',
+            name='unit_name',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_sort_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='examrecord',
+            index=models.Index(fields=['campus', 'student_name', 'id'], name='exams_record_campus_sname_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examrecord',
+            index=models.Index(fields=['campus', 'unit_name', 'id'], name='exams_record_campus_uname_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examrecord',
+            index=models.Index(fields=['campus', 'course_name', 'id'], name='exams_record_campus_cname_idx'),
+        ),
+    ]
@@ -1,6 +1,16 @@
+import os
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Upper
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .grading import DEFAULT_PASS_MARK, default_grade_bands, scheme_for, validate_bands
+
 
 class Campus(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -29,6 +39,24 @@ class School(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored campus so save() can spot a move
+        instance._loaded_campus_id = instance.__dict__.get('campus_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        moved_from = getattr(self, '_loaded_campus_id', self.campus_id)
+        if moved_from != self.campus_id:
+            # Carry the move down to the denormalised campus keys
+            Student.objects.filter(course__school=self).update(campus_id=self.campus_id)
+            ExamRecord.objects.filter(student__course__school=self).update(campus_id=self.campus_id)
+            from .dashboard import rebuild_counters
+            rebuild_counters([moved_from, self.campus_id])
+        self._loaded_campus_id = self.campus_id
+
     class Meta:
         ordering = ['name']
         # Add unique constraint for name + campus to prevent duplicates within the same campus
@@ -45,10 +73,39 @@ class Course(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored school and name so save() can spot a move or a rename
+        instance._loaded_school_id = instance.__dict__.get('school_id')
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if getattr(self, '_loaded_name', self.name) != self.name:
+            ExamRecord.objects.filter(unit__course=self).update(course_name=self.name)
+        self._loaded_name = self.name
+        moved_from = getattr(self, '_loaded_school_id', self.school_id)
+        if moved_from != self.school_id:
+            # Students and records follow the course to its new school's campus
+            campus_id = self.school.campus_id if self.school_id else None
+            Student.objects.filter(course=self).exclude(campus_id=campus_id).update(campus_id=campus_id)
+            ExamRecord.objects.filter(student__course=self).exclude(campus_id=campus_id).update(campus_id=campus_id)
+            from .dashboard import rebuild_counters
+            old_campus_id = School.objects.filter(id=moved_from).values_list('campus_id', flat=True).first()
+            if old_campus_id != campus_id:
+                rebuild_counters([old_campus_id, campus_id])
+        self._loaded_school_id = self.school_id
+
     class Meta:
         ordering = ['name']
         # Add unique constraint for name + school to prevent duplicates within the same school
         unique_together = ['name', 'school']
+        indexes = [
+            # Case-insensitive prefix lookups for the course picker
+            models.Index(Upper('name'), name='exams_course_uname_idx'),
+        ]
 
 
 class Unit(models.Model):
@@ -61,9 +118,29 @@ class Unit(models.Model):
     def __str__(self):
         return f"{self.name} - {self.course.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored name and course so save() can refresh the records' sort names
+        instance._loaded_name = instance.__dict__.get('name')
+        instance._loaded_course_id = instance.__dict__.get('course_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if (getattr(self, '_loaded_name', self.name), getattr(self, '_loaded_course_id', self.course_id)) != (self.name, self.course_id):
+            course_name = Course.objects.filter(id=self.course_id).values_list('name', flat=True).first()
+            ExamRecord.objects.filter(unit=self).update(unit_name=self.name, course_name=course_name or '')
+        self._loaded_name = self.name
+        self._loaded_course_id = self.course_id
+
     class Meta:
         unique_together = ['name', 'course']
         ordering = ['course', 'name']
+        indexes = [
+            # Case-insensitive prefix lookups for the unit picker
+            models.Index(Upper('name'), name='exams_unit_uname_idx'),
+        ]
 
 
 class Student(models.Model):
@@ -71,20 +148,62 @@ class Student(models.Model):
     name = models.CharField(max_length=200)
     registration_number = models.CharField(max_length=20, unique=True)
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='students')
+    # Copy of course.school.campus so campus-scoped queries skip the join chain
+    campus = models.ForeignKey(Campus, on_delete=models.SET_NULL, related_name='students', null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.registration_number})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored campus and course so save() and signals can spot a move, and the name a rename
+        instance._loaded_campus_id = instance.__dict__.get('campus_id')
+        instance._loaded_course_id = instance.__dict__.get('course_id')
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.campus_id = Course.objects.filter(id=self.course_id).values_list('school__campus_id', flat=True).first()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'course' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'campus'}
+        super().save(*args, **kwargs)
+        ExamRecord.objects.filter(student=self).exclude(campus_id=self.campus_id).update(campus_id=self.campus_id)
+        if getattr(self, '_loaded_name', self.name) != self.name:
+            ExamRecord.objects.filter(student=self).update(student_name=self.name)
+        moved_from = getattr(self, '_loaded_campus_id', self.campus_id)
+        if moved_from != self.campus_id:
+            from .dashboard import rebuild_counters
+            rebuild_counters([moved_from, self.campus_id])
+        self._loaded_campus_id = self.campus_id
+        self._loaded_course_id = self.course_id
+        self._loaded_name = self.name
+
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['campus', 'name'], name='exams_student_campus_idx'),
+            # Case-insensitive prefix lookups for the student picker
+            models.Index(F('campus'), Upper('name'), name='exams_student_campus_uname_idx'),
+            models.Index(F('campus'), Upper('registration_number'), name='exams_student_campus_ureg_idx'),
+        ]
 
 
 class ExamRecord(models.Model):
     """Model for storing exam records for each student and unit."""
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='exam_records')
     unit = models.ForeignKey(Unit, on_delete=models.CASCADE, related_name='exam_records')
+    # Copy of student.campus, kept in sync by Student/Course/School saves
+    campus = models.ForeignKey(Campus, on_delete=models.SET_NULL, related_name='exam_records', null=True, blank=True, editable=False)
+    # Copies of student.name, unit.name and unit.course.name, so the
+    # view_records sorts are index seeks; kept in sync by save(),
+    # exams.services.assign_sort_names() and the renames' saves
+    student_name = models.CharField(max_length=200, blank=True, editable=False)
+    unit_name = models.CharField(max_length=100, blank=True, editable=False)
+    course_name = models.CharField(max_length=100, blank=True, editable=False)
     cat1_score = models.DecimalField(
         max_digits=5, 
         decimal_places=2,
@@ -105,22 +224,237 @@ class ExamRecord(models.Model):
     )
     term = models.CharField(max_length=10, help_text="Term (e.g. I, II, III)", default="I")
     year = models.IntegerField(help_text="Year (e.g. 2025)", default=2025)
+
+    SCORE_FIELDS = ['cat1_score', 'cat2_score', 'end_term_score']
+
+    # Stored copies of the calculated averages so they can be filtered,
+    # sorted and aggregated in SQL; kept in sync by calculate_averages()
+    cat_average = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        default=0,
+        editable=False,
+        help_text="(CAT 1 + CAT 2) / 2"
+    )
+    total_average = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        default=0,
+        editable=False,
+        help_text="CAT average + End Term"
+    )
+    # Grade band of total_average under the record's grading scheme; kept
+    # in sync by save(), exams.grading.assign_grades() and regrade()
+    grade = models.CharField(max_length=10, blank=True, editable=False)
+    passed = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.student.name} - {self.unit.name}"
 
-    @property
-    def cat_average(self):
-        """Calculate CAT average = (CAT 1 + CAT 2) / 2"""
-        return (self.cat1_score + self.cat2_score) / 2
+    def calculate_averages(self):
+        """
+        Refresh cat_average and total_average from the scores.
 
-    @property
-    def total_average(self):
-        """Calculate total average = CAT Average + End Term"""
-        return self.cat_average + self.end_term_score
+        save() does this automatically; call it yourself before
+        bulk_create/bulk_update, which bypass save().
+        """
+        self.cat_average = (Decimal(str(self.cat1_score)) + Decimal(str(self.cat2_score))) / 2
+        self.total_average = self.cat_average + Decimal(str(self.end_term_score))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored campus, year and term so the catalog signals can tell a marks-only edit
+        instance._loaded_campus_id = instance.__dict__.get('campus_id')
+        instance._loaded_year = instance.__dict__.get('year')
+        instance._loaded_term = instance.__dict__.get('term')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.calculate_averages()
+        if 'student' in self._state.fields_cache:
+            self.campus_id, self.student_name = self.student.campus_id, self.student.name
+        else:
+            self.campus_id, self.student_name = Student.objects.filter(id=self.student_id).values_list(
+                'campus_id', 'name',
+            ).first() or (None, '')
+        self.unit_name, self.course_name = self.unit.name, self.unit.course.name
+        band = scheme_for(self.campus_id, self.unit.course_id).band(self.total_average)
+        self.grade, self.passed = band.grade, band.passed
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.SCORE_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | {'cat_average', 'total_average', 'grade', 'passed'}
+        if update_fields is not None and 'student' in update_fields:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'campus', 'student_name'}
+        if update_fields is not None and 'unit' in update_fields:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'unit_name', 'course_name'}
+        super().save(*args, **kwargs)
+        self._loaded_campus_id, self._loaded_year, self._loaded_term = self.campus_id, self.year, self.term
 
     class Meta:
         unique_together = ['student', 'unit', 'term', 'year']
         ordering = ['student__name', 'unit__name']
+        indexes = [
+            models.Index(fields=['year', 'term', 'total_average'], name='exams_record_term_total_idx'),
+            models.Index(fields=['campus', 'year', 'term'], name='exams_record_campus_term_idx'),
+            models.Index(fields=['campus', 'unit', 'year', 'term'], name='exams_record_campus_unit_idx'),
+            models.Index(fields=['campus', '-total_average'], name='exams_record_campus_total_idx'),
+            # The view_records sorts, ties broken by id (see services.RECORD_SORT_ORDERINGS)
+            models.Index(fields=['campus', 'student_name', 'id'], name='exams_record_campus_sname_idx'),
+            models.Index(fields=['campus', 'unit_name', 'id'], name='exams_record_campus_uname_idx'),
+            models.Index(fields=['campus', 'course_name', 'id'], name='exams_record_campus_cname_idx'),
+        ]
+
+
+class CampusSummary(models.Model):
+    """
+    Dashboard counters for one campus.
+
+    Kept up to date by exams.dashboard as rows are created, deleted or
+    moved; `manage.py rebuild_dashboard_counters` recounts from scratch.
+    """
+    campus = models.OneToOneField(Campus, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    students = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    courses = models.IntegerField(default=0)
+    records = models.IntegerField(default=0)
+    last_activity = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Summary for {self.campus.name}"
+
+    class Meta:
+        verbose_name_plural = 'campus summaries'
+
+
+class VersionStamp(models.Model):
+    """
+    A version counter for cached data and ETags (see exams.versions),
+    kept in the database so every process reads and bumps the same one.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
+
+
+class GradingScheme(models.Model):
+    """
+    Score bands that turn a total into a grade and remark.
+
+    A scheme belongs to a course, to a campus, or with neither set to
+    every campus; the most specific one applies (see exams.grading).
+    `bands` is a list of {"min_score", "grade", "remark"} objects and a
+    band passes if its min_score reaches `pass_mark`.
+    """
+    name = models.CharField(max_length=100)
+    campus = models.ForeignKey(
+        Campus, on_delete=models.CASCADE, related_name='grading_schemes', null=True, blank=True,
+    )
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name='grading_schemes', null=True, blank=True,
+    )
+    bands = models.JSONField(default=default_grade_bands, help_text='List of {"min_score", "grade", "remark"} objects')
+    pass_mark = models.DecimalField(max_digits=5, decimal_places=2, default=DEFAULT_PASS_MARK)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored scope so the regrade on save also covers the records it left
+        instance._loaded_campus_id = instance.__dict__.get('campus_id')
+        instance._loaded_course_id = instance.__dict__.get('course_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_campus_id = self.campus_id
+        self._loaded_course_id = self.course_id
+
+    def clean(self):
+        if self.campus_id and self.course_id:
+            raise ValidationError('A scheme applies to a campus or to a course, not both.')
+        if not self.campus_id and not self.course_id:
+            defaults = GradingScheme.objects.filter(campus__isnull=True, course__isnull=True).exclude(pk=self.pk)
+            if defaults.exists():
+                raise ValidationError('There is already a default scheme for every campus.')
+        validate_bands(self.bands)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(fields=['course'], name='exams_gradingscheme_one_per_course'),
+            models.UniqueConstraint(fields=['campus'], name='exams_gradingscheme_one_per_campus'),
+        ]
+
+
+class JobResultStorage(FileSystemStorage):
+    """Files under settings.JOB_RESULTS_ROOT, read on every use rather than once."""
+
+    @property
+    def base_location(self):
+        return settings.JOB_RESULTS_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def job_result_storage():
+    """Where finished job files are written; never served directly."""
+    return JobResultStorage()
+
+
+class Job(models.Model):
+    """
+    A background job, such as a large export.
+
+    Created by exams.jobs.submit_job() and run by `manage.py run_workers`
+    (or inline); the finished file is written to job_result_storage() and
+    kept in `result` until it expires. A running job's worker touches
+    `heartbeat_at` while it works.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    campus = models.ForeignKey(Campus, on_delete=models.SET_NULL, related_name='jobs', null=True, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, related_name='+', null=True, blank=True,
+    )
+    worker = models.CharField(max_length=100, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    result = models.FileField(storage=job_result_storage, upload_to='jobs/%Y/%m/%d/', max_length=500, blank=True, editable=False)
+    result_name = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='exams_job_status_idx'),
+        ]
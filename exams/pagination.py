@@ -0,0 +1,119 @@
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(direction, values):
+    data = json.dumps({'d': direction, 'v': [str(value) for value in values]})
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor, size):
+    """Return (direction, values) from a cursor, or (None, None) if it is malformed."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        direction, values = data['d'], data['v']
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None, None
+    if direction not in ('next', 'prev') or not isinstance(values, list) or len(values) != size:
+        return None, None
+    return direction, values
+
+
+def _after(ordering, values):
+    """Q matching rows that sort strictly after `values` under `ordering`."""
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    # Implied by the OR above, but a plain range the database can seek the index to
+    first = ordering[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+    return bound & condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def _row_values(obj, ordering):
+    return [reduce(getattr, field.lstrip('-').split('__'), obj) for field in ordering]
+
+
+def paginate_keyset(queryset, ordering, cursor=None, per_page=20):
+    """
+    Fetch one page of `queryset` ordered by `ordering`, seeking past a cursor.
+
+    `ordering` must end in a unique, non-null field (normally 'id') so the
+    sort is total. Instead of OFFSET the page is found with a WHERE on the
+    last row seen, so every page costs the same as the first.
+    """
+    direction, values = decode_cursor(cursor, len(ordering)) if cursor else (None, None)
+    if direction:
+        try:
+            seek = _after(_reverse(ordering) if direction == 'prev' else ordering, values)
+            queryset.filter(seek)
+        except (ValueError, ValidationError):
+            # Values that do not fit the fields: start again from the top
+            direction = None
+
+    if direction == 'prev':
+        rows = list(queryset.filter(seek).order_by(*_reverse(ordering))[:per_page + 1])
+        more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next, has_previous = True, more
+    else:
+        if direction == 'next':
+            queryset = queryset.filter(seek)
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        has_next, has_previous = more, direction == 'next'
+
+    next_cursor = encode_cursor('next', _row_values(rows[-1], ordering)) if rows and has_next else None
+    previous_cursor = encode_cursor('prev', _row_values(rows[0], ordering)) if rows and has_previous else None
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def capped_count(queryset, cap):
+    """
+    Count rows up to `cap`, returning (count, capped).
+
+    Counting over a LIMIT subquery stops the database after `cap + 1`
+    rows, so large filtered result sets stay cheap to summarise.
+    """
+    count = queryset.order_by().values('pk')[:cap + 1].count()
+    return min(count, cap), count > cap
@@ -0,0 +1,490 @@
+"""
+Word (python-docx) rendering for student progress reports, transcripts,
+pass lists and marks entry sheets.
+
+The renderers here only take plain Python values, never model instances,
+so they can run in worker processes when a whole class is exported.
+"""
+import copy
+import io
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from pathlib import Path
+
+from docx import Document
+from docx.shared import Inches, Pt
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+
+from .grading import DEFAULT_SCHEME
+from .metrics import observe_render
+
+
+logger = logging.getLogger(__name__)
+
+REPORT_DIR = Path(__file__).resolve().parent.parent / 'report'
+HEADER_IMAGE = REPORT_DIR / 'head.jpg'
+FOOTER_IMAGE = REPORT_DIR / 'foot.png'
+
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Placeholder text of the skeleton's template results row, one per column
+RESULT_COLUMNS = ['{unit}', '{cat}', '{end_term}', '{average}', '{remark}']
+
+# Runs of the skeleton's template grading system row
+LEGEND_RUNS = ['{range} – ', '{grade}', ' ({remark})']
+
+
+def report_filename(student_name, year, term):
+    return f"Progress_Report_{student_name.replace(' ', '_') if student_name else 'all'}_{year or 'all'}_T{term or 'all'}.docx"
+
+
+def report_rows(records):
+    """(unit name, CAT 1, CAT 2, end term) tuples for render_progress_report."""
+    return [
+        (record.unit.name, float(record.cat1_score), float(record.cat2_score), float(record.end_term_score))
+        for record in records
+    ]
+
+
+def build_report_skeleton():
+    """
+    Build the static parts of a progress report from scratch.
+
+    Margins, header/footer images and signatures are laid out once; the
+    student details, mean score and grade are left as {placeholders} and
+    the results and grading system tables have one template row each.
+    """
+    doc = Document()
+    section = doc.sections[0]
+    section.top_margin = Inches(0.3)
+    section.bottom_margin = Inches(0.3)
+    section.left_margin = Inches(0.3)
+    section.right_margin = Inches(0.3)
+
+    # HEADER IMAGE (full width, very top)
+    try:
+        doc.add_picture(str(HEADER_IMAGE), width=Inches(7.0))
+    except FileNotFoundError:
+        doc.add_paragraph("Header image not found.")
+
+    # TITLE
+    p = doc.add_paragraph()
+    run = p.add_run('STUDENTS   PROGRESS   REPORT')
+    run.bold = True
+    run.font.size = Pt(16)
+    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph()
+    # STUDENT INFO (no table, just paragraphs, bold field names only)
+    p = doc.add_paragraph()
+    p.add_run("STUDENT'S NAME:").bold = True
+    p.add_run(" {student_name}    ")
+    p.add_run("ADM NO:").bold = True
+    p.add_run(" {admission_number}")
+    p = doc.add_paragraph()
+    p.add_run("COURSE:").bold = True
+    p.add_run(" {course_name}    ")
+    p.add_run("ACADEMIC YEAR:").bold = True
+    p.add_run(" {year}")
+    p = doc.add_paragraph()
+    p.add_run("TERM:").bold = True
+    p.add_run(" {term}")
+    doc.add_paragraph()
+    # RESULTS TABLE (rows are added per student)
+    results_table = doc.add_table(rows=1, cols=5)
+    results_table.style = 'Table Grid'
+    hdr = results_table.rows[0].cells
+    hdr[0].text = 'SUBJECT/UNIT'
+    hdr[1].text = 'CAT'
+    hdr[2].text = 'END TERM'
+    hdr[3].text = 'AVERAGE%'
+    hdr[4].text = 'REMARKS'
+    for cell in hdr:
+        for p in cell.paragraphs:
+            for r in p.runs:
+                r.font.bold = True
+                r.font.size = Pt(10)
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    # Template row, cloned once per unit by fill_report
+    row = results_table.add_row().cells
+    for i, placeholder in enumerate(RESULT_COLUMNS):
+        row[i].text = placeholder
+        if i:
+            row[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph()
+    # MEAN SCORE & GRADE (single paragraph, spaced)
+    mean_grade_para = doc.add_paragraph()
+    mean_grade_para.add_run('MEAN SCORE: {mean_score}').bold = True
+    mean_grade_para.add_run(' ' * 15)
+    mean_grade_para.add_run('GRADES: {grade}').bold = True
+    doc.add_paragraph()
+    # GRADING SYSTEM BOX (narrower, only grade letter bold)
+    grading_table = doc.add_table(rows=2, cols=1)
+    grading_table.style = 'Table Grid'
+    grading_table.autofit = False
+    grading_table.columns[0].width = Inches(1.2)
+    grading_table.cell(0,0).text = ''
+    grading_table.cell(0,0).paragraphs[0].add_run('Grading system:').bold = True
+    # Template row, cloned once per grade band by fill_report
+    p = grading_table.cell(1,0).paragraphs[0]
+    for text in LEGEND_RUNS:
+        p.add_run(text).bold = text == '{grade}'
+    doc.add_paragraph()
+    # SIGNATURES (not in a table, just paragraphs)
+    sig_line = doc.add_paragraph()
+    sig_line.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    sig_line.add_run('Signed_________________').italic = True
+    sig_line.add_run(' ' * 10)
+    sig_line.add_run('Signed_________________').italic = True
+    sig_titles = doc.add_paragraph()
+    sig_titles.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    sig_titles.add_run('EXAMINATION').bold = True
+    sig_titles.add_run(' ' * 20)
+    sig_titles.add_run('PRINCIPAL').bold = True
+    for run in sig_titles.runs:
+        run.italic = True
+    doc.add_paragraph()
+    # FOOTER IMAGE (full width, very bottom)
+    doc.add_picture(str(FOOTER_IMAGE), width=Inches(7.0))
+    return doc
+
+
+@lru_cache(maxsize=None)
+def report_skeleton():
+    """The report skeleton saved as .docx bytes, built once per process."""
+    f = io.BytesIO()
+    build_report_skeleton().save(f)
+    return f.getvalue()
+
+
+def fill_report(doc, student_name, admission_number, course_name, year, term, rows, scheme=DEFAULT_SCHEME):
+    """Write one student's details and results, graded under `scheme`, into a report skeleton."""
+    # RESULTS TABLE: one copy of the template row per unit
+    marks = []
+    for unit_name, cat1, cat2, end_term_score in rows:
+        cat_avg = int(round((cat1 + cat2) / 2))
+        end_term = int(round(end_term_score))
+        marks.append((unit_name.upper(), cat_avg, end_term, int(round(cat_avg + end_term))))
+    bands = scheme.grade_scores([mark[3] for mark in marks])
+    clone_rows(doc.tables[0].rows[1]._tr, [mark + (band.remark,) for mark, band in zip(marks, bands)])
+
+    # GRADING SYSTEM: one copy of the template row per band
+    clone_rows(doc.tables[1].rows[1]._tr, [
+        (f'{score_range} – ', grade, f' ({remark})') for score_range, grade, remark in scheme.legend()
+    ])
+
+    mean_score = int(round(sum(mark[3] for mark in marks) / len(marks))) if marks else 0
+    band = scheme.band(mean_score)
+    grade = f'{band.grade}..({band.remark.upper()})'
+
+    values = {
+        'student_name': student_name or '....................................................',
+        'admission_number': admission_number or '................',
+        'course_name': course_name or '..................................................',
+        'year': year or '................',
+        'term': term or '................',
+        'mean_score': mean_score,
+        'grade': grade,
+    }
+    for paragraph in doc.paragraphs:
+        for run in paragraph.runs:
+            if '{' in run.text:
+                run.text = run.text.format_map(values)
+
+
+def render_progress_report(
+    student_name, admission_number, course_name, year, term, rows, scheme=DEFAULT_SCHEME, use_skeleton=True,
+):
+    """
+    Build a student's progress report and return the .docx file as bytes.
+
+    `scheme` is the exams.grading.CompiledScheme to grade with. Starts
+    from a fresh copy of the cached skeleton; pass use_skeleton=False to
+    lay the whole document out from scratch.
+    """
+    if use_skeleton:
+        doc = Document(io.BytesIO(report_skeleton()))
+    else:
+        doc = build_report_skeleton()
+    fill_report(doc, student_name, admission_number, course_name, year, term, rows, scheme)
+    f = io.BytesIO()
+    doc.save(f)
+    return f.getvalue()
+
+
+def clone_rows(template_row, rows):
+    """Replace a template table row (a w:tr element) with one filled-in copy per row of values."""
+    for values in rows:
+        row = copy.deepcopy(template_row)
+        for text_element, value in zip(row.iter(qn('w:t')), values):
+            text_element.text = str(value)
+        template_row.addprevious(row)
+    template_row.getparent().remove(template_row)
+
+
+def append_rows(table, rows):
+    """
+    Append `rows` (sequences of cell text) to a python-docx table.
+
+    add_row() gets slower as the table grows, so one row is laid out and
+    copies of it are filled in instead.
+    """
+    if not rows:
+        return
+    template = table.add_row()
+    for cell in template.cells:
+        cell.text = ' '
+    clone_rows(template._tr, rows)
+
+
+def render_pass_list(heading_lines, rows):
+    """
+    The pass list as .docx bytes: a title, one paragraph per heading line
+    and a table of (name, registration number, course, average) rows.
+    """
+    doc = Document()
+    doc.add_heading('Pass List', 0)
+    for line in heading_lines:
+        doc.add_paragraph(line)
+
+    table = doc.add_table(rows=1, cols=4)
+    table.style = 'Table Grid'
+    header_cells = table.rows[0].cells
+    header_cells[0].text = 'Student Name'
+    header_cells[1].text = 'Registration Number'
+    header_cells[2].text = 'Course'
+    header_cells[3].text = 'Average Score'
+    append_rows(table, [(name, registration_number, course, f'{average:.2f}') for name, registration_number, course, average in rows])
+
+    f = io.BytesIO()
+    doc.save(f)
+    return f.getvalue()
+
+
+def render_marks_entry_sheet(course, term, year, unit, rows):
+    """
+    A marks entry sheet as .docx bytes: the class's current marks as
+    (name, registration number, CAT 1, CAT 2, end term, total) rows,
+    followed by blank rows to fill in by hand.
+    """
+    doc = Document()
+    section = doc.sections[0]
+    section.top_margin = Inches(0.5)
+    section.bottom_margin = Inches(0.5)
+    section.left_margin = Inches(0.5)
+    section.right_margin = Inches(0.5)
+
+    try:
+        doc.add_picture(str(HEADER_IMAGE), width=Inches(6.5))
+    except FileNotFoundError:
+        doc.add_paragraph("Header image not found.")
+
+    # Form details
+    p = doc.add_paragraph()
+    p.add_run('COURSE: ').bold = True
+    p.add_run(course or '....................................................')
+    p.add_run('    SEMESTER: ').bold = True
+    p.add_run(term or '................')
+    p.add_run('    YEAR: ').bold = True
+    p.add_run(year or '................')
+
+    p = doc.add_paragraph()
+    p.add_run('SUBJECT: ').bold = True
+    p.add_run(unit or '..................................................')
+
+    table = doc.add_table(rows=1, cols=7)
+    table.style = 'Table Grid'
+    hdr_cells = table.rows[0].cells
+    for cell, title in zip(hdr_cells, ('STUDENT NAME', 'ADM NO', 'ASSN', 'CAT 1', 'CAT 2', 'END TERM', 'TOTAL')):
+        cell.text = title
+        cell.paragraphs[0].runs[0].font.bold = True
+        cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # ASSN is not in the model, so its column is left blank
+    append_rows(table, [
+        (name.upper(), registration_number, '', cat1, cat2, end_term, f'{total:.2f}')
+        for name, registration_number, cat1, cat2, end_term, total in rows
+    ])
+
+    # Empty rows for manual entry
+    for _ in range(15):
+        table.add_row()
+
+    f = io.BytesIO()
+    doc.save(f)
+    return f.getvalue()
+
+
+def render_transcript(student_name, admission_number, course_name, transcript):
+    """
+    A cumulative transcript as .docx bytes: one results table per term
+    with its mean and the running mean, then the overall result and the
+    grading system, from exams.transcripts.student_transcript() data.
+    """
+    doc = Document()
+    section = doc.sections[0]
+    section.top_margin = Inches(0.3)
+    section.bottom_margin = Inches(0.3)
+    section.left_margin = Inches(0.5)
+    section.right_margin = Inches(0.5)
+
+    try:
+        doc.add_picture(str(HEADER_IMAGE), width=Inches(7.0))
+    except FileNotFoundError:
+        doc.add_paragraph("Header image not found.")
+
+    p = doc.add_paragraph()
+    run = p.add_run('ACADEMIC   TRANSCRIPT')
+    run.bold = True
+    run.font.size = Pt(16)
+    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    p = doc.add_paragraph()
+    p.add_run("STUDENT'S NAME:").bold = True
+    p.add_run(f" {student_name}    ")
+    p.add_run("ADM NO:").bold = True
+    p.add_run(f" {admission_number}")
+    p = doc.add_paragraph()
+    p.add_run("COURSE:").bold = True
+    p.add_run(f" {course_name}")
+
+    for term in transcript['terms']:
+        p = doc.add_paragraph()
+        p.add_run(f"YEAR {term['year']} – TERM {term['term']}").bold = True
+        table = doc.add_table(rows=1, cols=6)
+        table.style = 'Table Grid'
+        for cell, title in zip(table.rows[0].cells, ('SUBJECT/UNIT', 'CAT', 'END TERM', 'TOTAL', 'GRADE', 'REMARKS')):
+            cell.text = title
+            cell.paragraphs[0].runs[0].font.bold = True
+        append_rows(table, [
+            (unit['unit'].upper(), f"{unit['cat']:.2f}", f"{unit['end_term']:.2f}", f"{unit['total']:.2f}", unit['grade'], unit['remark'])
+            for unit in term['units']
+        ])
+        p = doc.add_paragraph()
+        p.add_run(f"TERM MEAN: {term['mean']:.2f} ({term['grade']}, {term['remark']})").bold = True
+        p.add_run(' ' * 10)
+        p.add_run(f"CUMULATIVE MEAN: {term['running_mean']:.2f}").bold = True
+
+    overall = transcript['overall']
+    doc.add_paragraph()
+    p = doc.add_paragraph()
+    if overall['mean'] is None:
+        p.add_run('No results recorded.').bold = True
+    else:
+        p.add_run(
+            f"OVERALL MEAN: {overall['mean']:.2f}    GRADE: {overall['grade']}..({overall['remark'].upper()})    "
+            f"UNITS PASSED: {overall['units_passed']} of {overall['units']}"
+        ).bold = True
+
+    grading_table = doc.add_table(rows=1, cols=1)
+    grading_table.style = 'Table Grid'
+    grading_table.cell(0, 0).paragraphs[0].add_run('Grading system:').bold = True
+    for score_range, grade, remark in transcript['legend']:
+        p = grading_table.add_row().cells[0].paragraphs[0]
+        p.add_run(f'{score_range} – ')
+        p.add_run(grade).bold = True
+        p.add_run(f' ({remark})')
+
+    f = io.BytesIO()
+    doc.save(f)
+    return f.getvalue()
+
+
+def render_report_task(task):
+    """
+    Worker entry point: render one report described by a plain dict.
+
+    Returns (filename, docx bytes, render seconds).
+    """
+    started = time.perf_counter()
+    content = render_progress_report(
+        task['student_name'],
+        task['admission_number'],
+        task['course_name'],
+        task['year'],
+        task['term'],
+        task['rows'],
+        task.get('scheme', DEFAULT_SCHEME),
+    )
+    filename = report_filename(task['student_name'], task['year'], task['term'])
+    return filename, content, time.perf_counter() - started
+
+
+def render_reports(tasks, max_workers=None):
+    """
+    Render many reports, yielding (filename, bytes, seconds) as each finishes.
+
+    Rendering is CPU-bound, so reports are spread over a process pool of
+    `max_workers` processes (default: one per CPU). With one worker they
+    are rendered inline.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield render_report_task(task)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=min(max_workers, len(tasks)))
+    try:
+        futures = [executor.submit(render_report_task, task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Also reached when the client disconnects mid-download
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only sink that hands ZipFile output back in chunks."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_reports_zip(tasks, max_workers=None, label='reports'):
+    """
+    Yield a ZIP archive of rendered reports chunk by chunk.
+
+    Each document is compressed and sent as soon as its worker finishes,
+    so only one rendered report is held in memory at a time. Render time
+    per document and the total wall time are logged for pool sizing.
+    """
+    started = time.perf_counter()
+    sink = _ZipStream()
+    used_names = set()
+    render_seconds = 0.0
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, content, seconds in render_reports(tasks, max_workers):
+            render_seconds += seconds
+            observe_render('progress_report', seconds)
+            logger.info('Rendered %s in %.3fs', filename, seconds)
+            # Two students can share a name; keep both files
+            name, suffix = filename, 1
+            while name in used_names:
+                suffix += 1
+                name = filename.replace('.docx', f'_{suffix}.docx')
+            used_names.add(name)
+            archive.writestr(name, content)
+            yield sink.pop()
+    yield sink.pop()
+    wall = time.perf_counter() - started
+    logger.info(
+        'Rendered %d %s in %.3fs wall time (%.3fs render time, %.3fs per document, %s workers)',
+        len(tasks), label, wall, render_seconds,
+        render_seconds / len(tasks) if tasks else 0, max_workers or os.cpu_count(),
+    )
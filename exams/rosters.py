@@ -0,0 +1,72 @@
+"""
+Course rosters for the batch marks-entry grid.
+
+The grid used to expect every student of the campus inlined into the
+page. It now fetches one course's roster when the course is picked.
+Rosters are columnar (parallel lists of ids, names and registration
+numbers), which keeps the JSON small, and are cached in Django's cache
+under a per-course version (see exams.versions).
+
+Saving or deleting a student bumps the version of its course, and of
+the course it left when it moved. Bulk writes, which send no signals,
+call touch_rosters() themselves.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from .models import Student
+from .versions import bump_on_commit, get_version
+
+
+def _version_key(course_id):
+    return f'exams:roster:version:{course_id}'
+
+
+def _roster_key(course_id, version):
+    return f'exams:roster:{course_id}:{version}'
+
+
+def roster_version(course_id):
+    return get_version(_version_key(course_id))
+
+
+def touch_rosters(*course_ids):
+    """Invalidate the rosters of `course_ids` once the current transaction commits."""
+    bump_on_commit(_version_key(course_id) for course_id in course_ids if course_id is not None)
+
+
+def build_roster(course_id):
+    """A course's students by name, as {'ids': [...], 'names': [...], 'registration_numbers': [...]}."""
+    rows = Student.objects.filter(course_id=course_id).order_by('name', 'id').values_list(
+        'id', 'name', 'registration_number',
+    )
+    ids, names, registration_numbers = (list(column) for column in zip(*rows)) if rows else ([], [], [])
+    return {'ids': ids, 'names': names, 'registration_numbers': registration_numbers}
+
+
+def course_roster(course_id, version=None):
+    """
+    The roster of a course, from the cache when current. Pass the
+    `version` already read from roster_version() to reuse it.
+    """
+    version = roster_version(course_id) if version is None else version
+    key = _roster_key(course_id, version)
+    roster = cache.get(key)
+    if roster is None:
+        roster = build_roster(course_id)
+        cache.set(key, roster, settings.ROSTER_CACHE_TIMEOUT)
+    return roster
+
+
+def roster_student_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_rosters(instance.course_id, getattr(instance, '_loaded_course_id', instance.course_id))
+
+
+def roster_student_deleted(sender, instance, **kwargs):
+    touch_rosters(instance.course_id)
+
+
+post_save.connect(roster_student_saved, sender=Student, dispatch_uid='exams_roster_saved')
+post_delete.connect(roster_student_deleted, sender=Student, dispatch_uid='exams_roster_deleted')
@@ -0,0 +1,269 @@
+"""
+Indexed name search for students, courses and units.
+
+The record filters and admin search boxes used `icontains`, which scans
+every joined row. Searches now go through a backend chosen by database
+vendor (or settings.SEARCH_BACKEND):
+
+* SQLite: an FTS5 table with the trigram tokenizer per model, kept in
+  sync by triggers. Any substring of three or more characters is an
+  index lookup.
+* PostgreSQL: pg_trgm GIN indexes, used by ILIKE and by the `<%` word
+  similarity operator.
+
+Both match substrings, so registration number prefixes like `MIN/01`
+work. When nothing contains the search text they fall back to rows a
+typo or two away from it, so a mistyped `MIN/01/120/23` still finds
+`MIN/01/102/23`.
+"""
+import re
+from functools import lru_cache, reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Course, Student, Unit
+
+
+# Searchable models and the columns indexed for each
+SEARCH_INDEXES = {
+    'student': (Student, ['name', 'registration_number']),
+    'course': (Course, ['name']),
+    'unit': (Unit, ['name']),
+}
+
+# Lookup from each searchable model to its campus id
+CAMPUS_LOOKUPS = {
+    'student': 'campus_id',
+    'course': 'school__campus_id',
+    'unit': 'course__school__campus_id',
+}
+
+# Fuzzy candidates examined per piece of the search text on SQLite
+FUZZY_CANDIDATES = 200
+
+
+def allowed_typos(text):
+    """Edits tolerated in a search: none below 6 characters, 2 from 16."""
+    return 2 if len(text) >= 16 else 1 if len(text) >= 6 else 0
+
+
+def substring_distance(text, value):
+    """
+    Fewest edits (insertions, deletions, substitutions or swaps of two
+    adjacent characters) turning `text` into some substring of `value`.
+    """
+    text, value = text.lower(), value.lower()
+    before, previous = None, [0] * (len(value) + 1)
+    for i, char in enumerate(text, 1):
+        current = [i]
+        for j, other in enumerate(value, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other))
+            if before and j > 1 and char == value[j - 2] and text[i - 2] == other:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        before, previous = previous, current
+    return min(previous)
+
+
+def split_pieces(text, count):
+    """Split `text` into `count` nearly equal pieces."""
+    size, extra = divmod(len(text), count)
+    pieces, start = [], 0
+    for i in range(count):
+        end = start + size + (i < extra)
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+
+class SearchBackend:
+    """
+    Fallback backend: case-insensitive substring match without an index.
+
+    Backends build Qs on the searched model's primary key, so results can
+    be combined with any other filter. A search is a substring match;
+    only when nothing contains the text does it fall back to rows that
+    are similar to it, so prefixes stay precise and typos still match.
+    """
+
+    def install(self, connection):
+        """Create any index structures; must be safe to run repeatedly."""
+
+    def contains(self, kind, text):
+        model, fields = SEARCH_INDEXES[kind]
+        return reduce(or_, (Q(**{f'{field}__icontains': text}) for field in fields))
+
+    def similar(self, kind, text):
+        return Q(pk__in=[])
+
+    def match(self, kind, text, campus_id=None):
+        """
+        Rows containing `text`, or similar to it if none do. With
+        `campus_id`, only that campus's rows count towards "none do".
+        """
+        model, fields = SEARCH_INDEXES[kind]
+        condition = self.contains(kind, text)
+        candidates = model.objects.filter(condition)
+        if campus_id is not None:
+            candidates = candidates.filter(**{CAMPUS_LOOKUPS[kind]: campus_id})
+        if candidates.exists():
+            return condition
+        return self.similar(kind, text)
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 trigram tables over each searchable model, synced by triggers."""
+
+    def _tables(self, kind):
+        model, fields = SEARCH_INDEXES[kind]
+        return model._meta.db_table, f'{model._meta.db_table}_search', fields
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+            existing = {row[0] for row in cursor.fetchall()}
+            for kind in SEARCH_INDEXES:
+                table, index, fields = self._tables(kind)
+                triggers = [f'{index}_ai', f'{index}_ad', f'{index}_au']
+                # Rebuilding a table in a later migration drops its
+                # triggers, so check them too, not just the FTS table
+                if index in existing and all(trigger in existing for trigger in triggers):
+                    continue
+                columns = ', '.join(fields)
+                new_values = ', '.join(f'new.{field}' for field in fields)
+                old_values = ', '.join(f'old.{field}' for field in fields)
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+                    f"{columns}, content='{table}', content_rowid='id', tokenize='trigram')"
+                )
+                for trigger in triggers:
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+                cursor.execute(
+                    f'CREATE TRIGGER {index}_ai AFTER INSERT ON {table} BEGIN '
+                    f'INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new_values}); END'
+                )
+                cursor.execute(
+                    f'CREATE TRIGGER {index}_ad AFTER DELETE ON {table} BEGIN '
+                    f"INSERT INTO {index}({index}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+                )
+                cursor.execute(
+                    f'CREATE TRIGGER {index}_au AFTER UPDATE OF {columns} ON {table} BEGIN '
+                    f"INSERT INTO {index}({index}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                    f'INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new_values}); END'
+                )
+                cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+    def contains(self, kind, text):
+        if len(text) < 3:
+            # The trigram tokenizer cannot match fewer than three characters
+            return super().contains(kind, text)
+        table, index, fields = self._tables(kind)
+        # A quoted phrase of trigrams is a case-insensitive substring match
+        phrase = '"%s"' % text.replace('"', '""')
+        return Q(pk__in=RawSQL(f'SELECT rowid FROM {index} WHERE {index} MATCH %s', [phrase]))
+
+    def similar(self, kind, text):
+        """
+        Rows within allowed_typos(text) edits of containing `text`.
+
+        With k edits, at least one of k + 1 pieces of the text survives
+        intact, so rows containing any piece are the candidates. Each
+        piece is looked up separately, so a common piece such as
+        `MIN/01` cannot crowd out the rows found by a rare one; the
+        candidates are then checked with an edit distance.
+        """
+        table, index, fields = self._tables(kind)
+        typos = allowed_typos(text)
+        if not typos:
+            return super().similar(kind, text)
+        pieces = ['"%s"' % piece.replace('"', '""') for piece in split_pieces(text, typos + 1)]
+        lookup = f'SELECT * FROM (SELECT rowid, {", ".join(fields)} FROM {index} WHERE {index} MATCH %s LIMIT %s)'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                ' UNION '.join([lookup] * len(pieces)),
+                [param for piece in pieces for param in (piece, FUZZY_CANDIDATES)],
+            )
+            rows = cursor.fetchall()
+        return Q(pk__in=[
+            row[0] for row in rows
+            if any(value and substring_distance(text, value) <= typos for value in row[1:])
+        ])
+
+
+class PostgresSearchBackend(SearchBackend):
+    """pg_trgm GIN indexes, used by ILIKE and word similarity."""
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for model, fields in SEARCH_INDEXES.values():
+                table = model._meta.db_table
+                for field in fields:
+                    cursor.execute(
+                        f'CREATE INDEX IF NOT EXISTS {table}_{field}_trgm '
+                        f'ON {table} USING gin ({field} gin_trgm_ops)'
+                    )
+
+    def _where(self, kind, condition, params):
+        model, fields = SEARCH_INDEXES[kind]
+        where = ' OR '.join(condition.format(field=field) for field in fields)
+        return Q(pk__in=RawSQL(f'SELECT id FROM {model._meta.db_table} WHERE {where}', params * len(fields)))
+
+    def contains(self, kind, text):
+        pattern = '%%%s%%' % re.sub(r'([\\%_])', r'\\\1', text)
+        return self._where(kind, '{field} ILIKE %s', [pattern])
+
+    def similar(self, kind, text):
+        return self._where(kind, '%s <%% {field}', [text])
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_backend(vendor):
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(vendor, SearchBackend)()
+
+
+def search_q(kind, text, path='', campus_id=None):
+    """
+    Q matching rows whose related `kind` ('student', 'course' or 'unit')
+    contains `text`. `path` is the relation to that model from the
+    queryset being filtered, e.g. 'student' or 'unit__course' on exam
+    records; leave it empty to filter the searched model itself. Pass
+    the `campus_id` the queryset is limited to, so matches elsewhere do
+    not stop the fallback to similar rows.
+    """
+    condition = get_backend(connection.vendor).match(kind, text.strip(), campus_id)
+    if not path:
+        return condition
+    # Re-root the pk condition onto the relation
+    model, fields = SEARCH_INDEXES[kind]
+    return Q(**{f'{path}__in': model.objects.filter(condition).values('pk')})
+
+
+def search_terms_q(indexes, search_term):
+    """
+    Admin-style search: every whitespace-separated term must match one
+    of the (kind, path) `indexes`.
+    """
+    return reduce(and_, (
+        reduce(or_, (search_q(kind, term, path) for kind, path in indexes))
+        for term in search_term.split()
+    ))
+
+
+def install_search_indexes(using=DEFAULT_DB_ALIAS):
+    db = connections[using]
+    get_backend(db.vendor).install(db)
@@ -0,0 +1,160 @@
+"""
+Synthetic data at production scale, for load testing and benchmarks.
+
+Everything is written with bulk_create, so model save() hooks and
+signals do not run: denormalised campus keys, sort names, averages and
+grades are filled in here, and the dashboard counters are rebuilt and
+the campus catalogs and data versions invalidated at the end.
+"""
+import random
+from decimal import Decimal
+
+from django.db import transaction
+
+from .catalog import touch_catalog
+from .dashboard import rebuild_counters
+from .grading import assign_grades
+from .models import Campus, Course, ExamRecord, School, Student, Unit
+from .services import assign_sort_names
+from .stamps import touch_campus_data
+
+
+SEED_BATCH_SIZE = 2000
+
+# Named sizes for benchmarks: counts are per parent (schools per campus,
+# courses per school, units and students per course), terms per student
+SCALE_SIZES = {
+    'small': {'campuses': 2, 'schools': 2, 'courses': 3, 'units': 6, 'students': 20, 'terms': 2},
+    'medium': {'campuses': 3, 'schools': 3, 'courses': 4, 'units': 8, 'students': 60, 'terms': 2},
+    'large': {'campuses': 4, 'schools': 4, 'courses': 5, 'units': 8, 'students': 150, 'terms': 3},
+}
+
+TERMS = ['I', 'II', 'III']
+
+FIRST_NAMES = [
+    'Amina', 'Brian', 'Cynthia', 'David', 'Esther', 'Felix', 'Grace', 'Hassan', 'Irene', 'James',
+    'Kevin', 'Lucy', 'Mercy', 'Nelson', 'Faith', 'Peter', 'Ruth', 'Samuel', 'Tabitha', 'Victor',
+]
+LAST_NAMES = [
+    'Achieng', 'Barasa', 'Chebet', 'Kamau', 'Kiprono', 'Mutua', 'Njeri', 'Odhiambo', 'Omondi', 'Otieno',
+    'Wafula', 'Wambui', 'Wanjiku', 'Were', 'Mwangi', 'Kariuki', 'Nyambura', 'Korir', 'Onyango', 'Juma',
+]
+COURSE_NAMES = [
+    'Nursing', 'Clinical Medicine', 'Pharmacy', 'Medical Laboratory Science', 'Nutrition and Dietetics',
+    'Health Records', 'Community Health', 'Radiography', 'Physiotherapy', 'Dental Technology',
+]
+UNIT_NAMES = [
+    'Anatomy', 'Physiology', 'Microbiology', 'Pharmacology', 'Pathology', 'Biochemistry', 'Medical Ethics',
+    'Communication Skills', 'Research Methods', 'Epidemiology', 'Health Education', 'First Aid',
+]
+
+
+def seed_scale_data(campuses, schools, courses, units, students, terms, prefix='Scale', seed=0, start_year=2024):
+    """
+    Create `campuses` campuses named '<prefix> Campus <n>', each with
+    `schools` schools of `courses` courses, each course with `units`
+    units and `students` students. Every student gets a record for each
+    unit of their course in each of the first `terms` terms from
+    `start_year` on. Returns the number of rows created per model.
+    """
+    rng = random.Random(seed)
+    created = {}
+    with transaction.atomic():
+        # Created one by one so the campus cache hears about them
+        campus_rows = [Campus.objects.create(name=f'{prefix} Campus {n + 1}') for n in range(campuses)]
+        created['campuses'] = len(campus_rows)
+
+        school_rows = School.objects.bulk_create([
+            School(name=f'School {n + 1}', campus=campus) for campus in campus_rows for n in range(schools)
+        ])
+        created['schools'] = len(school_rows)
+
+        course_rows = Course.objects.bulk_create([
+            Course(name=_numbered(COURSE_NAMES, n), school=school) for school in school_rows for n in range(courses)
+        ])
+        created['courses'] = len(course_rows)
+
+        unit_rows = Unit.objects.bulk_create(
+            [Unit(name=_numbered(UNIT_NAMES, n), course=course) for course in course_rows for n in range(units)],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        created['units'] = len(unit_rows)
+
+        campus_of_school = {school.id: school.campus_id for school in school_rows}
+        serial = Student.objects.filter(registration_number__startswith=_registration_prefix(prefix)).count()
+        student_rows = []
+        for course in course_rows:
+            for n in range(students):
+                serial += 1
+                student_rows.append(Student(
+                    name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    registration_number=f'{_registration_prefix(prefix)}{serial:06d}/{start_year % 100}',
+                    course=course,
+                    campus_id=campus_of_school[course.school_id],
+                ))
+        student_rows = Student.objects.bulk_create(student_rows, batch_size=SEED_BATCH_SIZE)
+        created['students'] = len(student_rows)
+
+        units_of_course = {}
+        for unit in unit_rows:
+            units_of_course.setdefault(unit.course_id, []).append(unit)
+        sittings = [(start_year + n // len(TERMS), TERMS[n % len(TERMS)]) for n in range(terms)]
+        created['records'] = 0
+        batch = []
+        for student in student_rows:
+            for year, term in sittings:
+                for unit in units_of_course.get(student.course_id, []):
+                    record = ExamRecord(
+                        student=student,
+                        unit=unit,
+                        campus_id=student.campus_id,
+                        term=term,
+                        year=year,
+                        cat1_score=Decimal(rng.randint(5, 30)),
+                        cat2_score=Decimal(rng.randint(5, 30)),
+                        end_term_score=Decimal(rng.randint(15, 70)),
+                    )
+                    record.calculate_averages()
+                    batch.append(record)
+                    if len(batch) >= SEED_BATCH_SIZE:
+                        assign_grades(batch)
+                        assign_sort_names(batch)
+                        created['records'] += len(ExamRecord.objects.bulk_create(batch))
+                        batch = []
+        if batch:
+            assign_grades(batch)
+            assign_sort_names(batch)
+            created['records'] += len(ExamRecord.objects.bulk_create(batch))
+
+        rebuild_counters([campus.id for campus in campus_rows])
+        touch_catalog(*[campus.id for campus in campus_rows])
+        touch_campus_data(*[campus.id for campus in campus_rows])
+    return created
+
+
+def clear_scale_data(prefix='Scale'):
+    """Delete the campuses created by seed_scale_data() with `prefix`, and everything under them."""
+    campuses = Campus.objects.filter(name__startswith=f'{prefix} Campus ')
+    per_model = {}
+    with transaction.atomic():
+        # The bulk of the rows go without per-row delete signals; the
+        # campuses' dashboard counters are deleted with them anyway
+        for rows in (
+            ExamRecord.objects.filter(student__course__school__campus__in=campuses),
+            Student.objects.filter(course__school__campus__in=campuses),
+        ):
+            per_model[rows.model._meta.label] = rows._raw_delete(rows.db)
+        deleted, cascaded = campuses.delete()
+    for label, count in cascaded.items():
+        per_model[label] = per_model.get(label, 0) + count
+    return per_model
+
+
+def _numbered(names, n):
+    """The n-th name, with a number once the list runs out."""
+    name = names[n % len(names)]
+    return name if n < len(names) else f'{name} {n // len(names) + 1}'
+
+
+def _registration_prefix(prefix):
+    return f'{prefix[:3].upper()}/'
@@ -0,0 +1,318 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+
+from .catalog import touch_catalog
+from .dashboard import adjust_counters
+from .stamps import touch_campus_data
+from .grading import assign_grades
+from .models import ExamRecord, Student, Unit
+from .search import search_q
+
+
+# Score ceilings, matching the ExamRecord field validators
+MAX_CAT_SCORE = 30
+MAX_END_TERM_SCORE = 70
+
+# Per-row outcomes reported by upsert_marks
+CREATED = 'created'
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+INVALID = 'invalid'
+
+# view_records sort options, keyed by the `sort` parameter. Each sorts on
+# a column of ExamRecord itself and ends in 'id', so keyset pagination has
+# a total order and the campus's (campus, column) index serves it
+RECORD_SORT_ORDERINGS = {
+    'student__name': ['student_name', 'id'],
+    'unit__course__name': ['course_name', 'id'],
+    'unit__name': ['unit_name', 'id'],
+    'total_average': ['-total_average', 'id'],
+}
+
+
+def filter_records(records, params, campus_id=None):
+    """
+    Apply the view_records filters in `params` (student, course, unit,
+    term, year and sort) to an ExamRecord queryset, limited to
+    `campus_id` if given.
+
+    Returns (records, filters) where filters holds the values used, with
+    `sort` always set to a key of RECORD_SORT_ORDERINGS.
+    """
+    filters = {key: params.get(key) for key in ('course', 'unit', 'student', 'year', 'term')}
+
+    if filters['student']:
+        records = records.filter(search_q('student', filters['student'], 'student', campus_id))
+    if filters['course']:
+        records = records.filter(search_q('course', filters['course'], 'unit__course', campus_id))
+    if filters['unit']:
+        records = records.filter(search_q('unit', filters['unit'], 'unit', campus_id))
+    if filters['term']:
+        records = records.filter(term__iexact=filters['term'])
+    if filters['year']:
+        records = records.filter(year=filters['year'])
+
+    filters['sort'] = params.get('sort') if params.get('sort') in RECORD_SORT_ORDERINGS else 'student__name'
+    return records, filters
+
+
+def get_pass_list(campus=None, course=None, term=None, year=None):
+    """
+    Students with at least one passed unit, best average first.
+
+    Runs as a single grouped query over the stored record totals: records
+    with a missing (zero) score or that fail under their grading scheme
+    are left out, and every student comes back with `pass_count`,
+    `average` and its course already joined.
+    """
+    passed = Q(
+        exam_records__passed=True,
+        exam_records__cat1_score__gt=0,
+        exam_records__cat2_score__gt=0,
+        exam_records__end_term_score__gt=0,
+    )
+    if term:
+        passed &= Q(exam_records__term=term)
+    if year:
+        passed &= Q(exam_records__year=year)
+
+    students = Student.objects.select_related('course')
+    if campus:
+        students = students.filter(campus=campus)
+    if course:
+        students = students.filter(course=course)
+
+    return students.annotate(
+        pass_count=Count('exam_records', filter=passed),
+        average=Avg('exam_records__total_average', filter=passed),
+    ).filter(pass_count__gt=0).order_by('-average', 'name')
+
+
+def parse_score(value, maximum):
+    """
+    Convert a submitted score to a Decimal, or None if it is out of range.
+
+    Blank or non-numeric input counts as 0, like the marks forms always did.
+    """
+    try:
+        score = Decimal(str(value).strip()) if value not in (None, '') else Decimal('0')
+    except InvalidOperation:
+        score = Decimal('0')
+    if not score.is_finite() or score < 0 or score > maximum:
+        return None
+    return score.quantize(Decimal('0.01'))
+
+
+def get_unit_marks(student, year, term):
+    """
+    Marks already entered for a student's course units in a year/term.
+
+    Returns (unit_marks, available_units) as used by the marks entry
+    templates, using one query for the units and one for the records.
+    """
+    units = list(Unit.objects.filter(course=student.course))
+    records = {
+        record.unit_id: record
+        for record in ExamRecord.objects.filter(student=student, year=year, term=term, unit__in=units)
+    }
+    unit_marks = []
+    available_units = []
+    for unit in units:
+        record = records.get(unit.id)
+        if record:
+            unit_marks.append({
+                'unit': unit,
+                'cat1': record.cat1_score,
+                'cat2': record.cat2_score,
+                'endterm': record.end_term_score,
+                'has_record': True,
+            })
+        else:
+            available_units.append(unit)
+    return unit_marks, available_units
+
+
+def get_class_marks(course_id, unit_id, term, year):
+    """
+    Marks already entered for one unit and sitting by the students of a
+    course, keyed by student id, in one query. Students without marks
+    are simply absent.
+    """
+    records = ExamRecord.objects.filter(
+        student__course_id=course_id,
+        unit_id=unit_id,
+        term=term,
+        year=year
+    ).values_list('student_id', 'cat1_score', 'cat2_score', 'end_term_score')
+    return {
+        student_id: {
+            'cat1_score': float(cat1) if cat1 else '',
+            'cat2_score': float(cat2) if cat2 else '',
+            'end_term_score': float(end_term) if end_term else '',
+        }
+        for student_id, cat1, cat2, end_term in records
+    }
+
+
+def assign_sort_names(records):
+    """
+    Set the student_name, unit_name and course_name copies on unsaved
+    ExamRecords, as bulk_create needs (it bypasses save()). Students and
+    units not already loaded on the records are read with one query each.
+    """
+    student_ids = {record.student_id for record in records if 'student' not in record._state.fields_cache}
+    unit_ids = {
+        record.unit_id for record in records
+        if 'unit' not in record._state.fields_cache or 'course' not in record.unit._state.fields_cache
+    }
+    student_names = dict(Student.objects.filter(id__in=student_ids).values_list('id', 'name')) if student_ids else {}
+    unit_names = {
+        unit_id: (name, course_name)
+        for unit_id, name, course_name in Unit.objects.filter(id__in=unit_ids).values_list('id', 'name', 'course__name')
+    } if unit_ids else {}
+    for record in records:
+        record.student_name = student_names[record.student_id] if record.student_id in student_ids else record.student.name
+        record.unit_name, record.course_name = (
+            unit_names[record.unit_id] if record.unit_id in unit_ids else (record.unit.name, record.unit.course.name)
+        )
+
+
+def save_records(records):
+    """
+    Insert or update ExamRecords on their (student, unit, term, year) key.
+
+    Runs as one upsert statement (batched by Django if needed). Averages
+    must already be calculated; grades and sort names are assigned here.
+    No signals are sent, so the campuses' data versions are bumped here.
+    """
+    assign_grades(records)
+    assign_sort_names(records)
+    ExamRecord.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=['student', 'unit', 'term', 'year'],
+        update_fields=ExamRecord.SCORE_FIELDS + [
+            'cat_average', 'total_average', 'grade', 'passed', 'campus', 'student_name', 'unit_name', 'course_name',
+            'updated_at',
+        ],
+    )
+    touch_campus_data(*{record.campus_id for record in records})
+
+
+def upsert_marks(student, year, term, rows):
+    """
+    Save a student's marks for several units in one transaction.
+
+    Each row is a dict with `unit_id` (a Unit id, or 'other' together
+    with `unit_name` to add a unit to the student's course), `cat1`,
+    `cat2` and `endterm`. A unit id outside the student's course is
+    invalid. Units are resolved in one query, existing scores read in
+    another, all changed records written with a single upsert on the
+    (student, unit, term, year) key and the dashboard counters adjusted
+    with one UPDATE. That is four statements however many rows (plus
+    the grading schemes' version check on a request's first lookup),
+    and two more when units are added.
+
+    Returns one dict per input row with the resolved `unit` (or None)
+    and a `status` of CREATED, UPDATED, UNCHANGED or INVALID.
+    """
+    year = int(year)
+    results = []
+    unit_ids = set()
+    new_unit_names = set()
+    for row in rows:
+        result = {
+            'unit': None,
+            'status': None,
+            'scores': (
+                parse_score(row.get('cat1'), MAX_CAT_SCORE),
+                parse_score(row.get('cat2'), MAX_CAT_SCORE),
+                parse_score(row.get('endterm'), MAX_END_TERM_SCORE),
+            ),
+        }
+        unit_id = str(row.get('unit_id') or '').strip()
+        unit_name = (row.get('unit_name') or '').strip()
+        if unit_id == 'other' and unit_name:
+            result['unit_name'] = unit_name
+            new_unit_names.add(unit_name)
+        elif unit_id.isdigit():
+            result['unit_id'] = int(unit_id)
+            unit_ids.add(int(unit_id))
+        if None in result['scores'] or not ('unit_id' in result or 'unit_name' in result):
+            result['status'] = INVALID
+        results.append(result)
+
+    with transaction.atomic():
+        # Only the student's own course's units: any other id is reported as invalid
+        units = Unit.objects.filter(course_id=student.course_id, id__in=unit_ids)
+        if new_unit_names:
+            units = units | Unit.objects.filter(course_id=student.course_id, name__in=new_unit_names)
+        units = list(units.select_related('course'))
+        units_by_id = {unit.id: unit for unit in units}
+        units_by_name = {unit.name: unit for unit in units}
+
+        missing_names = [name for name in new_unit_names if name not in units_by_name]
+        if missing_names:
+            Unit.objects.bulk_create(
+                [Unit(name=name, course_id=student.course_id) for name in missing_names],
+                ignore_conflicts=True,
+            )
+            for unit in Unit.objects.filter(course_id=student.course_id, name__in=missing_names):
+                units_by_name[unit.name] = unit
+
+        # Later rows for the same unit win, as they did with per-row saves
+        pending = {}
+        for result in results:
+            if 'unit_name' in result:
+                result['unit'] = units_by_name.get(result['unit_name'])
+            elif 'unit_id' in result:
+                result['unit'] = units_by_id.get(result['unit_id'])
+            if result['unit'] is None:
+                result['status'] = INVALID
+            if result['status'] != INVALID:
+                pending[result['unit'].id] = result
+
+        existing = {
+            values[0]: tuple(values[1:])
+            for values in ExamRecord.objects.filter(
+                student=student, year=year, term=term, unit_id__in=pending,
+            ).order_by().values_list('unit_id', *ExamRecord.SCORE_FIELDS)
+        }
+        to_write = []
+        for unit_id, result in pending.items():
+            if unit_id not in existing:
+                result['status'] = CREATED
+            elif existing[unit_id] == result['scores']:
+                result['status'] = UNCHANGED
+                continue
+            else:
+                result['status'] = UPDATED
+            cat1, cat2, end_term = result['scores']
+            record = ExamRecord(
+                student=student,
+                campus_id=student.campus_id,
+                unit=result['unit'],
+                year=year,
+                term=term,
+                cat1_score=cat1,
+                cat2_score=cat2,
+                end_term_score=end_term,
+            )
+            record.calculate_averages()
+            to_write.append(record)
+
+        if to_write:
+            save_records(to_write)
+            # bulk_create sends no signals, so count the new records here
+            created = sum(result['status'] == CREATED for result in pending.values())
+            adjust_counters(student.campus_id, records=created)
+            if created:
+                touch_catalog(student.campus_id)
+
+    # Rows superseded by a later row for the same unit share its outcome
+    for result in results:
+        if result['status'] is None:
+            result['status'] = pending[result['unit'].id]['status']
+    return [{'unit': result['unit'], 'status': result['status']} for result in results]
@@ -0,0 +1,75 @@
+"""
+Per-campus data stamps for conditional GETs of the campus list pages.
+
+Every page that lists a campus's students, units, courses or exam
+records depends on that campus's data version (see exams.versions).
+Saving or deleting a school, course, unit, student or exam record bumps
+the version of its campus (and of its old campus when it moved) once
+the transaction commits. Bulk writes, which send no signals, call
+touch_campus_data() themselves.
+
+The version for "every campus", used by superusers with no campus
+selected, is bumped by every change.
+"""
+import os
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from .models import Course, ExamRecord, School, Student, Unit
+from .versions import bump_on_commit, campus_ids_of, get_version
+
+
+def _version_key(campus_id):
+    return f"exams:data:version:{campus_id or 'all'}"
+
+
+def data_version(campus_id):
+    """The data version of a campus (None: every campus)."""
+    return get_version(_version_key(campus_id))
+
+
+def touch_campus_data(*campus_ids):
+    """Bump the data versions of `campus_ids`, and the every-campus one, once the transaction commits."""
+    bump_on_commit(_version_key(campus_id) for campus_id in {*campus_ids, None})
+
+
+_release = {'stamp': None}
+
+
+def release_stamp():
+    """
+    The newest modification time of the app's code and templates, read
+    once per process: a deploy changes the pages without touching the data.
+    """
+    if _release['stamp'] is None:
+        roots = [os.path.dirname(__file__)] + [str(path) for path in settings.TEMPLATES[0].get('DIRS', ())]
+        newest = 0
+        for root in roots:
+            for directory, subdirectories, files in os.walk(root):
+                for name in files:
+                    if name.endswith(('.py', '.html')):
+                        newest = max(newest, os.stat(os.path.join(directory, name)).st_mtime_ns)
+        _release['stamp'] = newest
+    return _release['stamp']
+
+
+def data_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_campus_data(*campus_ids_of(instance))
+
+
+def find_data_campuses(sender, instance, **kwargs):
+    # A cascade may delete the course or school before post_delete runs
+    instance._data_campus_ids = campus_ids_of(instance)
+
+
+def data_deleted(sender, instance, **kwargs):
+    touch_campus_data(*getattr(instance, '_data_campus_ids', ()))
+
+
+# Connected per model, like the dashboard counters, so unrelated rows can still be fast-deleted
+for model in (School, Course, Unit, Student, ExamRecord):
+    post_save.connect(data_saved, sender=model, dispatch_uid=f'exams_data_saved_{model.__name__}')
+    pre_delete.connect(find_data_campuses, sender=model, dispatch_uid=f'exams_data_deleting_{model.__name__}')
+    post_delete.connect(data_deleted, sender=model, dispatch_uid=f'exams_data_deleted_{model.__name__}')
@@ -0,0 +1,105 @@
+/*
+ * On-demand options for <select data-autocomplete-url="...">.
+ *
+ * The select renders with only its current choice. A search box above it
+ * asks the JSON endpoint for a page of matches ({results: [{id, text}],
+ * more}) as the user types, or when the select is first focused; a
+ * "Load more" option fetches the next page. data-autocomplete-forward
+ * ("course=course,student=id_student") sends other fields' values along,
+ * and clears the choice when one of them changes.
+ */
+(function () {
+    const MORE = '__more__';
+
+    function setup(select) {
+        const search = document.createElement('input');
+        search.type = 'search';
+        search.className = 'form-control form-control-sm mb-1';
+        search.placeholder = 'Type a name to search';
+        search.disabled = select.disabled;
+        search.setAttribute('aria-label', 'Search options');
+        select.parentNode.insertBefore(search, select);
+
+        const forwarded = (select.dataset.autocompleteForward || '').split(',').filter(Boolean).map(function (pair) {
+            const [param, id] = pair.split('=');
+            return {param: param, element: document.getElementById(id)};
+        });
+        let page = 1;
+        let loaded = false;
+        let latest = 0;
+        let timer = null;
+        let previous = select.value;
+
+        function resetOptions(keepSelected) {
+            Array.from(select.options).forEach(function (option) {
+                if (option.value !== '' && !(keepSelected && option.selected)) {
+                    option.remove();
+                }
+            });
+        }
+
+        function load(pageNumber) {
+            const query = new URLSearchParams({q: search.value.trim(), page: pageNumber});
+            forwarded.forEach(function (field) {
+                if (field.element && field.element.value) {
+                    query.set(field.param, field.element.value);
+                }
+            });
+            const request = ++latest;
+            fetch(select.dataset.autocompleteUrl + '?' + query, {headers: {'Accept': 'application/json'}})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (request !== latest || !data.results) {
+                        return;  // Superseded by a newer search, or an error
+                    }
+                    if (pageNumber === 1) {
+                        resetOptions(true);
+                    } else {
+                        const more = select.querySelector('option[value="' + MORE + '"]');
+                        if (more) more.remove();
+                    }
+                    data.results.forEach(function (item) {
+                        if (!select.querySelector('option[value="' + item.id + '"]')) {
+                            select.add(new Option(item.text, item.id));
+                        }
+                    });
+                    if (data.more) {
+                        select.add(new Option('Load more…', MORE));
+                    }
+                    page = pageNumber;
+                    loaded = true;
+                });
+        }
+
+        search.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { load(1); }, 250);
+        });
+        select.addEventListener('focus', function () {
+            if (!loaded) load(1);
+        });
+        // Registered before page scripts, so they never see the "Load more" pick
+        select.addEventListener('change', function (event) {
+            if (select.value === MORE) {
+                event.stopImmediatePropagation();
+                select.value = previous;
+                load(page + 1);
+                return;
+            }
+            previous = select.value;
+        });
+        forwarded.forEach(function (field) {
+            if (!field.element) return;
+            field.element.addEventListener('change', function () {
+                resetOptions(false);
+                select.value = '';
+                previous = '';
+                loaded = false;
+            });
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(setup);
+    });
+})();
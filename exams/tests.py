@@ -0,0 +1,774 @@
+import base64
+import io
+import os
+import tempfile
+import tracemalloc
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import FileResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .analytics import class_rankings, course_analytics
+from .autocomplete import search_students
+from .catalog import campus_catalog, campus_version
+from .exports import EXPORT_CHUNK_SIZE, stream_records_csv
+from .jobs import claim_job, purge_finished_jobs, requeue_stale_jobs, run_job, submit_job
+from .grading import SCHEMES_VERSION_KEY, clear_scheme_cache, compiled_schemes, recheck_schemes, schemes_version
+from .imports import ImportFileError, import_marks, import_students
+from .metrics import REGISTRY, render_metrics
+from .middleware import MetricsMiddleware
+from .models import Campus, Course, ExamRecord, GradingScheme, Job, School, Student, Unit
+from .pagination import encode_cursor, paginate_keyset
+from .search import search_q
+from .services import CREATED, INVALID, RECORD_SORT_ORDERINGS, UPDATED, filter_records, get_pass_list, upsert_marks
+from .transcripts import student_transcript
+from .versions import bump_versions
+
+
+@override_settings(RUN_JOBS_INLINE=True)
+class ExamsTestCase(TestCase):
+    """
+    A campus with one course and unit, and a logged-in user who selected
+    it. Jobs run inline and write their files to a temporary directory.
+    """
+
+    def setUp(self):
+        clear_scheme_cache()
+        cache.clear()
+        results_root = tempfile.TemporaryDirectory()
+        self.addCleanup(results_root.cleanup)
+        self.enterContext(override_settings(JOB_RESULTS_ROOT=results_root.name))
+        self.results_root = results_root.name
+        self.campus = Campus.objects.create(name='Test Campus')
+        self.school = School.objects.create(name='Test School', campus=self.campus)
+        self.course = Course.objects.create(name='Nursing', school=self.school)
+        self.unit = Unit.objects.create(name='Anatomy', course=self.course)
+        self.user = User.objects.create_user('clerk', password='pw')
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['campus_id'] = self.campus.id
+        session.save()
+
+    def add_students(self, count, start=0, course=None, unit=None, term='I', year=2025):
+        """`count` students of `course`, each with a passing record for `unit`."""
+        course, unit = course or self.course, unit or self.unit
+        students = []
+        for n in range(start, start + count):
+            student = Student.objects.create(name=f'Student {n:03d}', registration_number=f'REG/{course.id}/{n}', course=course)
+            ExamRecord.objects.create(
+                student=student, unit=unit, term=term, year=year, cat1_score=20, cat2_score=20, end_term_score=50,
+            )
+            students.append(student)
+        return students
+
+    def count_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {})
+        self.assertLess(response.status_code, 400)
+        return len(queries), response
+
+
+class PassListTests(ExamsTestCase):
+    def test_get_pass_list_is_one_query(self):
+        self.add_students(5)
+        with self.assertNumQueries(1):
+            students = list(get_pass_list(campus=self.campus, term='I'))
+            self.assertEqual([student.course.name for student in students], ['Nursing'] * 5)
+
+    def test_view_queries_do_not_grow_with_students(self):
+        url = reverse('exams:pass_list')
+        self.add_students(2)
+        self.client.get(url)
+        few, response = self.count_queries('get', url)
+        self.add_students(20, start=2)
+        cache.clear()
+        self.client.get(url)
+        many, response = self.count_queries('get', url)
+        self.assertEqual(len(response.context['pass_list']), 22)
+        self.assertEqual(few, many)
+
+    def test_plain_visit_downloads_every_term(self):
+        self.add_students(3)
+        response = self.client.get(reverse('exams:pass_list'))
+        self.assertContains(response, '<input type="hidden" name="term" value="">', html=True)
+        self.client.post(reverse('exams:download_pass_list'), {'course_id': 'all', 'term': ''})
+        job = Job.objects.get(kind='pass_list')
+        self.assertIsNone(job.params['term'])
+
+
+class CampusMoveTests(ExamsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_students(2)
+        self.other_campus = Campus.objects.create(name='Other Campus')
+
+    def campuses(self):
+        return set(Student.objects.values_list('campus_id', flat=True)) | set(ExamRecord.objects.values_list('campus_id', flat=True))
+
+    def test_moving_a_school_rekeys_its_students_and_records(self):
+        school = School.objects.get(pk=self.school.pk)
+        school.campus = self.other_campus
+        school.save()
+        self.assertEqual(self.campuses(), {self.other_campus.id})
+
+    def test_moving_a_course_rekeys_its_students_and_records(self):
+        course = Course.objects.get(pk=self.course.pk)
+        course.school = School.objects.create(name='Other School', campus=self.other_campus)
+        course.save()
+        self.assertEqual(self.campuses(), {self.other_campus.id})
+
+    def test_saves_without_a_move_leave_students_and_records_alone(self):
+        school, course = School.objects.get(pk=self.school.pk), Course.objects.get(pk=self.course.pk)
+        school.name, course.school = 'Renamed School', school
+        with CaptureQueriesContext(connection) as queries:
+            school.save()
+            course.save()
+        self.assertFalse([
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('UPDATE "exams_student"', 'UPDATE "exams_examrecord"'))
+        ])
+
+
+class KeysetPaginationTests(ExamsTestCase):
+    def setUp(self):
+        super().setUp()
+        # Three pairs of namesakes, so ties on the sort column straddle pages
+        for n, name in enumerate(['Ann', 'Ann', 'Bob', 'Bob', 'Cy', 'Cy', 'Di']):
+            student = Student.objects.create(name=name, registration_number=f'KS/{n}', course=self.course)
+            ExamRecord.objects.create(student=student, unit=self.unit, cat1_score=20, cat2_score=20, end_term_score=40 + n % 3)
+        self.records = ExamRecord.objects.filter(campus=self.campus)
+
+    def pages(self, sort, per_page=3):
+        """Every page from the first, following next cursors."""
+        ordering = RECORD_SORT_ORDERINGS[sort]
+        pages = [paginate_keyset(self.records, ordering, per_page=per_page)]
+        while pages[-1].has_next:
+            pages.append(paginate_keyset(self.records, ordering, pages[-1].next_cursor, per_page=per_page))
+        return pages
+
+    def test_next_pages_cover_every_row_once_in_order(self):
+        for sort, ordering in RECORD_SORT_ORDERINGS.items():
+            pages = self.pages(sort)
+            self.assertEqual([len(page) for page in pages], [3, 3, 1], sort)
+            self.assertEqual(
+                [record.id for page in pages for record in page],
+                list(self.records.order_by(*ordering).values_list('id', flat=True)),
+                sort,
+            )
+            self.assertFalse(pages[0].has_previous)
+
+    def test_previous_pages_return_the_same_rows(self):
+        pages = self.pages('student__name')
+        back = paginate_keyset(self.records, RECORD_SORT_ORDERINGS['student__name'], pages[2].previous_cursor, per_page=3)
+        self.assertEqual(list(back), list(pages[1]))
+        self.assertTrue(back.has_next)
+        first = paginate_keyset(self.records, RECORD_SORT_ORDERINGS['student__name'], back.previous_cursor, per_page=3)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous)
+
+    def test_bad_cursors_start_from_the_top(self):
+        ordering = RECORD_SORT_ORDERINGS['total_average']
+        first = list(paginate_keyset(self.records, ordering, per_page=3))
+        for cursor in (
+            'not a cursor',
+            base64.urlsafe_b64encode(b'[1, 2]').decode(),
+            encode_cursor('sideways', ['1', '1']),
+            encode_cursor('next', ['1']),
+            encode_cursor('next', ['lots', 'many']),
+        ):
+            self.assertEqual(list(paginate_keyset(self.records, ordering, cursor, per_page=3)), first, cursor)
+        response = self.client.get(reverse('exams:view_records'), {'sort': 'total_average', 'cursor': encode_cursor('next', ['x', 'y'])})
+        self.assertEqual(response.status_code, 200)
+
+    def test_renames_move_records_in_the_sort(self):
+        student = Student.objects.get(registration_number='KS/6')
+        student.name = 'Aaron'
+        student.save()
+        self.assertEqual(self.pages('student__name')[0].object_list[0].student, student)
+        course = Course.objects.get(pk=self.course.pk)
+        course.name = 'Midwifery'
+        course.save()
+        unit = Unit.objects.get(pk=self.unit.pk)
+        unit.name = 'Physiology'
+        unit.save()
+        self.assertEqual(set(self.records.values_list('course_name', 'unit_name')), {('Midwifery', 'Physiology')})
+
+
+class UpsertMarksTests(ExamsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.units = [self.unit] + [Unit.objects.create(name=f'Unit {n:02d}', course=self.course) for n in range(11)]
+        self.student = Student.objects.get(pk=Student.objects.create(
+            name='Ann', registration_number='R1', course=self.course,
+        ).pk)
+
+    def rows(self, units, endterm=50):
+        return [{'unit_id': unit.id, 'cat1': 20, 'cat2': 20, 'endterm': endterm} for unit in units]
+
+    def statements(self, rows):
+        compiled_schemes()
+        with CaptureQueriesContext(connection) as queries:
+            results = upsert_marks(self.student, 2025, 'I', rows)
+        # Leave out the transaction's own SAVEPOINT/RELEASE
+        return [query['sql'] for query in queries.captured_queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))], results
+
+    def test_twelve_units_in_four_statements(self):
+        statements, results = self.statements(self.rows(self.units))
+        self.assertEqual(len(statements), 4, statements)
+        self.assertEqual({result['status'] for result in results}, {CREATED})
+        self.assertEqual(ExamRecord.objects.filter(student=self.student).count(), 12)
+        statements, results = self.statements(self.rows(self.units, endterm=60))
+        self.assertEqual(len(statements), 4, statements)
+        self.assertEqual({result['status'] for result in results}, {UPDATED})
+
+    def test_units_of_other_courses_are_invalid(self):
+        other_school = School.objects.create(name='Other School', campus=Campus.objects.create(name='Other Campus'))
+        foreign_unit = Unit.objects.create(name='Anatomy', course=Course.objects.create(name='Medicine', school=other_school))
+        results = upsert_marks(self.student, 2025, 'I', self.rows([self.unit, foreign_unit]))
+        self.assertEqual([result['status'] for result in results], [CREATED, INVALID])
+        self.assertFalse(ExamRecord.objects.filter(unit=foreign_unit).exists())
+
+
+class MarksImportTests(ExamsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = Student.objects.create(name='Ann', registration_number='IM/1', course=self.course)
+
+    def run_import(self, rows, **options):
+        lines = ['registration_number,unit,cat1,cat2,endterm,term,year'] + [f'IM/1,anatomy,20,20,{end_term},{term},2025' for term, end_term in rows]
+        report = import_marks(io.StringIO('\n'.join(lines) + '\n'), campus=self.campus, batch_size=1, **options)
+        self.assertEqual(report['errors'], [])
+        return {counter: report[counter] for counter in ('created', 'updated', 'unchanged')}
+
+    def test_dry_run_counts_repeats_across_batches_like_an_import(self):
+        rows = [('I', 50), ('I', 60), ('I', 60)]
+        expected = {'created': 1, 'updated': 1, 'unchanged': 1}
+        self.assertEqual(self.run_import(rows, dry_run=True), expected)
+        self.assertFalse(ExamRecord.objects.exists())
+        self.assertEqual(self.run_import(rows), expected)
+        self.assertEqual(ExamRecord.objects.get().end_term_score, 60)
+
+    def test_terms_match_ignoring_case(self):
+        ExamRecord.objects.create(student=self.student, unit=self.unit, term='Term 1', year=2025, cat1_score=20, cat2_score=20, end_term_score=50)
+        self.assertEqual(self.run_import([('term 1', 50), ('TERM 1', 60)]), {'created': 0, 'updated': 1, 'unchanged': 1})
+        self.assertEqual(list(ExamRecord.objects.values_list('term', 'end_term_score')), [('Term 1', 60)])
+
+
+class StudentImportTests(ExamsTestCase):
+    def run_import(self, lines, **options):
+        return import_students(io.StringIO('\n'.join(['Name,Reg No,Course'] + lines) + '\n'), self.campus, batch_size=2, **options)
+
+    def test_new_repeated_and_conflicting_rows(self):
+        Student.objects.create(name='Zed', registration_number='SI/9', course=self.course)
+        report = self.run_import([
+            'Ann,SI/1,nursing',
+            'Bob,SI/2,Nursing',
+            'Ann Again,SI/1,Nursing',
+            'Cy,SI/9,Nursing',
+            'Di,SI/4,Dentistry',
+            ',SI/5,Nursing',
+        ])
+        self.assertEqual({key: report[key] for key in ('rows', 'created', 'existing', 'duplicates', 'conflicts', 'error_count')}, {
+            'rows': 6, 'created': 2, 'existing': 0, 'duplicates': 1, 'conflicts': 1, 'error_count': 4,
+        })
+        self.assertEqual([line for line, message in report['errors']], [4, 5, 6, 7])
+        self.assertIn("course 'Dentistry' does not exist", report['errors'][2][1])
+        self.assertEqual(set(Student.objects.values_list('registration_number', 'campus_id')), {
+            ('SI/1', self.campus.id), ('SI/2', self.campus.id), ('SI/9', self.campus.id),
+        })
+
+    def test_reimport_counts_existing_students(self):
+        lines = ['Ann,SI/1,Nursing', 'Bob,SI/2,Nursing']
+        self.run_import(lines)
+        report = self.run_import(['ann,SI/1,Nursing', 'Bob,SI/2,Nursing', 'Cy,SI/3,Nursing'])
+        self.assertEqual((report['created'], report['existing'], report['error_count']), (1, 2, 0))
+        self.assertEqual(Student.objects.count(), 3)
+
+    def test_dry_run_writes_nothing(self):
+        report = self.run_import(['Ann,SI/1,Nursing', 'Bob,SI/2,Nursing', 'Cy,SI/3,Nursing'], dry_run=True)
+        self.assertEqual(report['created'], 3)
+        self.assertFalse(Student.objects.exists())
+
+    def test_missing_column(self):
+        with self.assertRaisesMessage(ImportFileError, 'Missing column(s): course.'):
+            import_students(io.StringIO('Name,Reg No\nAnn,SI/1\n'), self.campus)
+
+
+class GradingSchemeTests(ExamsTestCase):
+    BANDS = [{'min_score': 0, 'grade': 'F', 'remark': 'Fail'}, {'min_score': 90, 'grade': 'A', 'remark': 'Top'}]
+
+    def setUp(self):
+        super().setUp()
+        self.add_students(1)
+        self.record = ExamRecord.objects.get()
+
+    def grade(self):
+        self.record.refresh_from_db()
+        return self.record.grade, self.record.passed
+
+    def test_moving_a_scheme_regrades_the_records_it_left(self):
+        scheme = GradingScheme.objects.create(name='Strict', course=self.course, bands=self.BANDS, pass_mark=90)
+        self.assertEqual(self.grade(), ('F', False))
+        scheme = GradingScheme.objects.get(pk=scheme.pk)
+        scheme.course = Course.objects.create(name='Medicine', school=self.course.school)
+        scheme.save()
+        self.assertEqual(self.grade(), ('B', True))
+
+    def test_schemes_changed_by_another_process_are_reloaded(self):
+        scheme = GradingScheme.objects.create(name='Strict', course=self.course, bands=self.BANDS, pass_mark=90)
+        self.assertEqual(compiled_schemes()[('course', self.course.id)].pass_mark, 90)
+        # Another process's save: no signal reaches this one, only its version bump
+        GradingScheme.objects.filter(pk=scheme.pk).update(pass_mark=0, updated_at=timezone.now())
+        bump_versions([SCHEMES_VERSION_KEY])
+        self.assertEqual(compiled_schemes()[('course', self.course.id)].pass_mark, 90)
+        recheck_schemes()
+        self.assertEqual(compiled_schemes()[('course', self.course.id)].pass_mark, 0)
+
+    def test_lookups_read_the_version_once_per_request(self):
+        recheck_schemes()
+        with self.assertNumQueries(1):
+            for n in range(3):
+                compiled_schemes()
+        with self.captureOnCommitCallbacks(execute=True):
+            GradingScheme.objects.create(name='Strict', course=self.course, bands=self.BANDS, pass_mark=90)
+        self.assertEqual(compiled_schemes()[('course', self.course.id)].pass_mark, 90)
+
+    def test_deleting_and_adding_a_scheme_moves_the_version(self):
+        # Same count as before: a version taken from the table could miss this
+        old = GradingScheme.objects.create(name='Old', course=self.course, bands=self.BANDS, pass_mark=90)
+        version = schemes_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            old.delete()
+            GradingScheme.objects.create(name='New', campus=self.campus, bands=self.BANDS, pass_mark=0)
+        self.assertNotEqual(schemes_version(), version)
+
+
+class TranscriptTests(ExamsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_unit = Unit.objects.create(name='Biology', course=self.course)
+        self.student = Student.objects.create(name='Ann', registration_number='TR/1', course=self.course)
+        # Totals of 70 and 50 in 2025 term I, 90 in term II
+        for unit, term, end_term in ((self.unit, 'I', 50), (self.other_unit, 'I', 30), (self.unit, 'II', 70)):
+            ExamRecord.objects.create(student=self.student, unit=unit, year=2025, term=term, cat1_score=20, cat2_score=20, end_term_score=end_term)
+
+    def transcript(self):
+        """The student's transcript, and whether building it ran the window query."""
+        student = Student.objects.get(pk=self.student.pk)
+        with CaptureQueriesContext(connection) as queries:
+            transcript = student_transcript(student)
+        return transcript, any(' OVER ' in query['sql'] for query in queries.captured_queries)
+
+    def test_term_and_running_means(self):
+        transcript, built = self.transcript()
+        self.assertEqual([(term['term'], term['mean'], term['running_mean']) for term in transcript['terms']], [('I', 60, 60), ('II', 90, 70)])
+        self.assertEqual([unit['unit'] for unit in transcript['terms'][0]['units']], ['Anatomy', 'Biology'])
+        self.assertEqual(transcript['overall']['mean'], 70)
+
+    def test_cached_until_the_campus_data_changes(self):
+        self.assertTrue(self.transcript()[1])
+        self.assertFalse(self.transcript()[1])
+        unit = Unit.objects.get(pk=self.other_unit.pk)
+        unit.name = 'Zoology'
+        with self.captureOnCommitCallbacks(execute=True):
+            unit.save()
+        transcript, built = self.transcript()
+        self.assertTrue(built)
+        self.assertEqual([unit['unit'] for unit in transcript['terms'][0]['units']], ['Anatomy', 'Zoology'])
+
+    def test_student_changes_rebuild(self):
+        self.transcript()
+        for change in ({'name': 'Anne'}, {'course': Course.objects.create(name='Midwifery', school=self.school)}):
+            student = Student.objects.get(pk=self.student.pk)
+            for field, value in change.items():
+                setattr(student, field, value)
+            with self.captureOnCommitCallbacks(execute=True):
+                student.save()
+            self.assertTrue(self.transcript()[1], change)
+
+
+class CourseAnalyticsTests(ExamsTestCase):
+    def courses(self):
+        with self.assertNumQueries(1):
+            return {course.name: (course.school.name, course.unit_count, course.student_count, course.record_count) for course in course_analytics(self.campus.id)}
+
+    def test_one_query_for_one_course_or_many(self):
+        self.add_students(2)
+        self.assertEqual(self.courses(), {'Nursing': ('Test School', 1, 2, 2)})
+        for n in range(5):
+            course = Course.objects.create(name=f'Course {n}', school=self.school)
+            unit = Unit.objects.create(name=f'Unit {n}', course=course)
+            Unit.objects.create(name=f'Extra {n}', course=course)
+            self.add_students(n, start=10 * (n + 1), course=course, unit=unit)
+        courses = self.courses()
+        self.assertEqual(len(courses), 6)
+        self.assertEqual(courses['Course 3'], ('Test School', 2, 3, 3))
+
+
+class RankingsTests(ExamsTestCase):
+    def test_ties_share_a_position_and_skip_the_next(self):
+        for name, end_term in (('Cy', 40), ('Ann', 50), ('Bob', 50), ('Di', 30)):
+            student = Student.objects.create(name=name, registration_number=f'RK/{name}', course=self.course)
+            ExamRecord.objects.create(student=student, unit=self.unit, cat1_score=20, cat2_score=20, end_term_score=end_term)
+        students = class_rankings(self.course, 'I', 2025)['students']
+        self.assertEqual([(student['name'], student['position']) for student in students], [('Ann', 1), ('Bob', 1), ('Cy', 3), ('Di', 4)])
+        self.assertEqual([student['unit_ranks'] for student in students], [[1], [1], [3], [4]])
+
+    def test_campus_without_records(self):
+        response = self.client.get(reverse('exams:rankings'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['class_stats'])
+        params = {'course_id': self.course.id, 'term': 'I', 'year': 2025}
+        response = self.client.get(reverse('exams:rankings'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['class_stats'])
+        data = self.client.get(reverse('exams:rankings_data'), params).json()
+        self.assertEqual((data['students'], data['units']), ([], []))
+        self.assertEqual(data['summary']['count'], 0)
+
+
+class SearchTests(ExamsTestCase):
+    def test_substring_match(self):
+        student = Student.objects.create(name='Jonathan Smith', registration_number='MIN/01/102/23', course=self.course)
+        for text in ('than sm', 'MIN/01', 'jo'):
+            self.assertEqual(list(Student.objects.filter(search_q('student', text, campus_id=self.campus.id))), [student])
+
+    def test_matches_at_other_campuses_do_not_block_fallback(self):
+        other_school = School.objects.create(name='Other School', campus=Campus.objects.create(name='Other Campus'))
+        other_course = Course.objects.create(name='Medicine', school=other_school)
+        Student.objects.create(name='Jonathan Smyth', registration_number='OTHER/1', course=other_course)
+        here = Student.objects.create(name='Jonathan Smith', registration_number='HERE/1', course=self.course)
+        students = Student.objects.filter(campus=self.campus)
+        self.assertEqual(list(students.filter(search_q('student', 'Jonathan Smyth', campus_id=self.campus.id))), [here])
+        records, filters = filter_records(ExamRecord.objects.filter(campus=self.campus), {'student': 'Jonathan Smyth'}, self.campus.id)
+        self.assertFalse(records.exists())
+
+
+class AutocompleteTests(ExamsTestCase):
+    def test_non_ascii_prefixes(self):
+        # SQLite's UPPER() leaves non-ASCII letters in the case they were typed
+        for number, name in enumerate(('Müller', 'Straße', 'Öberg', 'Mueller')):
+            Student.objects.create(name=name, registration_number=f'R{number}', course=self.course)
+        for query, expected in (('mü', ['Müller']), ('MÜL', []), ('straß', ['Straße']), ('Öb', ['Öberg']), ('mue', ['Mueller'])):
+            results = search_students(self.campus.id, query)['results']
+            self.assertEqual([result['text'].split(' (')[0] for result in results], expected, query)
+
+
+class MetricsTests(ExamsTestCase):
+    def setUp(self):
+        super().setUp()
+        for metric in REGISTRY:
+            metric.clear()
+
+    def sample(self, name, view):
+        """The value of `name` for `view` in the rendered metrics, or None when it has no series."""
+        prefix = f'{name}{{view="{view}"}} '
+        for line in render_metrics().splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return None
+
+    def test_streamed_response_is_measured_when_the_stream_closes(self):
+        self.add_students(3)
+        view = 'exams:export_records_csv'
+        response = self.client.get(reverse(view))
+        self.assertIsNone(self.sample('exams_request_duration_seconds_count', view))
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 4)
+        response.close()
+        self.assertEqual(self.sample('exams_request_duration_seconds_count', view), 1)
+        # The records are read while streaming, and are charged to the request
+        self.assertGreater(self.sample('exams_request_sql_queries_sum', view), 0)
+
+    def test_file_responses_keep_their_file(self):
+        response = MetricsMiddleware(lambda request: FileResponse(io.BytesIO(b'report')))(RequestFactory().get('/'))
+        # Left for wsgi.file_wrapper rather than hidden behind a generator
+        self.assertIsNotNone(response.file_to_stream)
+        self.assertIsNone(self.sample('exams_request_duration_seconds_count', 'unresolved'))
+        response.close()
+        self.assertEqual(self.sample('exams_request_duration_seconds_count', 'unresolved'), 1)
+
+
+class HomeTests(ExamsTestCase):
+    def test_dashboard_reads_only_the_summary(self):
+        self.add_students(3)
+        url = reverse('exams:home')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['total_records'], 3)
+        tables = {table for query in queries.captured_queries for table in ('exams_examrecord', 'exams_student') if table in query['sql']}
+        self.assertEqual(tables, set())
+
+
+class ConditionalPageTests(ExamsTestCase):
+    url = reverse('exams:view_records')
+
+    def setUp(self):
+        super().setUp()
+        self.add_students(3)
+        self.client.get(self.url)  # Sets the CSRF cookie the page's forms embed
+
+    def etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def revalidate(self, etag):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        # Leave out the session and user that every logged-in request loads
+        return response, [query['sql'] for query in queries.captured_queries if not any(
+            table in query['sql'] for table in ('django_session', 'auth_user')
+        )]
+
+    def test_hit_costs_only_the_stamp_lookup(self):
+        response, queries = self.revalidate(self.etag())
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1, queries)
+        self.assertIn('exams_versionstamp', queries[0])
+
+    def test_write_misses(self):
+        etag = self.etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_students(1, start=3)
+        self.assertEqual(self.revalidate(etag)[0].status_code, 200)
+
+    def test_stamps_are_shared_with_other_processes(self):
+        etag = self.etag()
+        # What another process keeps in its own cache is gone; the stamp is in the database
+        cache.clear()
+        self.assertEqual(self.revalidate(etag)[0].status_code, 304)
+        # A management command is another process too
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_dashboard_counters', stdout=io.StringIO())
+        self.assertEqual(self.revalidate(etag)[0].status_code, 200)
+
+
+class CatalogTests(ExamsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_students(1)
+        self.record = ExamRecord.objects.get()
+
+    def edit(self, **changes):
+        data = {'student': self.record.student_id, 'unit': self.record.unit_id, 'cat1_score': 20, 'cat2_score': 20, 'end_term_score': 50}
+        version = campus_version(self.campus.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('exams:update_record', args=[self.record.id]), {**data, **changes})
+        self.assertEqual(response.status_code, 302)
+        return campus_version(self.campus.id) != version
+
+    def test_score_edit_keeps_the_catalog(self):
+        self.assertFalse(self.edit(end_term_score=65))
+        self.assertEqual(ExamRecord.objects.get().end_term_score, 65)
+
+    def test_term_change_moves_the_catalog(self):
+        record = ExamRecord.objects.get()
+        version = campus_version(self.campus.id)
+        record.term = 'II'
+        with self.captureOnCommitCallbacks(execute=True):
+            record.save()
+        self.assertNotEqual(campus_version(self.campus.id), version)
+        self.assertEqual(campus_catalog(self.campus).terms, ['II'])
+
+
+class ExistingMarksTests(ExamsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_students(3)
+        self.url = reverse('exams:get_existing_marks')
+        self.params = {'course_id': self.course.id, 'unit_id': self.unit.id, 'term': 'I', 'year': 2025}
+
+    def etag(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_repeat_request_is_not_modified(self):
+        etag = self.etag()
+        self.assertEqual(self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_editing_a_mark_changes_the_etag(self):
+        etag = self.etag()
+        record = ExamRecord.objects.order_by('id').first()
+        record.end_term_score = 65
+        record.save()
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_deleting_an_older_record_changes_the_etag(self):
+        etag = self.etag()
+        newest = ExamRecord.objects.latest('updated_at')
+        ExamRecord.objects.exclude(pk=newest.pk).order_by('id').first().delete()
+        # Same newest updated_at, one record fewer
+        self.assertEqual(ExamRecord.objects.latest('updated_at'), newest)
+        self.assertNotEqual(self.etag(), etag)
+        self.assertEqual(len(self.client.get(self.url, self.params).json()['existing_marks']), 2)
+
+
+class RosterTests(ExamsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_students(3)
+        self.url = reverse('exams:roster_data') + f'?course_id={self.course.id}'
+
+    def get(self, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, **headers)
+        return response, [query['sql'] for query in queries.captured_queries if not any(
+            table in query['sql'] for table in ('django_session', 'auth_user')
+        )]
+
+    def test_unchanged_roster_costs_only_the_stamp_lookup(self):
+        etag = self.get()[0]['ETag']
+        # Another process's cache knows nothing of this one's
+        cache.clear()
+        response, queries = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1, queries)
+        self.assertIn('exams_versionstamp', queries[0])
+
+    def test_new_student_misses(self):
+        etag = self.get()[0]['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_students(1, start=3)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)[0]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['students']['ids']), 4)
+
+
+class ExportTests(ExamsTestCase):
+    def add_records(self, count, start=0):
+        """`count` exam records over ten units, spread across new students."""
+        units = list(Unit.objects.filter(course=self.course)) or [self.unit]
+        while len(units) < 10:
+            units.append(Unit.objects.create(name=f'Unit {len(units)}', course=self.course))
+        students = Student.objects.bulk_create([
+            Student(name=f'Student {n:05d}', registration_number=f'EXP/{n}', course=self.course, campus=self.campus)
+            for n in range(start // 10, (start + count) // 10)
+        ])
+        records = [
+            ExamRecord(
+                student=student, unit=unit, campus=self.campus, term='I', year=2025,
+                cat1_score=20, cat2_score=25, end_term_score=60, cat_average=Decimal('22.5'), total_average=Decimal('82.5'),
+            )
+            for student in students for unit in units
+        ]
+        ExamRecord.objects.bulk_create(records)
+
+    def peak_streaming_memory(self):
+        """Peak bytes allocated while streaming the campus's export, and its line count."""
+        response = stream_records_csv(ExamRecord.objects.filter(campus=self.campus), 'records.csv')
+        lines = 0
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                lines += 1
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak, lines
+
+    def test_memory_does_not_grow_with_rows(self):
+        self.add_records(2 * EXPORT_CHUNK_SIZE)
+        small_peak, lines = self.peak_streaming_memory()
+        self.assertEqual(lines, 2 * EXPORT_CHUNK_SIZE + 1)
+        self.add_records(8 * EXPORT_CHUNK_SIZE, start=2 * EXPORT_CHUNK_SIZE)
+        large_peak, lines = self.peak_streaming_memory()
+        self.assertEqual(lines, 10 * EXPORT_CHUNK_SIZE + 1)
+        # Five times the rows, held one chunk at a time: about the same peak
+        self.assertLess(large_peak, small_peak * 1.5)
+
+
+@override_settings(RUN_JOBS_INLINE=False)
+class JobTests(ExamsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_students(3)
+
+    def submit(self, kind='pass_list'):
+        return submit_job(kind, {'campus_id': self.campus.id, 'course_id': self.course.id, 'term': 'I'}, campus=self.campus)
+
+    def test_result_is_a_file_served_from_disk(self):
+        job = self.submit()
+        self.assertEqual(job.status, Job.QUEUED)
+        run_job(claim_job('worker-1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE, job.error)
+        self.assertTrue(os.path.isfile(os.path.join(self.results_root, job.result.name)))
+        response = self.client.get(reverse('exams:job_download', kwargs={'job_id': job.id}))
+        self.assertIsInstance(response, FileResponse)
+        self.assertIn('pass_list.docx', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+        response.close()
+        Job.objects.filter(id=job.id).update(finished_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge_finished_jobs(86400), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.results_root, job.result.name)))
+
+    def test_course_reports_are_streamed_to_the_file(self):
+        job = submit_job('course_reports', {'course_id': self.course.id, 'year': 2025, 'term': 'I'}, campus=self.campus)
+        run_job(claim_job('worker-1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE, job.error)
+        with job.result.open('rb') as result:
+            self.assertEqual(len(zipfile.ZipFile(result).namelist()), 3)
+
+    def test_progress_report_is_queued(self):
+        student = Student.objects.first()
+        response = self.client.post(reverse('exams:download_report'), {'student_id': student.id, 'year': 2025, 'term': 'I'})
+        job = Job.objects.get(kind='progress_report')
+        self.assertRedirects(response, reverse('exams:job_detail', kwargs={'job_id': job.id}))
+        self.assertEqual(job.status, Job.QUEUED)
+        run_job(claim_job('worker-1'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result_name), (Job.DONE, 'Progress_Report_Student_000_2025_TI.docx'))
+
+    def test_progress_report_from_filters(self):
+        self.client.get(reverse('exams:download_report'), {'student': 'Student 001', 'year': 2025})
+        run_job(claim_job('worker-1'))
+        job = Job.objects.get(kind='progress_report')
+        self.assertEqual((job.status, job.result_name), (Job.DONE, 'Progress_Report_Student_001_2025_TI.docx'), job.error)
+
+    @override_settings(RUN_JOBS_INLINE=True)
+    def test_inline_by_setting(self):
+        self.assertEqual(self.submit().status, Job.DONE)
+
+    def test_course_without_a_school(self):
+        course = Course.objects.create(name='Orphaned', school=None)
+        self.add_students(2, course=course, unit=Unit.objects.create(name='Ethics', course=course))
+        job = submit_job('course_reports', {'course_id': course.id, 'year': 2025, 'term': 'I'})
+        run_job(claim_job('worker-1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE, job.error)
+
+    def test_only_jobs_without_a_heartbeat_are_requeued(self):
+        alive, dead = self.submit(), self.submit()
+        for job in (alive, dead):
+            claim_job('worker-1')
+        long_ago = timezone.now() - timedelta(seconds=1000)
+        Job.objects.filter(id=alive.id).update(started_at=long_ago)
+        Job.objects.filter(id=dead.id).update(started_at=long_ago, heartbeat_at=long_ago)
+        self.assertEqual(requeue_stale_jobs(600), (1, 0))
+        self.assertEqual(Job.objects.get(id=alive.id).status, Job.RUNNING)
+        self.assertEqual(Job.objects.get(id=dead.id).status, Job.QUEUED)
+
+    def test_a_job_taken_over_is_not_finished_twice(self):
+        self.submit()
+        first = claim_job('worker-1')
+        # worker-1 went quiet, so its job was requeued and claimed again
+        Job.objects.filter(id=first.id).update(status=Job.QUEUED, worker='')
+        second = claim_job('worker-2')
+        run_job(first)
+        job = Job.objects.get(id=first.id)
+        self.assertEqual((job.status, job.worker, job.result.name), (Job.RUNNING, 'worker-2', ''))
+        self.assertEqual([files for _, _, files in os.walk(self.results_root) if files], [])
+        run_job(second)
+        self.assertEqual(Job.objects.get(id=first.id).status, Job.DONE)
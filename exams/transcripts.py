@@ -0,0 +1,93 @@
+"""
+Cumulative transcripts: every term a student has sat, with term and
+running means.
+
+All of a student's records come back in one query, with each term's mean
+and the running (cumulative) mean worked out by window functions in the
+database. The result is cached per student in Django's cache, stamped
+with the campus data version (see exams.stamps), the record count, the
+newest record change and the grading scheme in force. Any save, upsert,
+import or delete of one of the student's records changes the stamp,
+bulk writes that send no signals included, and so does renaming a unit
+or moving the student to another course, which leave the records alone.
+A stale transcript is never served.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Max, Window
+
+from .grading import scheme_for
+from .models import ExamRecord
+from .stamps import data_version
+
+
+def _cache_key(student_id):
+    return f'exams:transcript:{student_id}'
+
+
+def _stamp(student, scheme):
+    """What the cached transcript must have been built from to still be current."""
+    latest = ExamRecord.objects.filter(student_id=student.id).aggregate(count=Count('id'), updated=Max('updated_at'))
+    return data_version(student.campus_id), latest['count'], latest['updated'], scheme.scheme_id, scheme.updated_at
+
+
+def build_transcript(student, scheme):
+    """
+    A student's terms in order, as plain data: each term's units with
+    their marks, grade and remark, the term mean and the running mean
+    over every unit sat so far.
+    """
+    term_order = [F('year').asc(), F('term').asc()]
+    rows = ExamRecord.objects.filter(student_id=student.id).order_by('year', 'term', 'unit__name').values_list(
+        'year', 'term', 'unit__name', 'cat_average', 'end_term_score', 'total_average',
+        # Default frame with an ORDER BY runs to the end of the current term's rows
+        Window(Avg('total_average'), partition_by=[F('year'), F('term')]),
+        Window(Avg('total_average'), order_by=term_order),
+    )
+
+    terms = []
+    for year, term, unit_name, cat_average, end_term, total, term_mean, running_mean in rows:
+        if not terms or (terms[-1]['year'], terms[-1]['term']) != (year, term):
+            terms.append({
+                'year': year,
+                'term': term,
+                'units': [],
+                'mean': round(float(term_mean), 2),
+                'running_mean': round(float(running_mean), 2),
+            })
+        terms[-1]['units'].append({
+            'unit': unit_name,
+            'cat': round(float(cat_average), 2),
+            'end_term': round(float(end_term), 2),
+            'total': round(float(total), 2),
+        })
+
+    totals = []
+    for term in terms:
+        bands = scheme.grade_scores([unit['total'] for unit in term['units']])
+        for unit, band in zip(term['units'], bands):
+            unit['grade'], unit['remark'], unit['passed'] = band.grade, band.remark, band.passed
+            totals.append(unit['total'])
+        band = scheme.band(term['mean'])
+        term['grade'], term['remark'] = band.grade, band.remark
+        term['units_passed'] = sum(unit['passed'] for unit in term['units'])
+
+    overall = {'units': len(totals), 'units_passed': sum(term['units_passed'] for term in terms), 'mean': None}
+    if totals:
+        # The last running mean already covers every unit
+        overall['mean'] = terms[-1]['running_mean']
+        band = scheme.band(overall['mean'])
+        overall['grade'], overall['remark'] = band.grade, band.remark
+    return {'terms': terms, 'overall': overall, 'legend': scheme.legend()}
+
+
+def student_transcript(student):
+    """The cumulative transcript of `student`, from the cache when it is still current."""
+    scheme = scheme_for(student.campus_id, student.course_id)
+    stamp = _stamp(student, scheme)
+    cached = cache.get(_cache_key(student.id))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    transcript = build_transcript(student, scheme)
+    cache.set(_cache_key(student.id), (stamp, transcript), settings.TRANSCRIPT_CACHE_TIMEOUT)
+    return transcript
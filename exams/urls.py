@@ -9,19 +9,35 @@ urlpatterns = [
     path('home/', home, name='home'),
     path('enter-marks/', views.enter_marks, name='enter_marks'),
     path('view-records/', views.view_records, name='view_records'),
+    path('view-records/export/', views.export_records_csv, name='export_records_csv'),
     path('update-record/<int:record_id>/', views.update_record, name='update_record'),
     path('delete-record/<int:record_id>/', views.delete_record, name='delete_record'),
     path('manage-courses/', views.manage_courses, name='manage_courses'),
     path('manage-units/', views.manage_units, name='manage_units'),
     path('manage-students/', views.manage_students, name='manage_students'),
+    path('import-students/', views.import_students_csv, name='import_students'),
     path('generate-report/', views.generate_report, name='generate_report'),
     path('download-report/', views.download_report, name='download_report'),
+    path('download-course-reports/', views.download_course_reports, name='download_course_reports'),
+    path('transcript/', views.transcript, name='transcript'),
+    path('transcript/download/', views.download_transcript, name='download_transcript'),
     path('pass-list/', views.pass_list, name='pass_list'),
     path('download-pass-list/', views.download_pass_list, name='download_pass_list'),
+    path('rankings/', views.rankings, name='rankings'),
+    path('rankings/data/', views.rankings_data, name='rankings_data'),
     path('records/download/', views.download_records_word, name='download_records_word'),
+    path('jobs/<int:job_id>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:job_id>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:job_id>/download/', views.job_download, name='job_download'),
     path('update-student/<int:student_id>/', views.update_student, name='update_student'),
     path('enter-marks-per-student/', views.enter_marks_per_student, name='enter_marks_per_student'),
     path('enter-marks-spreadsheet/', views.enter_marks_spreadsheet, name='enter_marks_spreadsheet'),
+    path('import-marks/', views.import_marks_csv, name='import_marks'),
     path('manage-campus-passwords/', views.manage_campus_passwords, name='manage_campus_passwords'),
+    path('metrics/', views.metrics, name='metrics'),
     path('get-existing-marks/', views.get_existing_marks, name='get_existing_marks'),
+    path('course-roster/', views.roster_data, name='roster_data'),
+    path('autocomplete/students/', views.autocomplete_students, name='autocomplete_students'),
+    path('autocomplete/units/', views.autocomplete_units, name='autocomplete_units'),
+    path('autocomplete/courses/', views.autocomplete_courses, name='autocomplete_courses'),
 ]
@@ -0,0 +1,60 @@
+"""
+Version counters kept in the VersionStamp table.
+
+Cached data (campus catalogs, course rosters) is stored under a key that
+includes a version, and conditional GETs build their ETags from one.
+Changing the data bumps the version, so readers build and cache a fresh
+copy and the stale one simply expires; nothing has to find and delete
+old entries. The counters live in the database rather than in Django's
+cache, which is per process by default, so every web worker, job worker
+and management command reads and bumps the same ones. Reading a version
+is one primary-key lookup.
+
+The per-campus versions (catalogs, data stamps) share campus_ids_of()
+to find the campuses a saved or deleted row belongs to.
+"""
+import time
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Course, ExamRecord, School, Student, VersionStamp
+
+
+def get_version(key):
+    """The current version stored under `key`."""
+    try:
+        return VersionStamp.objects.values_list('version', flat=True).get(key=key)
+    except VersionStamp.DoesNotExist:
+        # Start from a fresh number, so a counter lost with its row never
+        # comes back to the version of an entry still cached
+        stamp, created = VersionStamp.objects.get_or_create(key=key, defaults={'version': time.time_ns()})
+        return stamp.version
+
+
+def bump_versions(keys):
+    """Move every counter in `keys` to a new version now, in one UPDATE."""
+    # No row yet: the next read starts a fresh counter
+    VersionStamp.objects.filter(key__in=set(keys)).update(version=F('version') + 1)
+
+
+def bump_on_commit(keys):
+    """Bump `keys` once the current transaction commits."""
+    # After the commit, or a reader could cache the old data under the new
+    # version; outside the writer's transaction, so no two writers queue on
+    # the shared every-campus counters
+    transaction.on_commit(partial(bump_versions, list(keys)))
+
+
+def campus_ids_of(instance):
+    """
+    Campus ids whose pages list `instance`, a school, course, unit,
+    student or exam record: its campus, and the one it moved from.
+    """
+    if isinstance(instance, (School, Student, ExamRecord)):
+        return {instance.campus_id, getattr(instance, '_loaded_campus_id', instance.campus_id)}
+    if isinstance(instance, Course):
+        school_ids = {instance.school_id, getattr(instance, '_loaded_school_id', instance.school_id)}
+        return set(School.objects.filter(id__in=school_ids - {None}).values_list('campus_id', flat=True))
+    return set(Course.objects.filter(id=instance.course_id).values_list('school__campus_id', flat=True))
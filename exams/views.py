@@ -5,24 +5,46 @@ from django.contrib.auth.decorators import login_required
 from django.db import IntegrityError
 from django.contrib.auth.decorators import user_passes_test
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Count, Max
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from django.utils.http import urlencode
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
 from django.core.mail import send_mail
 from django.conf import settings
-from .models import Course, Unit, Student, ExamRecord, Campus, CampusPassword, School
+from .models import Course, Unit, Student, ExamRecord, Campus, CampusPassword, School, Job
 from .forms import ExamRecordForm, CourseForm, UnitForm, StudentForm
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from .analytics import class_rankings, course_analytics, unit_analytics
+from .autocomplete import search_courses, search_students, search_units
+from .catalog import campus_catalog
+from .reports import DOCX_CONTENT_TYPE, render_transcript
+from .dashboard import campus_summary, total_summary
+from .exports import stream_records_csv
+from .grading import scheme_for
+from .imports import ImportFileError, import_marks, import_students
+from .jobs import job_label, submit_job
+from .metrics import docx_render, render_metrics
+from .pagination import capped_count, paginate_keyset
+from .rosters import course_roster, roster_version
+from .stamps import data_version, release_stamp
+from .transcripts import student_transcript
+from .services import (
+    INVALID, RECORD_SORT_ORDERINGS, filter_records, get_class_marks, get_pass_list, get_unit_marks, upsert_marks,
+)
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 from docx.oxml import parse_xml
 from docx.oxml.ns import nsdecls
 from datetime import datetime
+import hashlib
 import json
-import io
+import logging
+
+
+logger = logging.getLogger(__name__)
 
 
 def is_superuser(user):
@@ -103,65 +125,71 @@ def manage_campus_passwords(request):
     return render(request, 'exams/manage_campus_passwords.html', context)
 
 
-def get_current_campus(request):
-    campus_id = request.session.get('campus_id')
-    if campus_id:
-        return Campus.objects.get(id=campus_id)
-    return None 
+@login_required
+@user_passes_test(is_superuser)
+def metrics(request):
+    """Request and rendering histograms for this process, in Prometheus text format."""
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 
+def campus_page_etag(request, *args, **kwargs):
+    """
+    An ETag for a campus list page: its campus's data version, plus what
+    else the page depends on (the user, the CSRF cookie its forms embed,
+    the query string and the deployed code). Costs one primary-key
+    lookup on a hit.
+    """
+    if request.method not in ('GET', 'HEAD') or (not request.campus and not request.user.is_superuser):
+        return None
+    if len(messages.get_messages(request)):
+        return None  # The page would show the messages; render it
+    campus_id = request.campus.id if request.campus else None
+    parts = [
+        request.resolver_match.view_name, campus_id, data_version(campus_id), release_stamp(),
+        request.user.pk, request.user.is_superuser, request.META.get('CSRF_COOKIE'),
+        sorted(request.GET.lists()),
+    ]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
 
+
+# Revalidated on every visit, answered with 304 while the campus's data is unchanged
+def conditional_page(view):
+    return cache_control(private=True, no_cache=True)(condition(etag_func=campus_page_etag)(view))
+
+
+@conditional_page
 def home(request):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
-    # Get counts for dashboard - respect campus selection for both superusers and regular users
+    # Dashboard counters are kept per campus - respect campus selection for both superusers and regular users
     if current_campus:
-        total_students = Student.objects.filter(course__school__campus=current_campus).count()
-        total_units = Unit.objects.filter(course__school__campus=current_campus).count()
-        total_records = ExamRecord.objects.filter(student__course__school__campus=current_campus).count()
-        total_courses = Course.objects.filter(school__campus=current_campus).count()
-        recent_records = ExamRecord.objects.select_related('student', 'unit').filter(student__course__school__campus=current_campus).order_by('-id')[:5]
+        summary = campus_summary(current_campus.id)
     else:
         # If no campus is selected and user is superuser, show all records
         if request.user.is_superuser:
-            total_students = Student.objects.count()
-            total_units = Unit.objects.count()
-            total_records = ExamRecord.objects.count()
-            total_courses = Course.objects.count()
-            recent_records = ExamRecord.objects.select_related('student', 'unit').order_by('-id')[:5]
+            summary = total_summary()
         else:
             # Regular users must have a campus selected
             return redirect('exams:campus_select')
     
     context = {
-        'total_students': total_students,
-        'total_units': total_units,
-        'total_records': total_records,
-        'total_courses': total_courses,
-        'recent_records': recent_records,
+        'total_students': summary.students,
+        'total_units': summary.units,
+        'total_records': summary.records,
+        'total_courses': summary.courses,
+        'last_activity': summary.last_activity,
         'current_campus': current_campus,
     }
     return render(request, 'exams/home.html', context)
 
 
 def enter_marks(request):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
-    if current_campus:
-        students = Student.objects.filter(course__school__campus=current_campus)
-        courses = Course.objects.filter(school__campus=current_campus)
-        units = Unit.objects.filter(course__school__campus=current_campus)
-        schools = School.objects.filter(campus=current_campus)
-    else:
-        if request.user.is_superuser:
-            students = Student.objects.all()
-            courses = Course.objects.all()
-            units = Unit.objects.all()
-            schools = School.objects.all()
-        else:
-            return redirect('exams:campus_select')
+    catalog = campus_catalog(current_campus)
     years = [2025, 2024, 2023, 2022, 2021]
     terms = ['Term 1', 'Term 2', 'Term 3', 'Term 4']
     selected_student = None
@@ -177,20 +205,7 @@ def enter_marks(request):
         selected_student = get_object_or_404(Student, id=student_id)
         selected_year = year
         selected_term = term
-        all_units = list(Unit.objects.filter(course=selected_student.course))
-        entered_units = []
-        for unit in all_units:
-            rec = ExamRecord.objects.filter(student=selected_student, unit=unit, year=year, term=term).first()
-            if rec:
-                unit_marks.append({
-                    'unit': unit,
-                    'cat1': rec.cat1_score,
-                    'cat2': rec.cat2_score,
-                    'endterm': rec.end_term_score,
-                    'has_record': True,
-                })
-                entered_units.append(unit.id)
-        available_units = [u for u in all_units if u.id not in entered_units]
+        unit_marks, available_units = get_unit_marks(selected_student, year, term)
     elif request.method == 'POST' and 'save_marks' in request.POST:
         student_id = request.POST.get('student_id')
         year = request.POST.get('year')
@@ -198,64 +213,12 @@ def enter_marks(request):
         selected_student = get_object_or_404(Student, id=student_id)
         selected_year = year
         selected_term = term
-        school = request.POST.get('school')
-        level = request.POST.get('level')
-        i = 1
-        entered_units = []
-        while True:
-            unit_id = request.POST.get(f'unit_id_{i}')
-            unit_name = request.POST.get(f'unit_name_{i}', '').strip()
-            if not unit_id:
-                break
-            cat1 = request.POST.get(f'cat1_{i}')
-            cat2 = request.POST.get(f'cat2_{i}')
-            endterm = request.POST.get(f'endterm_{i}')
-            cat1_val = safe_decimal(cat1)
-            cat2_val = safe_decimal(cat2)
-            endterm_val = safe_decimal(endterm)
-            if unit_id == 'other' and unit_name:
-                unit, _ = Unit.objects.get_or_create(
-                    name=unit_name,
-                    course=selected_student.course
-                )
-            else:
-                unit = Unit.objects.get(id=unit_id)
-            record, _ = ExamRecord.objects.get_or_create(
-                student=selected_student,
-                unit=unit,
-                year=year,
-                term=term,
-                defaults={
-                    'cat1_score': cat1_val,
-                    'cat2_score': cat2_val,
-                    'end_term_score': endterm_val,
-                }
-            )
-            record.cat1_score = cat1_val
-            record.cat2_score = cat2_val
-            record.end_term_score = endterm_val
-            record.save()
-            entered_units.append(unit.id)
-            i += 1
-        message = 'Marks saved successfully!'
-        unit_marks = []
-        all_units = list(Unit.objects.filter(course=selected_student.course))
-        for unit in all_units:
-            rec = ExamRecord.objects.filter(student=selected_student, unit=unit, year=year, term=term).first()
-            if rec:
-                unit_marks.append({
-                    'unit': unit,
-                    'cat1': rec.cat1_score,
-                    'cat2': rec.cat2_score,
-                    'endterm': rec.end_term_score,
-                    'has_record': True,
-                })
-        available_units = [u for u in all_units if u.id not in entered_units]
+        results = upsert_marks(selected_student, year, term, collect_unit_rows(request.POST))
+        message = marks_saved_message(results)
+        unit_marks, available_units = get_unit_marks(selected_student, year, term)
     context = {
-        'students': students,
-        'courses': courses,
-        'units': units,
-        'schools': schools,
+        'schools': catalog.schools,
+        'summary': campus_summary(current_campus.id) if current_campus else total_summary(),
         'years': years,
         'terms': terms,
         'selected_student': selected_student,
@@ -264,11 +227,49 @@ def enter_marks(request):
         'unit_marks': unit_marks,
         'available_units': available_units,
         'message': message,
+        # The course is picked on the page, so the campus's scheme is the best guess
+        'grade_bands': scheme_for(current_campus.id if current_campus else None).client_bands(),
         'current_campus': current_campus,
     }
     return render(request, 'exams/enter_marks.html', context)
 
 
+def existing_marks_stamp(request):
+    """
+    (record count, latest updated_at) for the course/unit/term/year asked for.
+
+    Shared by the ETag and Last-Modified checks of get_existing_marks and
+    computed once per request.
+    """
+    if not hasattr(request, '_existing_marks_stamp'):
+        stamp = None
+        params = [request.GET.get(key) for key in ('course_id', 'unit_id', 'term', 'year')]
+        if request.method == 'GET' and all(params):
+            course_id, unit_id, term, year = params
+            try:
+                stamp = ExamRecord.objects.filter(
+                    student__course_id=course_id, unit_id=unit_id, term=term, year=year,
+                ).aggregate(count=Count('id'), last_modified=Max('updated_at'))
+            except (ValueError, TypeError):
+                stamp = None
+        request._existing_marks_stamp = stamp
+    return request._existing_marks_stamp
+
+
+def existing_marks_etag(request):
+    stamp = existing_marks_stamp(request)
+    if stamp is None:
+        return None
+    last_modified = stamp['last_modified'].timestamp() if stamp['last_modified'] else 0
+    return f"{stamp['count']}-{last_modified}"
+
+
+def existing_marks_last_modified(request):
+    stamp = existing_marks_stamp(request)
+    return stamp['last_modified'] if stamp else None
+
+
+@condition(etag_func=existing_marks_etag, last_modified_func=existing_marks_last_modified)
 def get_existing_marks(request):
     """AJAX endpoint to get existing marks for students"""
     if request.method == 'GET':
@@ -281,126 +282,158 @@ def get_existing_marks(request):
             return JsonResponse({'error': 'Missing required parameters'}, status=400)
         
         try:
-            course = Course.objects.get(id=course_id)
-            unit = Unit.objects.get(id=unit_id)
+            if not (Course.objects.filter(id=course_id).exists() and Unit.objects.filter(id=unit_id).exists()):
+                return JsonResponse({'error': 'Invalid course or unit'}, status=400)
             
-            # Get students for this course
-            students = Student.objects.filter(course=course)
+            return JsonResponse({'existing_marks': get_class_marks(course_id, unit_id, term, year)})
             
-            # Get existing marks for these students for the specified unit, term, and year
-            existing_marks = {}
-            for student in students:
-                record = ExamRecord.objects.filter(
-                    student=student,
-                    unit=unit,
-                    term=term,
-                    year=year
-                ).first()
-                
-                if record:
-                    existing_marks[student.id] = {
-                        'cat1_score': float(record.cat1_score) if record.cat1_score else '',
-                        'cat2_score': float(record.cat2_score) if record.cat2_score else '',
-                        'end_term_score': float(record.end_term_score) if record.end_term_score else ''
-                    }
-                else:
-                    existing_marks[student.id] = {
-                        'cat1_score': '',
-                        'cat2_score': '',
-                        'end_term_score': ''
-                    }
-            
-            return JsonResponse({'existing_marks': existing_marks})
-            
-        except (Course.DoesNotExist, Unit.DoesNotExist):
+        except (ValueError, TypeError):
             return JsonResponse({'error': 'Invalid course or unit'}, status=400)
     
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 
+def roster_etag(request):
+    """
+    The course's roster version, plus the marks stamp when a sitting is
+    asked for. Costs one primary-key lookup, and the marks stamp's query.
+    """
+    course_id = request.GET.get('course_id', '')
+    if request.method != 'GET' or not course_id.isdigit():
+        return None
+    request._roster_version = roster_version(int(course_id))
+    marks_etag = existing_marks_etag(request)
+    return f'{request._roster_version}-{marks_etag}' if marks_etag else str(request._roster_version)
+
+
+# gzip outermost, so it weakens the ETag that condition() sets on the compressed body
+@gzip_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=roster_etag)
+def roster_data(request):
+    """
+    A course's roster for the batch marks-entry grid, as columns of ids,
+    names and registration numbers, together with the marks already
+    entered for ?unit_id=, ?term= and ?year= when all three are given.
+    """
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
+    
+    course_id = request.GET.get('course_id', '')
+    if not course_id.isdigit():
+        return JsonResponse({'error': 'Missing or invalid course_id'}, status=400)
+    courses = Course.objects.filter(school__campus=current_campus) if current_campus else Course.objects.all()
+    if not courses.filter(id=course_id).exists():
+        return JsonResponse({'error': 'Course not found'}, status=404)
+    
+    payload = {
+        'course_id': int(course_id),
+        'students': course_roster(int(course_id), getattr(request, '_roster_version', None)),
+        'marks': {},
+    }
+    unit_id, term, year = (request.GET.get(key, '') for key in ('unit_id', 'term', 'year'))
+    if unit_id and term and year:
+        if not (unit_id.isdigit() and year.isdigit()):
+            return JsonResponse({'error': 'Invalid unit or year'}, status=400)
+        payload['marks'] = get_class_marks(course_id, unit_id, term, year)
+    return JsonResponse(payload)
+
+
+def autocomplete_lookup(request, search, filters=()):
+    """
+    Shared body of the autocomplete endpoints: one page of `search`
+    results for ?q= and ?page=, scoped to the current campus, with the
+    id parameters named in `filters` passed on.
+    """
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
+    
+    try:
+        page = max(int(request.GET.get('page') or 1), 1)
+        options = {f'{name}_id': int(request.GET[name]) for name in filters if request.GET.get(name)}
+    except ValueError:
+        return JsonResponse({'error': 'Invalid page or id'}, status=400)
+    campus_id = current_campus.id if current_campus else None
+    return JsonResponse(search(campus_id, request.GET.get('q', ''), page, **options))
+
+
+def autocomplete_students(request):
+    """Students by name or registration number prefix, optionally of one ?course=."""
+    return autocomplete_lookup(request, search_students, filters=['course'])
+
+
+def autocomplete_units(request):
+    """Units by name prefix, optionally of one ?course= or of one ?student='s course."""
+    return autocomplete_lookup(request, search_units, filters=['course', 'student'])
+
+
+def autocomplete_courses(request):
+    """Courses by name prefix."""
+    return autocomplete_lookup(request, search_courses)
+
+
+# Above this many matching records the count is shown as "N+"
+RECORD_COUNT_CAP = 10000
+
+
+@conditional_page
 def view_records(request):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
     # For both superusers and regular users, filter by campus if one is selected
     if current_campus:
-        records = ExamRecord.objects.select_related('student', 'unit', 'unit__course').filter(student__course__school__campus=current_campus)
+        records = ExamRecord.objects.select_related('student', 'student__course', 'unit', 'unit__course').filter(campus=current_campus)
     else:
         # If no campus is selected and user is superuser, show all records
         if request.user.is_superuser:
-            records = ExamRecord.objects.select_related('student', 'unit', 'unit__course').all()
+            records = ExamRecord.objects.select_related('student', 'student__course', 'unit', 'unit__course').all()
         else:
             # Regular users must have a campus selected
             return redirect('exams:campus_select')
     
-    # Filtering
-    student_filter = request.GET.get('student')
-    course_filter = request.GET.get('course')
-    unit_filter = request.GET.get('unit')
-    term_filter = request.GET.get('term')
-    year_filter = request.GET.get('year')
-    
-    if student_filter:
-        records = records.filter(
-            Q(student__name__icontains=student_filter) | 
-            Q(student__registration_number__icontains=student_filter)
-        )
-    if course_filter:
-        records = records.filter(unit__course__name__icontains=course_filter)
-    if unit_filter:
-        records = records.filter(unit__name__icontains=unit_filter)
-    if term_filter:
-        records = records.filter(term__iexact=term_filter)
-    if year_filter:
-        records = records.filter(year=year_filter)
-    
-    # Pagination
-    paginator = Paginator(records, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    records, filters = filter_records(records, request.GET, current_campus.id if current_campus else None)
+    
+    # Keyset pagination on (sort column, id): deep pages cost the same as page 1
+    page_obj = paginate_keyset(records, RECORD_SORT_ORDERINGS[filters['sort']], request.GET.get('cursor'), per_page=20)
+    total_count, count_capped = capped_count(records, RECORD_COUNT_CAP)
     
     # For filter dropdowns - respect campus selection
-    if current_campus:
-        years = ExamRecord.objects.filter(student__course__school__campus=current_campus).values_list('year', flat=True).distinct().order_by('year')
-        terms = ExamRecord.objects.filter(student__course__school__campus=current_campus).values_list('term', flat=True).distinct().order_by('term')
-        courses = Course.objects.filter(school__campus=current_campus)
-        units = Unit.objects.filter(course__school__campus=current_campus)
-        students = Student.objects.filter(course__school__campus=current_campus)
-    else:
-        # If no campus is selected and user is superuser, show all
-        if request.user.is_superuser:
-            years = ExamRecord.objects.values_list('year', flat=True).distinct().order_by('year')
-            terms = ExamRecord.objects.values_list('term', flat=True).distinct().order_by('term')
-            courses = Course.objects.all()
-            units = Unit.objects.all()
-            students = Student.objects.all()
-        else:
-            # Regular users must have a campus selected
-            return redirect('exams:campus_select')
+    catalog = campus_catalog(current_campus)
     
     context = {
         'page_obj': page_obj,
-        'courses': courses,
-        'units': units,
-        'students': students,
-        'years': years,
-        'terms': terms,
-        'filters': {
-            'course': course_filter,
-            'unit': unit_filter,
-            'student': student_filter,
-            'year': year_filter,
-            'term': term_filter,
-            'sort': 'student__name', # Default sort
-        },
+        'courses': catalog.courses,
+        'units': catalog.units,
+        'years': catalog.years,
+        'terms': catalog.terms,
+        'filters': filters,
+        'filter_query': urlencode({key: value for key, value in request.GET.items() if key != 'cursor' and value}),
+        'total_count': total_count,
+        'count_capped': count_capped,
         'current_campus': current_campus,
     }
     return render(request, 'exams/view_records.html', context)
 
 
+def export_records_csv(request):
+    """The records matching the view_records filters, streamed as CSV."""
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
+    
+    records = ExamRecord.objects.filter(campus=current_campus) if current_campus else ExamRecord.objects.all()
+    records, filters = filter_records(records, request.GET, current_campus.id if current_campus else None)
+    records = records.order_by(*RECORD_SORT_ORDERINGS[filters['sort']])
+    campus_name = current_campus.name.replace(' ', '_') if current_campus else 'All_Campuses'
+    return stream_records_csv(records, f'Exam_Records_{campus_name}_{datetime.now():%Y%m%d}.csv')
+
+
 def update_record(request, record_id):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
@@ -418,51 +451,22 @@ def update_record(request, record_id):
     context = {
         'form': form,
         'record': record,
+        'grade_bands': scheme_for(record.campus_id, record.unit.course_id).client_bands(),
         'current_campus': current_campus,
     }
     return render(request, 'exams/update_record.html', context)
 
 
+@conditional_page
 def manage_courses(request):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
-    # Get all schools with their campuses
-    schools = School.objects.select_related('campus').all().order_by('name')
-    
-    # Get comprehensive course data with all relationships
-    courses = Course.objects.select_related(
-        'school',
-        'school__campus'
-    ).prefetch_related(
-        'units',
-        'students',
-        'units__exam_records'
-    ).annotate(
-        unit_count=Count('units'),
-        student_count=Count('students')
-    ).order_by('-created_at')
-
-    # Detailed debug logging
-    print("\n=== COURSE ANALYSIS DEBUG ===")
-    print(f"Total courses found: {courses.count()}")
-    for i, course in enumerate(courses, 1):
-        print(f"\nCourse #{i}: {course.name}")
-        print(f"School: {course.school.name if course.school else 'None'}")
-        print(f"Campus: {course.school.campus.name if course.school and course.school.campus else 'None'}")
-        print(f"Units: {course.unit_count}")
-        print(f"Students: {course.student_count}")
-        if course.units.exists():
-            print("Unit Details:")
-            for unit in course.units.all():
-                print(f"  - {unit.name}: {unit.exam_records.count()} records")
-
-    # Apply campus filter if a campus is selected
+    # Schools for the create form
+    schools = School.objects.select_related('campus').order_by('name')
     if current_campus:
-        courses = courses.filter(school__campus=current_campus)
         schools = schools.filter(campus=current_campus)
-        print(f"\nFiltered to {current_campus.name} campus: {courses.count()} courses")
     
     # Handle course creation
     if request.method == 'POST' and 'create_course' in request.POST:
@@ -491,11 +495,10 @@ def manage_courses(request):
                 course.school = school  # Explicitly set school relationship
                 course.save()
                 
-                # Debug output
-                print(f"\nDEBUG: Created course - Name: {course.name}")
-                print(f"School: {course.school.name if course.school else 'None'}")
-                print(f"Campus: {course.school.campus.name if course.school and course.school.campus else 'None'}")
-                print(f"Created at: {course.created_at}")
+                logger.info(
+                    'Created course %s (%s) in school %s', course.name, course.id, school.id,
+                    extra={'course_id': course.id, 'school_id': school.id, 'campus_id': school.campus_id},
+                )
                 
                 messages.success(request, f'Course "{course.name}" created successfully for {school.name}!')
                 return redirect('exams:manage_courses')
@@ -547,9 +550,8 @@ def manage_courses(request):
                 else:
                     messages.error(request, 'Database error occurred. Please try again with a different name.')
                 return redirect('exams:manage_courses')
-            except Exception as e:
-                import traceback
-                print(f"Error creating school: {str(e)}\n{traceback.format_exc()}")
+            except Exception:
+                logger.exception('Error creating school %r', school_name, extra={'campus_id': campus.id if campus else None})
                 messages.error(request, 'An unexpected error occurred. Please try again.')
                 return redirect('exams:manage_courses')
         else:
@@ -571,26 +573,36 @@ def manage_courses(request):
     else:
         form = CourseForm()
     
-    # Debug output for template context
-    print("\n=== TEMPLATE CONTEXT DEBUG ===")
-    print(f"Passing {courses.count()} courses to template")
-    for i, course in enumerate(courses, 1):
-        print(f"Course {i}: {course.name} (ID: {course.id})")
-        print(f"  School: {course.school.name if course.school else 'None'}")
-        print(f"  Units: {course.units.count()}")
-        print(f"  Students: {course.students.count()}")
+    # Every course with its unit, student and record counts, in one query
+    campus_id = current_campus.id if current_campus else None
+    courses = list(course_analytics(campus_id))
+    logger.debug(
+        'Course analytics: %d courses for campus %s', len(courses), campus_id or 'all',
+        extra={'campus_id': campus_id, 'course_count': len(courses)},
+    )
+    
+    # Drill-down: one course's units with their record counts
+    selected_course = unit_rows = None
+    course_id = request.GET.get('course', '')
+    if course_id.isdigit():
+        selected_course = next((course for course in courses if course.id == int(course_id)), None)
+        if selected_course is None:
+            raise Http404('Course not found')
+        unit_rows = unit_analytics(selected_course)
     
     context = {
         'form': form,
         'courses': courses,
         'schools': schools,
+        'selected_course': selected_course,
+        'unit_rows': unit_rows,
         'current_campus': current_campus,
     }
     return render(request, 'exams/manage_courses.html', context)
 
 
 def manage_units(request):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
@@ -616,9 +628,10 @@ def manage_units(request):
     else:
         form = UnitForm()
     
-    # Filter form choices based on campus
+    # Filter form choices based on campus; the options come from the cached catalog
     if not request.user.is_superuser and current_campus:
         form.fields['course'].queryset = courses
+    form.fields['course'].choices = campus_catalog(None if request.user.is_superuser else current_campus).course_choices()
     
     context = {
         'form': form,
@@ -630,13 +643,13 @@ def manage_units(request):
 
 
 def manage_students(request):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
     # Respect campus selection for both superusers and regular users
     if current_campus:
-        students = Student.objects.select_related('course').filter(course__school__campus=current_campus)
+        students = Student.objects.select_related('course').filter(campus=current_campus)
         courses = Course.objects.filter(school__campus=current_campus)
     else:
         # If no campus is selected and user is superuser, show all
@@ -656,9 +669,10 @@ def manage_students(request):
     else:
         form = StudentForm()
     
-    # Filter form choices based on campus
+    # Filter form choices based on campus; the options come from the cached catalog
     if not request.user.is_superuser and current_campus:
         form.fields['course'].queryset = courses
+    form.fields['course'].choices = campus_catalog(None if request.user.is_superuser else current_campus).course_choices()
     
     context = {
         'form': form,
@@ -669,8 +683,41 @@ def manage_students(request):
     return render(request, 'exams/manage_students.html', context)
 
 
+def import_students_csv(request):
+    """Upload a CSV roster of students for the current campus."""
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
+    
+    report = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not current_campus:
+            messages.error(request, 'Select a campus before importing students.')
+        elif not upload:
+            messages.error(request, 'Choose a CSV file to import.')
+        else:
+            try:
+                report = import_students(upload, current_campus, dry_run=bool(request.POST.get('dry_run')))
+            except ImportFileError as e:
+                messages.error(request, f'Could not import {upload.name}: {e}')
+            else:
+                verb = 'Checked' if report['dry_run'] else 'Imported'
+                messages.success(
+                    request,
+                    f"{verb} {report['rows']} rows: {report['created']} new, {report['existing']} already registered, "
+                    f"{report['error_count']} skipped.",
+                )
+    
+    context = {
+        'report': report,
+        'current_campus': current_campus,
+    }
+    return render(request, 'exams/import_students.html', context)
+
+
 def update_student(request, student_id):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
@@ -706,7 +753,7 @@ def update_student(request, student_id):
 
 
 def delete_record(request, record_id):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
@@ -726,26 +773,12 @@ def delete_record(request, record_id):
 
 
 def generate_report(request):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
     # Respect campus selection for both superusers and regular users
-    if current_campus:
-        courses = Course.objects.filter(school__campus=current_campus)
-        students = Student.objects.filter(course__school__campus=current_campus)
-        years = ExamRecord.objects.filter(student__course__school__campus=current_campus).values_list('year', flat=True).distinct().order_by('year')
-        terms = ExamRecord.objects.filter(student__course__school__campus=current_campus).values_list('term', flat=True).distinct().order_by('term')
-    else:
-        # If no campus is selected and user is superuser, show all
-        if request.user.is_superuser:
-            courses = Course.objects.all()
-            students = Student.objects.all()
-            years = ExamRecord.objects.values_list('year', flat=True).distinct().order_by('year')
-            terms = ExamRecord.objects.values_list('term', flat=True).distinct().order_by('term')
-        else:
-            # Regular users must have a campus selected
-            return redirect('exams:campus_select')
+    catalog = campus_catalog(current_campus)
     
     pass_list = []
     selected_course = None
@@ -764,44 +797,36 @@ def generate_report(request):
         if not records.exists():
             messages.error(request, 'No records found for this student, year, and term.')
         else:
-            mean_total = 0
+            scheme = scheme_for(student.campus_id, student.course_id)
             results = []
             for rec in records:
                 cat_avg = int(round((float(rec.cat1_score) + float(rec.cat2_score)) / 2))
                 end_term = int(round(float(rec.end_term_score)))
-                avg = int(round(cat_avg + end_term))
-                if avg >= 75:
-                    remark = 'Distinction'
-                elif avg >= 60:
-                    remark = 'Credit'
-                elif avg >= 40:
-                    remark = 'Pass'
-                else:
-                    remark = 'Fail'
                 results.append({
                     'unit': rec.unit.name,
                     'cat1': rec.cat1_score,
                     'cat2': rec.cat2_score,
                     'cat': cat_avg,
                     'end_term': rec.end_term_score,
-                    'average': avg,
-                    'remark': remark,
+                    'average': int(round(cat_avg + end_term)),
                 })
-                mean_total += avg
-            mean_score = mean_total // len(records) if records else 0
+            for result, band in zip(results, scheme.grade_scores([result['average'] for result in results])):
+                result['remark'] = band.remark
+            mean_score = sum(result['average'] for result in results) // len(results)
+            mean_band = scheme.band(mean_score)
             transcript_preview = {
                 'student': student,
                 'year': year,
                 'term': term,
                 'results': results,
                 'mean_score': mean_score,
+                'grade': f'{mean_band.grade} ({mean_band.remark})',
             }
     
     context = {
-        'courses': courses,
-        'students': students,
-        'years': years,
-        'terms': terms,
+        'courses': catalog.courses,
+        'years': catalog.years,
+        'terms': catalog.terms,
         'transcript_preview': transcript_preview,
         'current_campus': current_campus,
         'dashboard_url': reverse('exams:campus_select'),
@@ -810,7 +835,8 @@ def generate_report(request):
 
 
 def download_report(request):
-    current_campus = get_current_campus(request)
+    """Queue a student's progress report as a Word document."""
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
@@ -824,482 +850,398 @@ def download_report(request):
             messages.error(request, 'Missing required parameters for report generation.')
             return redirect('exams:generate_report')
         
-        try:
-            student = Student.objects.get(id=student_id)
-            records = ExamRecord.objects.filter(student=student, year=year, term=term).select_related('unit', 'unit__course')
-            
-            if not records.exists():
-                messages.error(request, 'No records found for this student, year, and term.')
-                return redirect('exams:generate_report')
-            
-            # Get student details
-            student_name = student.name
-            admission_number = student.registration_number
-            course_name = student.course.name
-            
-        except Student.DoesNotExist:
+        students = Student.objects.filter(campus=current_campus) if current_campus else Student.objects.all()
+        student = students.filter(id=student_id).first() if student_id.isdigit() else None
+        if student is None:
             messages.error(request, 'Student not found.')
             return redirect('exams:generate_report')
+        if not ExamRecord.objects.filter(student=student, year=year, term=term).exists():
+            messages.error(request, 'No records found for this student, year, and term.')
+            return redirect('exams:generate_report')
+        params = {'student_id': student.id, 'year': year, 'term': term}
     
     # Handle GET request (legacy filtering - for backward compatibility)
     else:
-        if request.user.is_superuser:
-            records = ExamRecord.objects.all()
-        else:
-            records = ExamRecord.objects.filter(student__course__school__campus=current_campus)
-        
-        # Filtering
-        student_filter = request.GET.get('student')
-        course_filter = request.GET.get('course')
-        unit_filter = request.GET.get('unit')
-        term_filter = request.GET.get('term')
-        year_filter = request.GET.get('year')
-        
-        if student_filter:
-            records = records.filter(student__name__icontains=student_filter)
-        if course_filter:
-            records = records.filter(unit__course__name__icontains=course_filter)
-        if unit_filter:
-            records = records.filter(unit__name__icontains=unit_filter)
-        if term_filter:
-            records = records.filter(term=term_filter)
-        if year_filter:
-            records = records.filter(year=year_filter)
-        
-        # Get details from filters or first record
-        student_name = student_filter or ''
-        admission_number = ''
-        course_name = course_filter or ''
-        year = year_filter or ''
-        term = term_filter or ''
-        school = ''
-        level = ''
-        
-        if records.exists():
-            first_record = records.first()
-            if not student_name:
-                student_name = first_record.student.name
-            if not admission_number:
-                admission_number = first_record.student.registration_number
-            if not course_name:
-                course_name = first_record.unit.course.name
-            if not year:
-                year = str(first_record.year)
-            if not term:
-                term = first_record.term
-    
-    # Create Word document
-    doc = Document()
-    section = doc.sections[0]
-    section.top_margin = Inches(0.3)
-    section.bottom_margin = Inches(0.3)
-    section.left_margin = Inches(0.3)
-    section.right_margin = Inches(0.3)
-
-    # HEADER IMAGE (full width, very top)
-    try:
-        doc.add_picture('report/head.jpg', width=Inches(7.0))
-    except FileNotFoundError:
-        doc.add_paragraph("Header image not found.")
-
-
-
-    # TITLE
-    p = doc.add_paragraph()
-    run = p.add_run('STUDENTS   PROGRESS   REPORT')
-    run.bold = True
-    run.font.size = Pt(16)
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    doc.add_paragraph()
-    # STUDENT INFO (no table, just paragraphs, bold field names only)
-    p = doc.add_paragraph()
-    p.add_run("STUDENT'S NAME:").bold = True
-    p.add_run(f" {student_name or '....................................................'}    ")
-    p.add_run("ADM NO:").bold = True
-    p.add_run(f" {admission_number or '................'}")
-    p = doc.add_paragraph()
-    p.add_run("COURSE:").bold = True
-    p.add_run(f" {course_name or '..................................................'}    ")
-    p.add_run("ACADEMIC YEAR:").bold = True
-    p.add_run(f" {year or '................'}")
-    p = doc.add_paragraph()
-    p.add_run("TERM:").bold = True
-    p.add_run(f" {term or '................'}")
-    doc.add_paragraph()
-    # RESULTS TABLE
-    results_table = doc.add_table(rows=1, cols=5)
-    results_table.style = 'Table Grid'
-    hdr = results_table.rows[0].cells
-    hdr[0].text = 'SUBJECT/UNIT'
-    hdr[1].text = 'CAT'
-    hdr[2].text = 'END TERM'
-    hdr[3].text = 'AVERAGE%'
-    hdr[4].text = 'REMARKS'
-    for cell in hdr:
-        for p in cell.paragraphs:
-            for r in p.runs:
-                r.font.bold = True
-                r.font.size = Pt(10)
-        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    mean_total = 0
-    for rec in records:
-        row = results_table.add_row().cells
-        row[0].text = rec.unit.name.upper()
-        cat_avg = int(round((float(rec.cat1_score) + float(rec.cat2_score)) / 2))
-        row[1].text = str(cat_avg)
-        end_term = int(round(float(rec.end_term_score)))
-        row[2].text = str(end_term)
-        avg = int(round(cat_avg + end_term))
-        row[3].text = str(avg)
-        if avg >= 75:
-            remark = 'Distinction'
-        elif avg >= 60:
-            remark = 'Credit'
-        elif avg >= 40:
-            remark = 'Pass'
-        else:
-            remark = 'Fail'
-        row[4].text = remark
-        mean_total += avg
-        for i in range(1,5):
-            for p in row[i].paragraphs:
-                p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    mean_score = int(round(mean_total / records.count())) if records.count() else 0
-    if mean_score >= 75:
-        grade = 'A..(DISTINCTION)'
-    elif mean_score >= 60:
-        grade = 'B..(CREDIT)'
-    elif mean_score >= 40:
-        grade = 'C..(PASS )'
-    else:
-        grade = 'D..(FAIL)'
-    doc.add_paragraph()
-    # MEAN SCORE & GRADE (single paragraph, spaced)
-    mean_grade_para = doc.add_paragraph()
-    mean_grade_para.add_run(f'MEAN SCORE: {mean_score}').bold = True
-    mean_grade_para.add_run(' ' * 15)
-    mean_grade_para.add_run(f'GRADES: {grade}').bold = True
-    doc.add_paragraph()
-    # GRADING SYSTEM BOX (narrower, only grade letter bold)
-    grading_table = doc.add_table(rows=5, cols=1)
-    grading_table.style = 'Table Grid'
-    grading_table.autofit = False
-    grading_table.columns[0].width = Inches(1.2)
-    grading_table.cell(0,0).text = ''
-    grading_table.cell(0,0).paragraphs[0].add_run('Grading system:').bold = True
-    # Row 1
-    p = grading_table.cell(1,0).paragraphs[0]
-    p.add_run('75-100 – ').bold = False
-    p.add_run('A').bold = True
-    p.add_run(' (Distinction)').bold = False
-    # Row 2
-    p = grading_table.cell(2,0).paragraphs[0]
-    p.add_run('60 – 75 – ').bold = False
-    p.add_run('B').bold = True
-    p.add_run(' (Credit)').bold = False
-    # Row 3
-    p = grading_table.cell(3,0).paragraphs[0]
-    p.add_run('40 – 59 – ').bold = False
-    p.add_run('C').bold = True
-    p.add_run(' (Pass)').bold = False
-    # Row 4
-    p = grading_table.cell(4,0).paragraphs[0]
-    p.add_run('0 – 39 – ').bold = False
-    p.add_run('D').bold = True
-    p.add_run(' (Fail)').bold = False
-    doc.add_paragraph()
-    # SIGNATURES (not in a table, just paragraphs)
-    sig_line = doc.add_paragraph()
-    sig_line.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    sig_line.add_run('Signed_________________').italic = True
-    sig_line.add_run(' ' * 10)
-    sig_line.add_run('Signed_________________').italic = True
-    sig_titles = doc.add_paragraph()
-    sig_titles.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    sig_titles.add_run('EXAMINATION').bold = True
-    sig_titles.add_run(' ' * 20)
-    sig_titles.add_run('PRINCIPAL').bold = True
-    for run in sig_titles.runs:
-        run.italic = True
-    doc.add_paragraph()
-    # FOOTER IMAGE (full width, very bottom)
-    doc.add_picture('report/foot.png', width=Inches(7.0))
-    f = io.BytesIO()
-    doc.save(f)
-    f.seek(0)
-    response = HttpResponse(f.read(), content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-    filename = f"Progress_Report_{student_name.replace(' ', '_') if student_name else 'all'}_{year or 'all'}_T{term or 'all'}.docx"
-    response['Content-Disposition'] = f'attachment; filename=\"{filename}\"'
+        params = {
+            'campus_id': None if request.user.is_superuser else current_campus.id,
+            'filters': {key: request.GET.get(key, '') for key in ('student', 'course', 'unit', 'term', 'year')},
+        }
+    
+    job = submit_job('progress_report', params, campus=current_campus, user=request.user)
+    return redirect('exams:job_detail', job_id=job.id)
+
+
+def transcript_student(request):
+    """
+    The student named by the `student` id in the query string, limited to
+    the selected campus. Returns None, after a message, when it is missing.
+    """
+    students = Student.objects.select_related('course')
+    if request.campus:
+        students = students.filter(campus=request.campus)
+    student_id = request.GET.get('student', '')
+    if not student_id.isdigit():
+        messages.error(request, 'Select a student to see their transcript.')
+        return None
+    return get_object_or_404(students, id=student_id)
+
+
+def transcript(request):
+    """A student's cumulative transcript across every term they have sat."""
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
+    
+    student = transcript_student(request)
+    if student is None:
+        return redirect('exams:generate_report')
+    
+    context = {
+        'student': student,
+        'transcript': student_transcript(student),
+        'current_campus': current_campus,
+    }
+    return render(request, 'exams/transcript.html', context)
+
+
+def download_transcript(request):
+    """The cumulative transcript as a Word document."""
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
+    
+    student = transcript_student(request)
+    if student is None:
+        return redirect('exams:generate_report')
+    
+    with docx_render('transcript'):
+        content = render_transcript(
+            student.name, student.registration_number, student.course.name, student_transcript(student),
+        )
+    response = HttpResponse(content, content_type=DOCX_CONTENT_TYPE)
+    filename = f"Transcript_{student.name.replace(' ', '_')}.docx"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
+def download_course_reports(request):
+    """Queue a ZIP of progress reports for every student of a course/year/term."""
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
+    
+    params = request.POST if request.method == 'POST' else request.GET
+    course_id = params.get('course_id')
+    year = params.get('year')
+    term = params.get('term')
+    if not all([course_id, year, term]):
+        messages.error(request, 'Select a course, year and term to download class reports.')
+        return redirect('exams:generate_report')
+    
+    courses = Course.objects.filter(school__campus=current_campus) if current_campus else Course.objects.all()
+    course = get_object_or_404(courses, id=course_id)
+    
+    if not ExamRecord.objects.filter(student__course=course, year=year, term=term).exists():
+        messages.error(request, 'No records found for this course, year, and term.')
+        return redirect('exams:generate_report')
+    
+    job = submit_job(
+        'course_reports',
+        {'course_id': course.id, 'year': year, 'term': term},
+        campus=current_campus,
+        user=request.user,
+    )
+    return redirect('exams:job_detail', job_id=job.id)
+
+
+@conditional_page
 def pass_list(request):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
     # Respect campus selection for both superusers and regular users
     if current_campus:
-        records = ExamRecord.objects.filter(student__course__school__campus=current_campus)
+        courses = Course.objects.filter(school__campus=current_campus)
+        terms = ExamRecord.objects.filter(campus=current_campus).values_list('term', flat=True).distinct().order_by('term')
     else:
-        # If no campus is selected and user is superuser, show all
-        if request.user.is_superuser:
-            records = ExamRecord.objects.all()
-        else:
-            # Regular users must have a campus selected
-            return redirect('exams:campus_select')
+        courses = Course.objects.all()
+        terms = ExamRecord.objects.values_list('term', flat=True).distinct().order_by('term')
     
-    # Calculate averages and filter passing students (total average >= 40)
-    students_passed = {}
-    for record in records:
-        # Skip records with incomplete scores
-        if not all([record.cat1_score, record.cat2_score, record.end_term_score]):
-            continue
-            
-        # Calculate total average for this record
-        total_avg = float(record.cat_average + record.end_term_score)
-        
-        # Only include passing records (total_avg >= 40)
-        if total_avg >= 40:
-            student = record.student
-            if student.id not in students_passed:
-                students_passed[student.id] = {
-                    'student': student,
-                    'records': [],
-                    'average': 0,
-                    'count': 0,
-                    'total': 0
-                }
-            students_passed[student.id]['records'].append(record)
-            students_passed[student.id]['count'] += 1
-            students_passed[student.id]['total'] += total_avg
-    
-    # Calculate overall average for each student
-    for student_data in students_passed.values():
-        student_data['average'] = student_data['total'] / student_data['count'] if student_data['count'] > 0 else 0
-    
-    # Sort by average
-    sorted_students = sorted(students_passed.values(), key=lambda x: x['average'], reverse=True)
+    # Course/term come from the filter form; a plain visit lists every course
+    selected_course = 'all'
+    selected_term = None
+    course = None
+    if request.method == 'POST':
+        course_id = request.POST.get('course')
+        selected_term = request.POST.get('term') or None
+        if course_id and course_id != 'all':
+            course = get_object_or_404(courses, id=course_id)
+            selected_course = course
+    
+    students_passed = get_pass_list(campus=current_campus, course=course, term=selected_term)
     
     context = {
-        'students_passed': sorted_students,
+        'pass_list': students_passed,
+        'courses': courses,
+        'terms': terms,
+        'selected_course': selected_course,
+        'selected_term': selected_term,
         'current_campus': current_campus,
         'dashboard_url': reverse('exams:campus_select'),
     }
     return render(request, 'exams/pass_list.html', context)
 
 
-def download_pass_list(request):
-    current_campus = get_current_campus(request)
+# Students per page of the rankings table
+RANKINGS_PER_PAGE = 100
+
+
+def selected_class(request, courses):
+    """
+    The (course, term, year) chosen in the query string, or None if any
+    of them is missing. Raises ValueError for a malformed course id or
+    year and Http404 for a course outside `courses`.
+    """
+    course_id, term, year = (request.GET.get(key, '').strip() for key in ('course_id', 'term', 'year'))
+    if not (course_id and term and year):
+        return None
+    course = get_object_or_404(courses, id=int(course_id))
+    return course, term, int(year)
+
+
+def rankings(request):
+    """Class positions and unit statistics for a course, term and year."""
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
-    # Respect campus selection for both superusers and regular users
     if current_campus:
-        records = ExamRecord.objects.filter(student__course__school__campus=current_campus)
+        courses = Course.objects.filter(school__campus=current_campus)
+        records = ExamRecord.objects.filter(campus=current_campus)
     else:
-        # If no campus is selected and user is superuser, show all
-        if request.user.is_superuser:
-            records = ExamRecord.objects.all()
+        courses = Course.objects.all()
+        records = ExamRecord.objects.all()
+    
+    class_stats = page_obj = None
+    try:
+        selection = selected_class(request, courses)
+    except ValueError:
+        messages.error(request, 'Choose a valid course, term and year.')
+        selection = None
+    if selection:
+        class_stats = class_rankings(*selection)
+        if class_stats['students']:
+            # Rendering thousands of rows x units is what makes a big class slow, so page it
+            page_obj = Paginator(class_stats['students'], RANKINGS_PER_PAGE).get_page(request.GET.get('page'))
+            for student in page_obj:
+                student['cells'] = list(zip(student['scores'], student['unit_ranks']))
         else:
-            # Regular users must have a campus selected
-            return redirect('exams:campus_select')
+            messages.warning(request, 'No records found for this course, term and year.')
+            class_stats = None
     
-    # Calculate averages and filter passing students (total average >= 40)
-    students_passed = {}
-    for record in records:
-        # Skip records with incomplete scores
-        if not all([record.cat1_score, record.cat2_score, record.end_term_score]):
-            continue
-            
-        # Calculate total average for this record
-        total_avg = float(record.cat_average + record.end_term_score)
-        
-        # Only include passing records (total_avg >= 40)
-        if total_avg >= 40:
-            student = record.student
-            if student.id not in students_passed:
-                students_passed[student.id] = {
-                    'student': student,
-                    'records': [],
-                    'average': 0,
-                    'count': 0,
-                    'total': 0
-                }
-            students_passed[student.id]['records'].append(record)
-            students_passed[student.id]['count'] += 1
-            students_passed[student.id]['total'] += total_avg
-    
-    # Calculate overall average for each student
-    for student_data in students_passed.values():
-        student_data['average'] = student_data['total'] / student_data['count'] if student_data['count'] > 0 else 0
-    
-    # Sort by average
-    sorted_students = sorted(students_passed.values(), key=lambda x: x['average'], reverse=True)
-    
-    # Create Word document
-    doc = Document()
-    doc.add_heading('Pass List', 0)
+    context = {
+        'class_stats': class_stats,
+        'page_obj': page_obj,
+        'courses': courses,
+        'years': records.values_list('year', flat=True).distinct().order_by('year'),
+        'terms': records.values_list('term', flat=True).distinct().order_by('term'),
+        'selected': selection,
+        'filter_query': urlencode({key: value for key, value in request.GET.items() if key != 'page' and value}),
+        'current_campus': current_campus,
+    }
+    return render(request, 'exams/rankings.html', context)
+
+
+def rankings_data(request):
+    """JSON version of the rankings page for a course_id, term and year."""
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
     
-    if current_campus:
-        doc.add_paragraph(f'Campus: {current_campus.name}')
-    elif request.user.is_superuser:
-        doc.add_paragraph('All Campuses')
-    
-    doc.add_paragraph(f'Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
-    doc.add_paragraph(f'Total Students Passed: {len(sorted_students)}')
-    
-    # Add table
-    table = doc.add_table(rows=1, cols=4)
-    table.style = 'Table Grid'
-    
-    # Header row
-    header_cells = table.rows[0].cells
-    header_cells[0].text = 'Student Name'
-    header_cells[1].text = 'Registration Number'
-    header_cells[2].text = 'Course'
-    header_cells[3].text = 'Average Score'
-    
-    # Data rows
-    for student_data in sorted_students:
-        student = student_data['student']
-        row_cells = table.add_row().cells
-        row_cells[0].text = student.name
-        row_cells[1].text = student.registration_number
-        row_cells[2].text = student.course.name
-        row_cells[3].text = f"{student_data['average']:.2f}"
-    
-    # Save document
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-    response['Content-Disposition'] = 'attachment; filename=pass_list.docx'
-    doc.save(response)
-    return response
+    courses = Course.objects.filter(school__campus=current_campus) if current_campus else Course.objects.all()
+    try:
+        selection = selected_class(request, courses)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid course or year'}, status=400)
+    except Http404:
+        return JsonResponse({'error': 'Course not found'}, status=404)
+    if selection is None:
+        return JsonResponse({'error': 'Missing required parameters'}, status=400)
+    return JsonResponse(class_rankings(*selection))
+
+
+def download_pass_list(request):
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
+    
+    course = None
+    term = request.POST.get('term') or None
+    course_id = request.POST.get('course_id')
+    if course_id and course_id != 'all':
+        courses = Course.objects.filter(school__campus=current_campus) if current_campus else Course.objects.all()
+        course = get_object_or_404(courses, id=course_id)
+    
+    job = submit_job(
+        'pass_list',
+        {
+            'campus_id': current_campus.id if current_campus else None,
+            'course_id': course.id if course else None,
+            'term': term,
+        },
+        campus=current_campus,
+        user=request.user,
+    )
+    return redirect('exams:job_detail', job_id=job.id)
 
 
 def download_records_word(request):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
-    if current_campus:
-        records = ExamRecord.objects.select_related('student', 'unit', 'unit__course').filter(student__course__school__campus=current_campus)
-    else:
-        # If no campus is selected and user is superuser, show all
-        if request.user.is_superuser:
-            records = ExamRecord.objects.select_related('student', 'unit', 'unit__course').all()
-        else:
-            # Regular users must have a campus selected
-            return redirect('exams:campus_select')
+    filters = {key: value for key, value in request.GET.items() if value}
+    job = submit_job(
+        'marks_entry_sheet',
+        {'campus_id': current_campus.id if current_campus else None, 'filters': filters},
+        campus=current_campus,
+        user=request.user,
+    )
+    return redirect('exams:job_detail', job_id=job.id)
+
+
+def visible_jobs(request):
+    """Jobs the user may see: all of them for a superuser, otherwise the selected campus's."""
+    jobs = Job.objects.all()
+    if request.user.is_superuser:
+        return jobs
+    return jobs.filter(campus=request.campus)
+
+
+def job_progress(job):
+    """A job's status as plain data for the page and the polling endpoint."""
+    data = {
+        'id': job.id,
+        'label': job_label(job.kind),
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == Job.DONE:
+        data['download_url'] = reverse('exams:job_download', kwargs={'job_id': job.id})
+    return data
+
+
+def job_detail(request, job_id):
+    """Progress of a queued export, with a download link once it is ready."""
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
     
-    # Create Word document
-    doc = Document()
-    section = doc.sections[0]
-    section.top_margin = Inches(0.5)
-    section.bottom_margin = Inches(0.5)
-    section.left_margin = Inches(0.5)
-    section.right_margin = Inches(0.5)
+    job = get_object_or_404(visible_jobs(request), id=job_id)
+    context = {
+        'job': job,
+        'progress': job_progress(job),
+        'status_url': reverse('exams:job_status', kwargs={'job_id': job.id}),
+        'current_campus': current_campus,
+    }
+    return render(request, 'exams/job_detail.html', context)
+
+
+def job_status(request, job_id):
+    """JSON status of a job, polled by the job page."""
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return JsonResponse({'error': 'Select a campus first'}, status=403)
     
-    # Header Image
     try:
-        doc.add_picture('C:/Users/PETER/Desktop/exam mangement/report/head.jpg', width=Inches(6.5))
+        job = visible_jobs(request).get(id=job_id)
+    except Job.DoesNotExist:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    return JsonResponse(job_progress(job))
+
+
+def job_download(request, job_id):
+    """The file a finished job produced."""
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
+    
+    job = get_object_or_404(visible_jobs(request), id=job_id)
+    if job.status != Job.DONE or not job.result:
+        messages.error(request, 'This file is not ready yet.')
+        return redirect('exams:job_detail', job_id=job.id)
+    try:
+        result = job.result.open('rb')
     except FileNotFoundError:
-        doc.add_paragraph("Header image not found.")
-
-    # Form details
-    p = doc.add_paragraph()
-    p.add_run('COURSE: ').bold = True
-    p.add_run(f"{request.GET.get('course', '....................................................')}")
-    p.add_run('    SEMESTER: ').bold = True
-    p.add_run(f"{request.GET.get('term', '................')}")
-    p.add_run('    YEAR: ').bold = True
-    p.add_run(f"{request.GET.get('year', '................')}")
-    
-    p = doc.add_paragraph()
-    p.add_run('SUBJECT: ').bold = True
-    p.add_run(f"{request.GET.get('unit', '..................................................')}")
-
-    # Table
-    table = doc.add_table(rows=1, cols=7)
-    table.style = 'Table Grid'
-    
-    # Headers
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = 'STUDENT NAME'
-    hdr_cells[1].text = 'ADM NO'
-    hdr_cells[2].text = 'ASSN'
-    hdr_cells[3].text = 'CAT 1'
-    hdr_cells[4].text = 'CAT 2'
-    hdr_cells[5].text = 'END TERM'
-    hdr_cells[6].text = 'TOTAL'
-    
-    for cell in hdr_cells:
-        cell.paragraphs[0].runs[0].font.bold = True
-        cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-    # Table Body (with records)
-    for record in records:
-        row_cells = table.add_row().cells
-        row_cells[0].text = record.student.name.upper()
-        row_cells[1].text = record.student.registration_number
-        row_cells[2].text = '' # ASSN is not in the model
-        row_cells[3].text = str(record.cat1_score)
-        row_cells[4].text = str(record.cat2_score)
-        row_cells[5].text = str(record.end_term_score)
-        row_cells[6].text = str(record.total_average)
-
-    # Add 15 empty rows for manual entry
-    for _ in range(15):
-        table.add_row()
-
-    # --- Serve the document ---
-    f = io.BytesIO()
-    doc.save(f)
-    f.seek(0)
-    
-    response = HttpResponse(
-        f.read(),
-        content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        messages.error(request, 'This file is no longer available.')
+        return redirect('exams:job_detail', job_id=job.id)
+    return FileResponse(
+        result, as_attachment=True, filename=job.result_name, content_type=job.content_type or 'application/octet-stream',
     )
-    filename = "Marks_Entry_Sheet.docx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response 
+
 
 def enter_marks_spreadsheet(request):
-    current_campus = get_current_campus(request)
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
 
-    if current_campus:
-        courses = Course.objects.filter(school__campus=current_campus)
-        units = Unit.objects.filter(course__school__campus=current_campus)
-    else:
-        courses = Course.objects.all()
-        units = Unit.objects.all()
+    catalog = campus_catalog(current_campus)
 
     context = {
-        'courses': courses,
-        'units': units,
+        'courses': catalog.courses,
+        'units': catalog.units,
         'current_campus': current_campus,
     }
     return render(request, 'exams/enter_marks_spreadsheet.html', context)
 
 
-def enter_marks_per_student(request):
-    current_campus = get_current_campus(request)
+def import_marks_csv(request):
+    """Upload a CSV of marks; a dry run reports what would change without saving."""
+    current_campus = request.campus
     if not current_campus and not request.user.is_superuser:
         return redirect('exams:campus_select')
     
-    # Respect campus selection for both superusers and regular users
-    if current_campus:
-        students = Student.objects.filter(course__school__campus=current_campus)
-    else:
-        # If no campus is selected and user is superuser, show all
-        if request.user.is_superuser:
-            students = Student.objects.all()
+    report = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Choose a CSV file to import.')
         else:
-            # Regular users must have a campus selected
-            return redirect('exams:campus_select')
+            try:
+                report = import_marks(
+                    upload,
+                    campus=current_campus,
+                    term=request.POST.get('term', '').strip() or None,
+                    year=request.POST.get('year', '').strip() or None,
+                    dry_run=bool(request.POST.get('dry_run')),
+                )
+            except ImportFileError as e:
+                messages.error(request, f'Could not import {upload.name}: {e}')
+            else:
+                verb = 'Checked' if report['dry_run'] else 'Imported'
+                messages.success(
+                    request,
+                    f"{verb} {report['rows']} rows: {report['created']} new, {report['updated']} updated, "
+                    f"{report['unchanged']} unchanged, {report['error_count']} with errors.",
+                )
     
+    context = {
+        'report': report,
+        'current_campus': current_campus,
+    }
+    return render(request, 'exams/import_marks.html', context)
+
+
+def enter_marks_per_student(request):
+    current_campus = request.campus
+    if not current_campus and not request.user.is_superuser:
+        return redirect('exams:campus_select')
+    
+    # Students are picked through the autocomplete endpoint, scoped to the campus there
     years = [2025, 2024, 2023, 2022, 2021]
     terms = ['Term 1', 'Term 2', 'Term 3', 'Term 4']
     
@@ -1317,20 +1259,7 @@ def enter_marks_per_student(request):
         selected_student = get_object_or_404(Student, id=student_id)
         selected_year = year
         selected_term = term
-        all_units = list(Unit.objects.filter(course=selected_student.course))
-        entered_units = []
-        for unit in all_units:
-            rec = ExamRecord.objects.filter(student=selected_student, unit=unit, year=year, term=term).first()
-            if rec:
-                unit_marks.append({
-                    'unit': unit,
-                    'cat1': rec.cat1_score,
-                    'cat2': rec.cat2_score,
-                    'endterm': rec.end_term_score,
-                    'has_record': True,
-                })
-                entered_units.append(unit.id)
-        available_units = [u for u in all_units if u.id not in entered_units]
+        unit_marks, available_units = get_unit_marks(selected_student, year, term)
     elif request.method == 'POST' and 'save_marks' in request.POST:
         student_id = request.POST.get('student_id')
         year = request.POST.get('year')
@@ -1338,48 +1267,8 @@ def enter_marks_per_student(request):
         selected_student = get_object_or_404(Student, id=student_id)
         selected_year = year
         selected_term = term
-        school = request.POST.get('school')
-        level = request.POST.get('level')
-        i = 1
-        entered_units = []
-        while True:
-            unit_id = request.POST.get(f'unit_id_{i}')
-            unit_name = request.POST.get(f'unit_name_{i}', '').strip()
-            if not unit_id:
-                break
-            cat1 = request.POST.get(f'cat1_{i}')
-            cat2 = request.POST.get(f'cat2_{i}')
-            endterm = request.POST.get(f'endterm_{i}')
-            cat1_val = safe_decimal(cat1)
-            cat2_val = safe_decimal(cat2)
-            endterm_val = safe_decimal(endterm)
-            if unit_id == 'other' and unit_name:
-                unit, _ = Unit.objects.get_or_create(
-                    name=unit_name,
-                    course=selected_student.course
-                )
-            else:
-                unit = Unit.objects.get(id=unit_id)
-            record, _ = ExamRecord.objects.get_or_create(
-                student=selected_student,
-                unit=unit,
-                year=year,
-                term=term,
-                defaults={
-                    'cat1_score': cat1_val,
-                    'cat2_score': cat2_val,
-                    'end_term_score': endterm_val,
-                }
-            )
-            record.cat1_score = cat1_val
-            record.cat2_score = cat2_val
-            record.end_term_score = endterm_val
-            record.school = school
-            record.level = level
-            record.save()
-            entered_units.append(unit.id)
-            i += 1
-        message = 'Marks saved successfully!'
+        results = upsert_marks(selected_student, year, term, collect_unit_rows(request.POST))
+        message = marks_saved_message(results)
         # Reset form for next student
         selected_student = None
         selected_year = None
@@ -1387,7 +1276,6 @@ def enter_marks_per_student(request):
         unit_marks = []
         available_units = []
     context = {
-        'students': students,
         'years': years,
         'terms': terms,
         'selected_student': selected_student,
@@ -1400,8 +1288,25 @@ def enter_marks_per_student(request):
     }
     return render(request, 'exams/enter_marks_per_student.html', context) 
 
-def safe_decimal(val):
-    try:
-        return float(val)
-    except (TypeError, ValueError):
-        return 0
+def collect_unit_rows(data):
+    """Read the numbered unit_id_N / cat1_N / cat2_N / endterm_N fields of a marks form."""
+    rows = []
+    i = 1
+    while data.get(f'unit_id_{i}'):
+        rows.append({
+            'unit_id': data.get(f'unit_id_{i}'),
+            'unit_name': data.get(f'unit_name_{i}', ''),
+            'cat1': data.get(f'cat1_{i}'),
+            'cat2': data.get(f'cat2_{i}'),
+            'endterm': data.get(f'endterm_{i}'),
+        })
+        i += 1
+    return rows
+
+
+def marks_saved_message(results):
+    invalid = sum(1 for result in results if result['status'] == INVALID)
+    if invalid:
+        return f'Marks saved. {invalid} unit(s) skipped because of an unknown unit or out-of-range scores.'
+    return 'Marks saved successfully!'
+